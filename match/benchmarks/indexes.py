@@ -0,0 +1,207 @@
+"""
+Checks that the hot queries are served by indexes.
+
+HOT_QUERIES are the shapes that dominate the slow-query log. For each one
+access_paths() asks the database, with EXPLAIN on PostgreSQL and EXPLAIN
+QUERY PLAN on SQLite, how it would read each table, and check() reports
+the ones that would scan the whole of the table they are looking rows up
+in, and whether any would sort rather than read rows in index order.
+
+Plans depend on table sizes, so build() first fills the tables out to a
+realistic scale: a cohort with about the given number of MentorshipScores,
+filler cohorts, most of them matched, that its users also signed up for,
+and filler tags. Small tables are cheaper to scan than to look up in, so
+on a database too small for that, pass preferIndexes to see whether an
+index could serve each query at all.
+"""
+from datetime import timedelta
+from django.core.management.base import CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from match import scheduler
+from match.benchmarks import synthetic
+from match.models import Cohort, MentorshipScore, Participant, Programme, Tag
+import json
+import math
+import random
+import re
+
+# Scores built in memory at a time.
+BATCH_SIZE = 5000
+
+# Databases whose query plans access_paths() can read.
+PLAN_VENDORS = ('postgresql', 'sqlite')
+
+# Each hot query: its name, the table it looks rows up in and a function
+# building it from a sample of the data, whether it must return rows in
+# index order, and what it stands for.
+HOT_QUERIES = (
+    ('activeCohort', 'match_cohort', lambda s: Cohort.objects.filter(
+        programme=s['programme'], openDate__lte=s['now'], closeDate__gt=s['now']
+    ).order_by('openDate'), False,
+        "a programme's open cohorts, as Programme.activeCohort reads them"),
+    ('dueCohorts', 'match_cohort', lambda s: scheduler.due_cohorts(s['now']), False,
+        "closed cohorts not yet matched, which the scheduler polls for"),
+    ('participantsByRole', 'match_participant', lambda s: Participant.objects.filter(
+        cohort=s['cohort'], isMentor=True
+    ), False,
+        "a cohort's mentors or mentees"),
+    ('participantsByUser', 'match_participant', lambda s: Participant.objects.filter(user=s['user']), False,
+        "a user's registrations"),
+    ('scoresByMentee', 'match_mentorshipscore', lambda s: MentorshipScore.objects.filter(
+        mentee=s['mentee']
+    ).order_by('-score', 'mentor')[:3], True,
+        "a mentee's best scores, as top_mentors() reads them"),
+    ('tagBySlug', 'match_tag', lambda s: Tag.objects.filter(slug=s['slug']), False,
+        "a tag by slug, as tags are found when registering"),
+)
+
+# Fills the tables out to scale and returns a sample of ids to run the hot
+# queries with. Meant to run inside a transaction that is rolled back.
+def build(scores=1000000, cohorts=100, tags=100000, seed=0):
+    rng = random.Random(seed)
+    side = max(int(math.ceil(math.sqrt(scores))), 1)
+    cohort = synthetic.build_cohort(side, side, vocabulary=50, tagsPerParticipant=2, seed=seed)
+    participants = list(cohort.participants.values_list('participantId', 'user_id', 'isMentor'))
+    mentees = [p for p, u, isMentor in participants if not isMentor]
+    mentors = [p for p, u, isMentor in participants if isMentor]
+
+    pairs = ((mentee, mentor) for mentee in mentees for mentor in mentors)
+    while True:
+        batch = [MentorshipScore(mentee_id=mentee, mentor_id=mentor, score=rng.randint(-5, 20))
+            for mentee, mentor in _take(pairs, BATCH_SIZE)]
+        if not batch:
+            break
+        MentorshipScore.objects.bulk_create(batch)
+
+    # Filler cohorts spread over the past, all but the last few matched, each
+    # with the synthetic cohort's users signed up for it again.
+    now = timezone.now()
+    owner = cohort.createdBy
+    programmes = [Programme.objects.create(name="Filler %d" % n, description="", createdBy=owner)
+        for n in range(max(cohorts // 10, 1))]
+    filler = []
+    for n in range(cohorts):
+        closeDate = now - timedelta(days=cohorts - n)
+        filler.append(Cohort(
+            programme=programmes[n % len(programmes)],
+            openDate=closeDate - timedelta(days=14),
+            closeDate=closeDate,
+            matchedAt=closeDate if n < cohorts - 3 else None,
+            cohortSize=len(participants),
+            participantCount=len(participants),
+            createdBy=owner
+        ))
+    Cohort.objects.bulk_create(filler)
+    for fillerCohort in Cohort.objects.filter(programme__in=programmes).values_list('pk', flat=True):
+        Participant.objects.bulk_create([
+            Participant(user_id=userId, cohort_id=fillerCohort, isMentor=isMentor)
+            for p, userId, isMentor in participants
+        ])
+
+    Tag.objects.bulk_create([Tag(name="filler-%d" % n, slug="filler-%d" % n) for n in range(tags)])
+
+    return {
+        'now': now,
+        'programme': cohort.programme_id,
+        'cohort': cohort.pk,
+        'user': participants[0][1],
+        'mentee': mentees[0] if mentees else None,
+        'slug': "filler-%d" % (tags // 2),
+    }
+
+def _take(iterator, count):
+    for _ in range(count):
+        try:
+            yield next(iterator)
+        except StopIteration:
+            return
+
+# Updates the planner's statistics, as a database that has been running a
+# while would have them.
+def analyze():
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+
+# Returns whether access_paths() can read the database's query plans.
+def reads_plans():
+    return connection.vendor in PLAN_VENDORS
+
+# Says which databases access_paths() works on, for when this isn't one.
+def unsupported_message():
+    return "Query plans can only be checked on %s, not %s." % (" or ".join(PLAN_VENDORS), connection.vendor)
+
+# Returns how the database would run queryset: a list of (table, index)
+# pairs, index None where the whole table is scanned, and whether it sorts.
+# Raises CommandError on a database whose plans it can't read.
+def access_paths(queryset, preferIndexes=False):
+    if not reads_plans():
+        raise CommandError(unsupported_message())
+    sql, params = queryset.query.get_compiler(using=queryset.db).as_sql()
+    with transaction.atomic(), connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            if preferIndexes:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+            cursor.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+            plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            paths = []
+            return paths, _walk_postgresql(plan[0]['Plan'], paths)
+        if connection.vendor == 'sqlite':
+            cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+            return _sqlite_paths([row[-1] for row in cursor.fetchall()])
+
+# Adds the table reads under node to paths and returns whether any node sorts.
+def _walk_postgresql(node, paths):
+    kind = node['Node Type']
+    sorts = kind in ('Sort', 'Incremental Sort')
+    if kind == 'Seq Scan':
+        paths.append((node['Relation Name'], None))
+    elif kind in ('Index Scan', 'Index Only Scan'):
+        paths.append((node['Relation Name'], node['Index Name']))
+    elif kind == 'Bitmap Heap Scan':
+        indexes = [child['Index Name'] for child in node.get('Plans', []) if 'Index Name' in child]
+        paths.append((node['Relation Name'], indexes[0] if indexes else None))
+        return sorts
+    for child in node.get('Plans', []):
+        sorts = _walk_postgresql(child, paths) or sorts
+    return sorts
+
+_SQLITE_READ = re.compile(r'^(SCAN|SEARCH) (?:TABLE )?(\w+)(?: AS \w+)?(?: USING (?:COVERING )?INDEX (\w+)| USING (?:INTEGER )?PRIMARY KEY)?')
+
+def _sqlite_paths(details):
+    paths, sorts = [], False
+    for detail in details:
+        if detail.startswith('USE TEMP B-TREE FOR'):
+            sorts = True
+            continue
+        read = _SQLITE_READ.match(detail)
+        if read is None:
+            continue
+        kind, table, index = read.groups()
+        if kind == 'SEARCH':
+            paths.append((table, index or 'PRIMARY KEY'))
+        else:
+            # A SCAN reads every row, through an index or not.
+            paths.append((table, None))
+    return paths, sorts
+
+# Runs every hot query against sample and returns a list of result dicts,
+# with 'ok' False where the query scans its table or sorts when it
+# shouldn't.
+def check(sample, preferIndexes=False):
+    results = []
+    for name, table, build_query, ordered, description in HOT_QUERIES:
+        paths, sorts = access_paths(build_query(sample), preferIndexes)
+        indexes = [index for t, index in paths if t == table]
+        results.append({
+            'name': name,
+            'description': description,
+            'table': table,
+            'paths': paths,
+            'sorts': sorts,
+            'indexes': indexes,
+            'ok': bool(indexes) and None not in indexes and not (ordered and sorts),
+        })
+    return results
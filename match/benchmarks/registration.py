@@ -0,0 +1,123 @@
+"""
+Signup storm benchmark.
+
+storm() opens a cohort with a given number of seats and has a pool of
+threads register users for it all at once, through the same serializer
+POST /cohort/{id}/register uses, some users more than once. It reports how
+many signups got a seat, how many were turned away and why, how long it took,
+and whether the cohort ended up with more participants than seats or with a
+participantCount that disagrees with its participants.
+
+Each thread registers on its own database connection, so unlike the other
+benchmarks this one has to commit; everything it creates is deleted again
+afterwards.
+"""
+from collections import Counter
+from datetime import timedelta
+from django.contrib.auth.models import User
+from django.db import connection
+from django.utils import timezone
+from match.models import Cohort, Programme
+from match.serializers import ParticipantSerializer
+from rest_framework.serializers import ValidationError
+import threading
+import time
+import uuid
+
+# Creates an open cohort with the given number of seats and the given number
+# of users to sign up for it, returning the cohort and the users.
+def build_open_cohort(seats, users):
+    key = uuid.uuid4().hex[:8]
+    owner = User.objects.create(username="storm-%s-owner" % key)
+    programme = Programme.objects.create(
+        name="Signup storm %s" % key,
+        description="Generated for benchmarking",
+        createdBy=owner
+    )
+    cohort = programme.cohorts.create(
+        cohortSize=seats,
+        openDate=timezone.now() - timedelta(days=1),
+        closeDate=timezone.now() + timedelta(days=1),
+        createdBy=owner
+    )
+    User.objects.bulk_create([
+        User(username="storm-%s-%d" % (key, i))
+        for i in range(users)
+    ])
+    # bulk_create() only sets primary keys on PostgreSQL, so read them back.
+    signups = list(User.objects.filter(
+        username__startswith="storm-%s-" % key
+    ).exclude(pk=owner.pk).order_by('pk'))
+    return cohort, signups
+
+# Registers user for cohort as a mentee, returning None if they got a seat or
+# the reason they were turned away.
+def register(cohort, user):
+    s = ParticipantSerializer(data={'isMentor': False})
+    s.is_valid(raise_exception=True)
+    try:
+        s.save(user=user, cohort=cohort)
+    except ValidationError as e:
+        return str(e.detail[0])
+    return None
+
+# Has threads register users for cohort concurrently, each thread taking
+# every threads'th user, and returns what happened to the signups.
+def run_storm(cohort, users, threads):
+    outcomes = Counter()
+    errors = []
+    lock = threading.Lock()
+    start = threading.Barrier(threads)
+
+    def work(chunk):
+        try:
+            start.wait()
+            for user in chunk:
+                try:
+                    outcome = register(cohort, user)
+                except Exception as e:
+                    with lock:
+                        errors.append("%s: %s" % (type(e).__name__, e))
+                    continue
+                with lock:
+                    outcomes[outcome] += 1
+        finally:
+            connection.close()
+
+    workers = [threading.Thread(target=work, args=(users[n::threads],)) for n in range(threads)]
+    began = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    seconds = time.perf_counter() - began
+
+    participants = cohort.participants.count()
+    participantCount = Cohort.objects.values_list('participantCount', flat=True).get(pk=cohort.pk)
+    return {
+        'seats': cohort.cohortSize,
+        'signups': len(users),
+        'threads': threads,
+        'seconds': seconds,
+        'perSecond': len(users) / max(seconds, 1e-9),
+        'registered': outcomes.pop(None, 0),
+        'refused': dict(outcomes),
+        'errors': errors,
+        'participants': participants,
+        'participantCount': participantCount,
+        'oversubscribed': participants > cohort.cohortSize,
+        'consistent': participants == participantCount,
+    }
+
+# Opens a cohort with the given number of seats and has signups users rush to
+# register for it from the given number of threads, the first duplicates of
+# them twice. Returns run_storm()'s results after deleting what it created.
+def storm(seats, signups, threads=16, duplicates=0):
+    cohort, users = build_open_cohort(seats, signups)
+    try:
+        return run_storm(cohort, users + users[:duplicates], threads)
+    finally:
+        owner = cohort.createdBy
+        cohort.programme.delete()
+        User.objects.filter(pk__in=[u.pk for u in users]).delete()
+        owner.delete()
@@ -0,0 +1,244 @@
+"""
+Benchmark suite for matching on synthetic cohorts.
+
+run_case() builds a seeded cohort of a given size and runs each matching
+stage against it in turn, recording how long the stage took, how many SQL
+queries it ran and, unless turned off, the peak memory Python allocated
+while it ran. Results are plain dicts so they can be written out as JSON and
+a later run compared against them with compare(). Every case runs inside a
+transaction that is rolled back, so nothing is kept.
+
+Given MinHash settings, a case also times an approximate match and reports
+its recall@3: how much of each mentee's exact top three from getTopThree()
+the approximate run still puts in their top three.
+"""
+from django.db import connection, transaction
+from django.db.backends.utils import CursorWrapper
+from match.benchmarks import synthetic
+from match.models import MentorshipScore, Tag
+import numpy
+import platform
+import random
+import subprocess
+import time
+import tracemalloc
+
+# Mentees x mentors in the default ladder of cohort sizes.
+DEFAULT_SIZES = [(10, 10), (100, 100), (500, 500), (1000, 1000), (2000, 2000), (5000, 5000)]
+
+# A cohort where nearly every pair shares a tag, so nearly every pair is an
+# edge for assignment.solve() to look at.
+DENSE_CASE = {'mentees': 5000, 'mentors': 1000, 'vocabulary': 8, 'tags': 4}
+
+# ScoringProfile fields of the profiled cases. With seniority and department
+# terms nearly every pair scores above zero and is stored.
+PROFILE = {'seniorityWeight': 1, 'seniorityCap': 10, 'departmentWeight': 1}
+
+# The stages of a case, in the order they run.
+STAGES = ('build', 'match', 'rematch', 'calculateScore', 'getTopThree', 'assign', 'approximate')
+
+# Number of calls made in the per-call stages.
+SAMPLE_SIZE = 50
+
+# Most mentees whose top three are compared to work out recall.
+RECALL_SAMPLE = 500
+
+class _CountingCursor(CursorWrapper):
+
+    def __init__(self, cursor, db, counter):
+        super(_CountingCursor, self).__init__(cursor, db)
+        self.counter = counter
+
+    def execute(self, sql, params=None):
+        self.counter.queries += 1
+        return super(_CountingCursor, self).execute(sql, params)
+
+    def executemany(self, sql, param_list):
+        self.counter.queries += 1
+        return super(_CountingCursor, self).executemany(sql, param_list)
+
+class QueryCounter(object):
+    # Counts the queries run on a connection while in use. Unlike
+    # CaptureQueriesContext it keeps no SQL, which over a large bulk write
+    # would take more memory than the stage being measured.
+
+    def __init__(self, db=connection):
+        self.db = db
+        self.queries = 0
+
+    def __enter__(self):
+        wrap = lambda cursor: _CountingCursor(cursor, self.db, self)
+        self.db.make_cursor = wrap
+        self.db.make_debug_cursor = wrap
+        return self
+
+    def __exit__(self, *exc):
+        del self.db.make_cursor
+        del self.db.make_debug_cursor
+
+# Runs func(), returning its result and {'seconds', 'queries', 'peakBytes'}.
+# peakBytes is None if memory is False; tracing allocations slows Python
+# code down, so leave it off when only the times matter.
+def measure(func, memory=True):
+    if memory:
+        tracemalloc.start()
+    try:
+        with QueryCounter() as counter:
+            start = time.perf_counter()
+            result = func()
+            seconds = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] if memory else None
+    finally:
+        if memory:
+            tracemalloc.stop()
+    return result, {'seconds': seconds, 'queries': counter.queries, 'peakBytes': peak}
+
+# Returns the fraction of the mentees' exact top mentors, {menteeId: [mentorId]},
+# that are also in their approximate top mentors. scores, {menteeId:
+# {mentorId: exact score}}, decides ties: an approximate pick scoring as well
+# as the last of the exact ones counts as found, since equal scores could
+# have been ranked either way.
+def recall(exact, approximate, scores):
+    found = total = 0
+    for menteeId, best in exact.items():
+        if not best:
+            continue
+        cutoff = scores[menteeId].get(best[-1], 0)
+        picks = approximate.get(menteeId, [])[:len(best)]
+        found += sum(1 for m in picks if scores[menteeId].get(m, 0) >= cutoff)
+        total += len(best)
+    return float(found) / total if total else 1.0
+
+# Returns {menteeId: [mentorId]} of each mentee's top three.
+def _top_three(mentees):
+    return {p.participantId: [m.participantId for m in p.getTopThree()] for p in mentees}
+
+# Describes where the results came from.
+def environment():
+    try:
+        commit = subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL
+        ).decode('ascii').strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'database': connection.vendor,
+        'python': platform.python_version(),
+        'numpy': numpy.__version__,
+    }
+
+# Builds one synthetic cohort and measures each stage of matching it:
+#   build           creating the cohort itself
+#   match           the first Cohort.match(), which scores every pair
+#   rematch         Cohort.match() after retagging `changed` participants
+#   calculateScore  SAMPLE_SIZE calls of MentorshipScore.calculateScore()
+#   getTopThree     SAMPLE_SIZE calls of Participant.getTopThree()
+#   assign          Cohort.assign(), if assign is set
+#   approximate     Cohort.match() with the given MinHashLSH settings, if any,
+#                   recording recall@3 against the exact top three
+# Given ScoringProfile fields as profile, the programme scores with them and
+# each participant gets a seeded join date and department.
+def run_case(mentees, mentors, vocabulary=50, tags=5, distribution='fixed', seed=0,
+        changed=1, memory=True, assign=False, approximate=None, profile=None):
+    rng = random.Random(seed)
+    case = {
+        'mentees': mentees,
+        'mentors': mentors,
+        'vocabulary': vocabulary,
+        'tags': tags,
+        'distribution': distribution,
+        'seed': seed,
+        'profile': profile,
+        'stages': {},
+    }
+    stages = case['stages']
+    with transaction.atomic():
+        cohort, stages['build'] = measure(lambda: synthetic.build_cohort(
+            mentees, mentors,
+            vocabulary=vocabulary,
+            tagsPerParticipant=tags,
+            seed=seed,
+            distribution=distribution
+        ), memory)
+        if profile:
+            synthetic.add_profiles(cohort, seed, **profile)
+
+        case['scores'], stages['match'] = measure(cohort.match, memory)
+        case['stored'] = MentorshipScore.objects.filter(mentee__cohort=cohort).count()
+
+        # In the order they were created, as participantIds are random.
+        participants = list(cohort.participants.order_by('user_id'))
+        tagIds = dict(Tag.objects.filter(name__startswith="synthetic-tag-").values_list('name', 'pk'))
+        tagIds = [tagIds["synthetic-tag-%d" % i] for i in range(vocabulary)]
+        for p in rng.sample(participants, min(changed, len(participants))):
+            p.tags.set(rng.sample(tagIds, min(tags, len(tagIds))))
+        case['rescored'], stages['rematch'] = measure(cohort.match, memory)
+
+        scores = list(MentorshipScore.objects.filter(mentee__cohort=cohort).order_by('pk')[:SAMPLE_SIZE])
+        def calculate():
+            for score in scores:
+                score.calculateScore()
+        _, stages['calculateScore'] = measure(calculate, memory)
+        stages['calculateScore']['calls'] = len(scores)
+
+        sample = [p for p in participants if not p.isMentor][:SAMPLE_SIZE]
+        def topThree():
+            for p in sample:
+                p.getTopThree()
+        _, stages['getTopThree'] = measure(topThree, memory)
+        stages['getTopThree']['calls'] = len(sample)
+
+        if approximate is not None:
+            recallSample = [p for p in participants if not p.isMentor][:RECALL_SAMPLE]
+            exact = _top_three(recallSample)
+            scores = {p.participantId: {} for p in recallSample}
+            rows = MentorshipScore.objects.filter(
+                mentee__in=recallSample
+            ).values_list('mentee_id', 'mentor_id', 'score')
+            for menteeId, mentorId, score in rows:
+                scores[menteeId][mentorId] = score
+            case['approximate'] = {
+                'bands': approximate.bands,
+                'rows': approximate.rows,
+                'candidates': approximate.candidates,
+            }
+            # Ahead of assigning, which fills mentors up so getTopThree()
+            # skips them, and rolled back so assigning still works from the
+            # exact scores.
+            with transaction.atomic():
+                _, stages['approximate'] = measure(lambda: cohort.match(approximate=approximate), memory)
+                case['recallAt3'] = recall(exact, _top_three(recallSample), scores)
+                transaction.set_rollback(True)
+            cohort.refresh_from_db()
+
+        if assign:
+            case['assigned'], stages['assign'] = measure(cohort.assign, memory)
+
+        transaction.set_rollback(True)
+    return case
+
+# Identifies the same case across two sets of results.
+def case_key(case):
+    return (case['mentees'], case['mentors'], case['vocabulary'], case['tags'],
+        case['distribution'], case['seed'], bool(case.get('profile')))
+
+# Compares two sets of results case by case and stage by stage, yielding
+# (case key, stage, baseline stats, current stats, regressed). A stage has
+# regressed if it ran more queries, or took more than `tolerance` longer and
+# at least `noise` seconds longer, which keeps tiny stages from flagging on
+# timer jitter.
+def compare(baseline, current, tolerance=0.2, noise=0.01):
+    before = {case_key(case): case for case in baseline['cases']}
+    for case in current['cases']:
+        old = before.get(case_key(case))
+        if old is None:
+            continue
+        for stage in STAGES:
+            if stage not in case['stages'] or stage not in old['stages']:
+                continue
+            stats, oldStats = case['stages'][stage], old['stages'][stage]
+            slower = stats['seconds'] - oldStats['seconds']
+            regressed = (stats['queries'] > oldStats['queries'] or
+                (slower > oldStats['seconds'] * tolerance and slower > noise))
+            yield case_key(case), stage, oldStats, stats, regressed
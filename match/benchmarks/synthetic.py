@@ -0,0 +1,150 @@
+"""
+Builds throwaway programmes and cohorts for the matching benchmarks.
+
+Everything is created with bulk_create() so that building a large cohort does
+not dwarf the thing being measured. Callers are expected to run inside a
+transaction they roll back afterwards.
+"""
+from datetime import date, timedelta
+from django.contrib.auth.models import User
+from django.utils import timezone
+from match.models import Cohort, MentorshipScore, Participant, Programme, ScoringProfile, Tag, UserProfile
+import math
+import random
+import uuid
+
+# Ways of choosing how many tags each participant gets, around a mean.
+DISTRIBUTIONS = ('fixed', 'uniform', 'poisson')
+
+# Departments add_profiles() draws from.
+DEPARTMENTS = ("Engineering", "Sales", "Finance", "Marketing")
+
+# Returns a tag count drawn from the named distribution with the given mean.
+def _tag_count(rng, distribution, mean):
+    if distribution == 'fixed':
+        return mean
+    if distribution == 'uniform':
+        return rng.randint(0, 2 * mean)
+    if distribution == 'poisson':
+        # Knuth's method, fine for the small means used here.
+        limit, count, product = math.exp(-mean), 0, rng.random()
+        while product > limit:
+            count += 1
+            product *= rng.random()
+        return count
+    raise ValueError("Unknown tag count distribution %r" % distribution)
+
+# Creates a closed cohort with the given number of mentees and mentors, each
+# tagged with tags drawn from a vocabulary of the given size. How many tags
+# each gets is drawn from distribution, averaging tagsPerParticipant.
+def build_cohort(mentees, mentors, vocabulary=50, tagsPerParticipant=5, seed=0, distribution='fixed'):
+    if distribution not in DISTRIBUTIONS:
+        raise ValueError("Unknown tag count distribution %r" % distribution)
+    rng = random.Random(seed)
+    key = uuid.uuid4().hex[:8]
+
+    owner = User.objects.create(username="synthetic-%s-owner" % key)
+    programme = Programme.objects.create(
+        name="Synthetic programme %s" % key,
+        description="Generated for benchmarking",
+        createdBy=owner
+    )
+    cohort = programme.cohorts.create(
+        cohortSize=mentees + mentors,
+        openDate=timezone.now() - timedelta(days=14),
+        closeDate=timezone.now() - timedelta(days=1),
+        createdBy=owner
+    )
+
+    names = ["synthetic-tag-%d" % i for i in range(vocabulary)]
+    existing = set(Tag.objects.filter(name__in=names).values_list('name', flat=True))
+    Tag.objects.bulk_create([Tag(name=n, slug=n) for n in names if n not in existing])
+    # bulk_create() only sets primary keys on PostgreSQL, so read them back.
+    tagIds = dict(Tag.objects.filter(name__in=names).values_list('name', 'pk'))
+    tagIds = [tagIds[n] for n in names]
+
+    User.objects.bulk_create([
+        User(username="synthetic-%s-%d" % (key, i))
+        for i in range(mentees + mentors)
+    ])
+    # bulk_create() only sets primary keys on PostgreSQL, so read them back.
+    users = list(User.objects.filter(
+        username__startswith="synthetic-%s-" % key
+    ).exclude(pk=owner.pk).order_by('pk').values_list('pk', flat=True))
+
+    participants = [
+        Participant(user_id=userId, cohort=cohort, isMentor=i >= mentees)
+        for i, userId in enumerate(users)
+    ]
+    Participant.objects.bulk_create(participants)
+    Cohort.objects.filter(pk=cohort.pk).update(participantCount=len(participants))
+    cohort.participantCount = len(participants)
+
+    Through = Participant.tags.through
+    Through.objects.bulk_create([
+        Through(participant_id=p.participantId, tag_id=tagId)
+        for p in participants
+        for tagId in rng.sample(tagIds, min(_tag_count(rng, distribution, tagsPerParticipant), vocabulary))
+    ])
+    return cohort
+
+# Gives the cohort's participants seeded user profiles, build_cohort()
+# having skipped them, and its programme a ScoringProfile with the given
+# fields, which turns the profile terms on for every pair.
+def add_profiles(cohort, seed=0, **fields):
+    rng = random.Random(seed)
+    UserProfile.objects.bulk_create([
+        UserProfile(
+            user_id=userId,
+            joinDate=date.today() - timedelta(days=rng.randint(0, 20 * 365)),
+            department=rng.choice(DEPARTMENTS)
+        ) for userId in cohort.participants.order_by('user_id').values_list('user_id', flat=True)
+    ])
+    return ScoringProfile.objects.create(programme=cohort.programme, **fields)
+
+# The original per-pair implementation of Cohort.match() and
+# MentorshipScore.calculateScore(), kept as the reference the bulk engine is
+# measured and checked against.
+def legacy_match(cohort):
+    mentors = cohort.participants.filter(isMentor=True)
+    for mentee in cohort.participants.filter(isMentor=False):
+        for mentor in mentors:
+            p = MentorshipScore.objects.create(
+                    mentor=mentor,
+                    mentee=mentee
+            )
+            mentee_tags = list(p.mentee.tags.all())
+            mentor_tags = list(p.mentor.tags.all())
+            p.score = len(set(mentee_tags).intersection(mentor_tags))
+            p.save()
+
+# Works out every mentee/mentor overlap the way the original scoring did, from
+# sets of Tag instances, and returns them as {(menteeId, mentorId): overlap}.
+def set_overlaps(cohort):
+    participants = list(cohort.participants.prefetch_related('tags'))
+    tags = {p.participantId: set(p.tags.all()) for p in participants}
+    mentors = [p.participantId for p in participants if p.isMentor]
+    return {
+        (mentee.participantId, mentor): len(tags[mentee.participantId].intersection(tags[mentor]))
+        for mentee in participants if not mentee.isMentor
+        for mentor in mentors
+    }
+
+# Returns the number of mentee/mentor pairs in the cohort that share a tag,
+# which is how many MentorshipScore rows matching it stores.
+def shared_pairs(cohort):
+    return sum(1 for overlap in set_overlaps(cohort).values() if overlap)
+
+# Returns {(menteeId, mentorId): score} for every mentee/mentor pair in the
+# cohort, with 0 for pairs that have no stored score.
+def score_snapshot(cohort):
+    mentees, mentors = [], []
+    for participantId, isMentor in cohort.participants.values_list('participantId', 'isMentor'):
+        (mentors if isMentor else mentees).append(participantId)
+    scores = {(mentee, mentor): 0 for mentee in mentees for mentor in mentors}
+    rows = MentorshipScore.objects.filter(
+        mentee__cohort=cohort
+    ).values_list('mentee_id', 'mentor_id', 'score')
+    for mentee, mentor, score in rows:
+        scores[(mentee, mentor)] = score
+    return scores
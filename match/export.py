@@ -0,0 +1,100 @@
+"""
+Streaming exports of a cohort's match results.
+
+A large cohort has millions of MentorshipScores, far too many to build
+serializer instances for. export_lines() instead reads the rows as plain
+tuples with values_list(), the participants' names joined in by the same
+query, a page at a time in primary key order, and writes each one out as a
+line of CSV or NDJSON as soon as it is read, so memory use does not grow
+with the size of the cohort. Tags would multiply the rows if joined, so
+every participant's tags are read up front in a single query instead.
+"""
+from match.matching.tags import load_tag_names
+from match.models import MentorRanking, Mentorship, MentorshipScore
+import csv
+import json
+
+# Rows read at a time.
+PAGE_SIZE = 2000
+
+FORMATS = ('csv', 'ndjson')
+
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+# What can be exported: the model and its fields written besides the two
+# participants.
+KINDS = {
+    'scores': (MentorshipScore, ('score',)),
+    'rankings': (MentorRanking, ('rank', 'score')),
+    'mentorships': (Mentorship, ()),
+}
+
+PARTICIPANT_FIELDS = ('id', 'name', 'tags')
+
+def columns(kind):
+    return (
+        tuple('mentee' + f.capitalize() for f in PARTICIPANT_FIELDS) +
+        tuple('mentor' + f.capitalize() for f in PARTICIPANT_FIELDS) +
+        KINDS[kind][1]
+    )
+
+# Yields the cohort's rows of the given kind as tuples in columns() order,
+# with tags as lists of names.
+def export_rows(cohort, kind, pageSize=PAGE_SIZE):
+    model, fields = KINDS[kind]
+    tags = load_tag_names(participant__cohort=cohort)
+    for names in tags.values():
+        names.sort()
+    queryset = model.objects.filter(mentee__cohort=cohort).order_by('pk')
+    read = ('pk', 'mentee_id', 'mentee__user__first_name', 'mentee__user__last_name',
+        'mentor_id', 'mentor__user__first_name', 'mentor__user__last_name') + fields
+    last = None
+    while True:
+        page = queryset if last is None else queryset.filter(pk__gt=last)
+        count = 0
+        for row in page.values_list(*read)[:pageSize].iterator():
+            count += 1
+            last = row[0]
+            mentee, mentor = row[1], row[4]
+            yield (
+                str(mentee), _name(row[2], row[3]), tags.get(mentee, []),
+                str(mentor), _name(row[5], row[6]), tags.get(mentor, []),
+            ) + row[7:]
+        if count < pageSize:
+            return
+
+def _name(first, last):
+    return ("%s %s" % (first, last)).strip()
+
+class _Line(object):
+    # File-like object csv.writer can write a single row to.
+
+    def write(self, value):
+        return value
+
+# Returns an iterator over the cohort's rows of the given kind as lines of
+# text in fileFormat, a header line first for CSV. Tags are separated by ";"
+# in CSV and are lists in NDJSON. Raises ValueError straight away, before
+# anything is read, for an unknown kind or format.
+def export_lines(cohort, kind, fileFormat='csv', pageSize=PAGE_SIZE):
+    if kind not in KINDS:
+        raise ValueError("kind must be one of %s" % ", ".join(sorted(KINDS)))
+    if fileFormat not in FORMATS:
+        raise ValueError("format must be one of %s" % ", ".join(FORMATS))
+    rows = export_rows(cohort, kind, pageSize)
+    if fileFormat == 'csv':
+        return _csv_lines(columns(kind), rows)
+    return _ndjson_lines(columns(kind), rows)
+
+def _csv_lines(header, rows):
+    writer = csv.writer(_Line())
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow(row[:2] + (";".join(row[2]),) + row[3:5] + (";".join(row[5]),) + row[6:])
+
+def _ndjson_lines(header, rows):
+    for row in rows:
+        yield json.dumps(dict(zip(header, row)), sort_keys=True) + "\n"
@@ -0,0 +1,136 @@
+"""
+Background match runs.
+
+Matching a large cohort can take minutes, far longer than a request should
+tie up a gunicorn worker, so the API only queues a MatchJob and one or more
+`manage.py match_worker` processes pick the jobs up and run them. Workers
+claim jobs with a conditional UPDATE, report progress while they run, and
+failed jobs are retried with a growing delay up to their maxAttempts.
+"""
+from datetime import timedelta
+from django.db import DatabaseError, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from match.models import Cohort, MatchJob
+import threading
+import traceback
+
+# Seconds between progress writes for a running job.
+PROGRESS_INTERVAL = 2
+
+# A running job whose worker has not reported in for this long is assumed to
+# have died with it and is handed out again.
+STALE_AFTER = timedelta(minutes=10)
+
+# Due jobs claim() tries, in order, before giving up when other workers keep
+# taking them first.
+CLAIM_CANDIDATES = 10
+
+# Delay before a failed job is retried, multiplied by the attempts so far.
+RETRY_BACKOFF = timedelta(seconds=30)
+
+# Queues a match run for the cohort unless one is already waiting or
+# running. Returns (job, created).
+def enqueue(cohort, user=None):
+    with transaction.atomic():
+        # Lock the cohort so that two requests can't both queue a job.
+        Cohort.objects.select_for_update().get(pk=cohort.pk)
+        job = cohort.matchJobs.filter(status__in=[MatchJob.QUEUED, MatchJob.RUNNING]).first()
+        if job:
+            return job, False
+        return MatchJob.objects.create(cohort=cohort, createdBy=user), True
+
+# Takes the next job that is due, or one whose worker has gone quiet, and
+# marks it as running for workerId. Returns None if there is nothing to do.
+#
+# No row is locked: the job is taken with a single UPDATE that only matches
+# while it is still in the state it was read in, so when two workers pick the
+# same job one of them updates nothing and moves on to the next.
+def claim(workerId):
+    now = timezone.now()
+    due = MatchJob.objects.filter(
+        Q(status=MatchJob.QUEUED, runAfter__lte=now) |
+        Q(status=MatchJob.RUNNING, heartbeatAt__lt=now - STALE_AFTER)
+    ).order_by('runAfter', 'createdAt')
+    for jobId, status, heartbeatAt in due.values_list('pk', 'status', 'heartbeatAt')[:CLAIM_CANDIDATES]:
+        claimed = MatchJob.objects.filter(pk=jobId, status=status, heartbeatAt=heartbeatAt).update(
+            status=MatchJob.RUNNING,
+            attempts=F('attempts') + 1,
+            workerId=workerId,
+            progress=0,
+            startedAt=now,
+            heartbeatAt=now
+        )
+        if claimed:
+            return MatchJob.objects.get(pk=jobId)
+    return None
+
+class _ProgressReporter(threading.Thread):
+    # Writes a running job's progress and heartbeat every PROGRESS_INTERVAL
+    # seconds. It has to be a separate thread, and so a separate database
+    # connection, because the match runs in a single transaction and
+    # anything written inside it stays invisible until the match is over.
+
+    def __init__(self, job):
+        super(_ProgressReporter, self).__init__()
+        self.daemon = True
+        self.jobId = job.pk
+        self.latest = None
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+
+    def update(self, progress, total):
+        with self.lock:
+            self.latest = (progress, total)
+
+    def run(self):
+        try:
+            while not self.stopped.wait(PROGRESS_INTERVAL):
+                self.write()
+        finally:
+            connection.close()
+
+    def write(self):
+        with self.lock:
+            latest, self.latest = self.latest, None
+        fields = {'heartbeatAt': timezone.now()}
+        if latest:
+            fields['progress'], fields['total'] = latest
+        try:
+            MatchJob.objects.filter(pk=self.jobId).update(**fields)
+        except DatabaseError:
+            # Progress is only informative, never fail the job over it.
+            pass
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+# Runs a claimed job to completion. Returns True if the match succeeded.
+def run(job):
+    reporter = _ProgressReporter(job)
+    reporter.start()
+    try:
+        written = job.cohort.match(progress=reporter.update)
+    except Exception:
+        reporter.stop()
+        fail(job, traceback.format_exc())
+        return False
+    reporter.stop()
+    MatchJob.objects.filter(pk=job.pk).update(
+        status=MatchJob.DONE,
+        progress=written,
+        total=written,
+        message="",
+        finishedAt=timezone.now()
+    )
+    return True
+
+# Records a failed attempt, queueing the job again if it has attempts left.
+def fail(job, message):
+    now = timezone.now()
+    if job.attempts < job.maxAttempts:
+        fields = {'status': MatchJob.QUEUED, 'runAfter': now + RETRY_BACKOFF * job.attempts}
+    else:
+        fields = {'status': MatchJob.FAILED, 'finishedAt': now}
+    MatchJob.objects.filter(pk=job.pk).update(message=message, **fields)
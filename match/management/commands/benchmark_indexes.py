@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from match.benchmarks import indexes
+import time
+
+
+class Command(BaseCommand):
+    help = ("Fills the tables out to scale and checks with EXPLAIN that every hot query is "
+        "served by an index. Nothing is kept.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scores', type=int, default=1000000,
+            help="MentorshipScores in the cohort queried.")
+        parser.add_argument('--cohorts', type=int, default=100,
+            help="Filler cohorts, each with the cohort's users signed up again.")
+        parser.add_argument('--tags', type=int, default=100000,
+            help="Filler tags.")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--prefer-indexes', action='store_true',
+            help="Discourage full scans, to check an index could serve each query on small tables.")
+
+    def handle(self, *args, **options):
+        # Before spending minutes filling the tables.
+        if not indexes.reads_plans():
+            raise CommandError(indexes.unsupported_message())
+        with transaction.atomic():
+            start = time.perf_counter()
+            sample = indexes.build(options['scores'], options['cohorts'], options['tags'], options['seed'])
+            indexes.analyze()
+            self.stdout.write("Built in %.1fs" % (time.perf_counter() - start))
+
+            failed = []
+            for result in indexes.check(sample, options['prefer_indexes']):
+                reads = ", ".join("%s via %s" % (table, index or "full scan") for table, index in result['paths'])
+                self.stdout.write("%s %s: %s%s" % (
+                    "ok  " if result['ok'] else "FAIL", result['name'], reads, ", sorts" if result['sorts'] else ""))
+                if not result['ok']:
+                    failed.append(result['name'])
+
+            transaction.set_rollback(True)
+        if failed:
+            raise CommandError("Not served by an index: %s" % ", ".join(failed))
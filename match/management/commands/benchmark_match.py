@@ -0,0 +1,123 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from match.benchmarks import suite, synthetic
+from match.matching import assignment, stable
+from match.matching.tags import CohortTagIndex
+from match.models import MentorshipScore
+import time
+
+
+# Runs func(), returning its result, the seconds it took and the peak number
+# of bytes allocated while it ran.
+def _measure(func):
+    result, stats = suite.measure(func)
+    return result, stats['seconds'], stats['peakBytes']
+
+# Builds the bitset index for a cohort and works out every overlap from it.
+def _bitset_overlaps(cohort):
+    index = CohortTagIndex.load(cohort)
+    overlap = index.mentees.overlap(index.mentors)
+    return {
+        (mentee, mentor): overlap[i, j]
+        for i, mentee in enumerate(index.mentees.ids)
+        for j, mentor in enumerate(index.mentors.ids)
+    }
+
+
+class Command(BaseCommand):
+    help = "Times Cohort.match() against the original per-pair scoring on a synthetic cohort. Nothing is kept."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mentees', type=int, default=100)
+        parser.add_argument('--mentors', type=int, default=100)
+        parser.add_argument('--vocabulary', type=int, default=50,
+            help="Number of distinct tags to draw from.")
+        parser.add_argument('--tags', type=int, default=5,
+            help="Tags per participant.")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--skip-legacy', action='store_true',
+            help="Only time the bulk engine (the legacy path is very slow on large cohorts).")
+        parser.add_argument('--tagsets', action='store_true',
+            help="Also compare the time and memory of set-based and bitset overlaps.")
+        parser.add_argument('--changed', type=int, default=0,
+            help="After matching, retag this many participants and time the incremental rerun.")
+        parser.add_argument('--assign', action='store_true',
+            help="Also time the optimal mentor assignment against greedy and stable ones.")
+        parser.add_argument('--capacity', type=int, default=1,
+            help="Mentees each mentor can take when assigning.")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            cohort = synthetic.build_cohort(
+                options['mentees'],
+                options['mentors'],
+                vocabulary=options['vocabulary'],
+                tagsPerParticipant=options['tags'],
+                seed=options['seed']
+            )
+            self.stdout.write("Cohort: %d mentees x %d mentors, %d tags each from %d" % (
+                options['mentees'], options['mentors'], options['tags'], options['vocabulary']))
+
+            if options['tagsets']:
+                self.compare_tagsets(cohort)
+
+            legacy = None
+            if not options['skip_legacy']:
+                start = time.perf_counter()
+                synthetic.legacy_match(cohort)
+                legacyTime = time.perf_counter() - start
+                legacy = synthetic.score_snapshot(cohort)
+                MentorshipScore.objects.filter(mentee__cohort=cohort).delete()
+                self.stdout.write("legacy: %.3fs" % legacyTime)
+
+            start = time.perf_counter()
+            cohort.match()
+            bulkTime = time.perf_counter() - start
+            self.stdout.write("bulk:   %.3fs" % bulkTime)
+
+            if legacy is not None:
+                if synthetic.score_snapshot(cohort) != legacy:
+                    raise CommandError("Bulk scores differ from the legacy scores.")
+                self.stdout.write("Scores identical, %.1fx faster" % (legacyTime / max(bulkTime, 1e-9)))
+
+            if options['changed']:
+                self.rematch(cohort, options['changed'])
+
+            if options['assign']:
+                cohort.participants.filter(isMentor=True).update(capacity=options['capacity'])
+                self.compare_assignment(cohort)
+
+            transaction.set_rollback(True)
+
+    def rematch(self, cohort, changed):
+        participants = list(cohort.participants.order_by('?')[:changed])
+        mentors = list(cohort.participants.filter(isMentor=True)[:1])
+        for p in participants:
+            p.tags.set(mentors[0].tags.all() if mentors else [])
+        start = time.perf_counter()
+        scored = cohort.match()
+        elapsed = time.perf_counter() - start
+        self.stdout.write("incremental (%d changed): %.3fs, %d pairs rescored" % (len(participants), elapsed, scored))
+
+    def compare_tagsets(self, cohort):
+        sets, setTime, setPeak = _measure(lambda: synthetic.set_overlaps(cohort))
+        bits, bitTime, bitPeak = _measure(lambda: _bitset_overlaps(cohort))
+        if sets != bits:
+            raise CommandError("Bitset overlaps differ from the set-based overlaps.")
+        # Only the index itself, without the per-pair dict built for comparison.
+        index, indexTime, indexPeak = _measure(lambda: CohortTagIndex.load(cohort))
+        self.stdout.write("sets:    %.3fs, peak %.1f KiB" % (setTime, setPeak / 1024.0))
+        self.stdout.write("bitsets: %.3fs, peak %.1f KiB (index alone %.3fs, peak %.1f KiB, %d bytes of bits)" % (
+            bitTime, bitPeak / 1024.0, indexTime, indexPeak / 1024.0,
+            index.mentees.nbytes + index.mentors.nbytes))
+
+    def compare_assignment(self, cohort):
+        start = time.perf_counter()
+        weights, capacities = assignment.load_problem(cohort)
+        self.stdout.write("load scores: %.3fs" % (time.perf_counter() - start))
+        for name, solver in (('optimal', assignment.solve), ('greedy', assignment.greedy), ('stable', stable.solve)):
+            start = time.perf_counter()
+            result = solver(weights, capacities)
+            elapsed = time.perf_counter() - start
+            self.stdout.write("%s: %.3fs, %d assigned, total score %d" % (
+                name, elapsed, len(result), assignment.total_score(weights, result)))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+from match.benchmarks import registration
+
+
+class Command(BaseCommand):
+    help = ("Has many threads register for one open cohort at once and checks it is never "
+        "oversubscribed. Commits while it runs and deletes what it created afterwards.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seats', type=int, default=100,
+            help="Size of the cohort.")
+        parser.add_argument('--signups', type=int, default=500,
+            help="Users trying to register.")
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--duplicates', type=int, default=50,
+            help="How many of the users try to register twice.")
+
+    def handle(self, *args, **options):
+        result = registration.storm(
+            options['seats'],
+            options['signups'],
+            threads=options['threads'],
+            duplicates=options['duplicates']
+        )
+        self.stdout.write("%d signups for %d seats from %d threads: %.3fs, %.0f signups/s" % (
+            result['signups'], result['seats'], result['threads'], result['seconds'], result['perSecond']))
+        self.stdout.write("registered: %d" % result['registered'])
+        for reason, count in sorted(result['refused'].items()):
+            self.stdout.write("refused (%s): %d" % (reason, count))
+        self.stdout.write("participants: %d, participantCount: %d" % (result['participants'], result['participantCount']))
+
+        if result['errors']:
+            raise CommandError("%d signups failed, first: %s" % (len(result['errors']), result['errors'][0]))
+        if result['oversubscribed']:
+            raise CommandError("Cohort oversubscribed.")
+        if not result['consistent']:
+            raise CommandError("participantCount disagrees with the participants.")
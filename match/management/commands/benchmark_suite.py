@@ -0,0 +1,131 @@
+from django.core.management.base import BaseCommand, CommandError
+from match.benchmarks import suite, synthetic
+from match.matching import minhash
+import argparse
+import json
+
+
+# Parses "100x100,1000x500" into [(100, 100), (1000, 500)].
+def _parse_sizes(value):
+    sizes = []
+    for size in value.split(','):
+        try:
+            mentees, mentors = size.lower().split('x')
+            sizes.append((int(mentees), int(mentors)))
+        except ValueError:
+            raise argparse.ArgumentTypeError("sizes look like 100x100,1000x500, not %r" % value)
+    return sizes
+
+def _format_bytes(peak):
+    if peak is None:
+        return "-"
+    return "%.1f MiB" % (peak / 1048576.0)
+
+
+class Command(BaseCommand):
+    help = "Times each matching stage on a ladder of synthetic cohorts, with query counts and peak memory. Nothing is kept."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=_parse_sizes,
+            default=suite.DEFAULT_SIZES,
+            help="Comma separated mentees x mentors, e.g. 10x10,100x100 (default: %s)." % ','.join(
+                '%dx%d' % size for size in suite.DEFAULT_SIZES))
+        parser.add_argument('--vocabulary', type=int, default=50,
+            help="Number of distinct tags to draw from.")
+        parser.add_argument('--tags', type=int, default=5,
+            help="Average tags per participant.")
+        parser.add_argument('--distribution', choices=synthetic.DISTRIBUTIONS, default='fixed',
+            help="How the number of tags per participant varies.")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--changed', type=int, default=1,
+            help="Participants retagged before the incremental rerun.")
+        parser.add_argument('--assign', action='store_true',
+            help="Also time assigning mentors.")
+        parser.add_argument('--profiled', action='store_true',
+            help="Also run each size with a ScoringProfile, under which nearly every pair is stored.")
+        parser.add_argument('--dense', action='store_true',
+            help="Also run a %dx%d cohort where nearly every pair shares a tag, with assigning." % (
+                suite.DENSE_CASE['mentees'], suite.DENSE_CASE['mentors']))
+        parser.add_argument('--approximate', action='store_true',
+            help="Also time an approximate match and report its recall@3.")
+        parser.add_argument('--bands', type=int, default=minhash.BANDS,
+            help="MinHash bands for --approximate; more raise recall.")
+        parser.add_argument('--rows', type=int, default=minhash.ROWS,
+            help="Signature positions per band for --approximate; fewer raise recall.")
+        parser.add_argument('--candidates', type=int,
+            help="Most candidate mentors per mentee for --approximate.")
+        parser.add_argument('--no-memory', action='store_true',
+            help="Don't trace allocations, which slows down the Python parts of each stage.")
+        parser.add_argument('--output',
+            help="Write the results as JSON to this file.")
+        parser.add_argument('--compare',
+            help="Compare against results written earlier with --output, failing on any regression.")
+        parser.add_argument('--tolerance', type=float, default=0.2,
+            help="Fraction a stage may slow down by before --compare counts it as a regression.")
+
+    def handle(self, *args, **options):
+        results = {'environment': suite.environment(), 'cases': []}
+        approximate = None
+        if options['approximate']:
+            try:
+                approximate = minhash.MinHashLSH(options['bands'], options['rows'], options['candidates'])
+            except ValueError as e:
+                raise CommandError(str(e))
+        profiles = [None, suite.PROFILE] if options['profiled'] else [None]
+        for mentees, mentors in options['sizes']:
+            for profile in profiles:
+                case = suite.run_case(
+                    mentees, mentors,
+                    vocabulary=options['vocabulary'],
+                    tags=options['tags'],
+                    distribution=options['distribution'],
+                    seed=options['seed'],
+                    changed=options['changed'],
+                    memory=not options['no_memory'],
+                    assign=options['assign'],
+                    approximate=approximate,
+                    profile=profile
+                )
+                results['cases'].append(case)
+                self.report(case)
+        if options['dense']:
+            case = suite.run_case(
+                seed=options['seed'],
+                changed=options['changed'],
+                memory=not options['no_memory'],
+                assign=True,
+                **suite.DENSE_CASE
+            )
+            results['cases'].append(case)
+            self.report(case)
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2, sort_keys=True)
+
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = json.load(f)
+            regressions = 0
+            self.stdout.write("Against %s:" % (baseline['environment'].get('commit') or options['compare']))
+            for key, stage, old, new, regressed in suite.compare(baseline, results, options['tolerance']):
+                regressions += regressed
+                self.stdout.write("  %-11s %-15s %8.3fs -> %8.3fs  %6d -> %6d queries%s" % (
+                    "%dx%d%s" % (key[0], key[1], "p" if key[-1] else ""), stage, old['seconds'], new['seconds'],
+                    old['queries'], new['queries'], "  REGRESSED" if regressed else ""))
+            if regressions:
+                raise CommandError("%d stage(s) regressed" % regressions)
+
+    def report(self, case):
+        self.stdout.write("%d mentees x %d mentors, %d %s tags each from %d%s, %d scores stored:" % (
+            case['mentees'], case['mentors'], case['tags'], case['distribution'], case['vocabulary'],
+            ", profiled" if case.get('profile') else "", case['stored']))
+        for stage in suite.STAGES:
+            if stage not in case['stages']:
+                continue
+            stats = case['stages'][stage]
+            self.stdout.write("  %-15s %8.3fs %7d queries  peak %s" % (
+                stage, stats['seconds'], stats['queries'], _format_bytes(stats['peakBytes'])))
+        if 'recallAt3' in case:
+            self.stdout.write("  recall@3 %.3f with %d bands of %d rows" % (
+                case['recallAt3'], case['approximate']['bands'], case['approximate']['rows']))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+from match import export
+from match.models import Cohort
+
+
+class Command(BaseCommand):
+    help = "Writes a cohort's scores, rankings or mentorships as CSV or NDJSON, a page of rows at a time."
+
+    def add_arguments(self, parser):
+        parser.add_argument('cohort', help="Id of the cohort to export.")
+        parser.add_argument('--kind', choices=sorted(export.KINDS), default='scores',
+            help="What to export.")
+        parser.add_argument('--format', dest='fileFormat', choices=export.FORMATS, default='csv')
+        parser.add_argument('--output',
+            help="Write to this file instead of standard output.")
+
+    def handle(self, *args, **options):
+        try:
+            cohort = Cohort.objects.get(pk=options['cohort'])
+        except (Cohort.DoesNotExist, ValueError):
+            raise CommandError("No cohort %s" % options['cohort'])
+        lines = export.export_lines(cohort, options['kind'], options['fileFormat'])
+        if options['output']:
+            with open(options['output'], 'w', newline='') as f:
+                f.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
@@ -0,0 +1,88 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+from match.matching import engine
+from match.models import Cohort
+import multiprocessing
+import time
+import traceback
+
+
+# Each pool process opens its own database connection rather than sharing the
+# one inherited from the parent.
+def _init_process():
+    connections.close_all()
+
+# Matches one cohort, returning (cohortId, pairs scored, seconds, error).
+def _match_cohort(args):
+    cohortId, full = args
+    start = time.perf_counter()
+    try:
+        written = Cohort.objects.get(pk=cohortId).match(full=full)
+        return cohortId, written, time.perf_counter() - start, None
+    except Exception:
+        return cohortId, 0, time.perf_counter() - start, traceback.format_exc()
+
+
+class Command(BaseCommand):
+    help = "Matches every closed cohort whose scores are missing or out of date, spread over several processes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('cohorts', nargs='*',
+            help="Only match these cohort ids (default: every closed cohort that needs it).")
+        parser.add_argument('--processes', type=int, default=multiprocessing.cpu_count(),
+            help="Number of cohorts matched at once (default: one per CPU).")
+        parser.add_argument('--full', action='store_true',
+            help="Rescore the cohorts from scratch rather than only what changed.")
+        parser.add_argument('--dry-run', action='store_true',
+            help="List the cohorts that would be matched and stop.")
+
+    def handle(self, *args, **options):
+        if options['cohorts']:
+            cohortIds = options['cohorts']
+        else:
+            cohortIds = list(engine.stale_cohorts(timezone.now()).order_by('closeDate').values_list('cohortId', flat=True))
+        if not cohortIds:
+            self.stdout.write("No cohorts need matching.")
+            return
+        if options['dry_run']:
+            for cohortId in cohortIds:
+                self.stdout.write(str(cohortId))
+            return
+
+        processes = max(1, min(options['processes'], len(cohortIds)))
+        if connections['default'].vendor == 'sqlite':
+            # SQLite only lets one connection write at a time.
+            processes = 1
+        self.stdout.write("Matching %d cohort(s) with %d process(es)" % (len(cohortIds), processes))
+        work = [(cohortId, options['full']) for cohortId in cohortIds]
+        start = time.perf_counter()
+        if processes == 1:
+            results = map(_match_cohort, work)
+            failures = self.report(results)
+        else:
+            # Don't hand the parent's open connection down to the children.
+            connections.close_all()
+            pool = multiprocessing.Pool(processes, initializer=_init_process)
+            try:
+                failures = self.report(pool.imap_unordered(_match_cohort, work))
+            finally:
+                pool.close()
+                pool.join()
+
+        self.stdout.write("Matched %d cohort(s) in %.1fs, %d failed" % (
+            len(cohortIds) - failures, time.perf_counter() - start, failures))
+        if failures:
+            raise CommandError("%d cohort(s) failed to match" % failures)
+
+    # Writes a line per cohort as results come in and returns the number of
+    # failures.
+    def report(self, results):
+        failures = 0
+        for cohortId, written, elapsed, error in results:
+            if error:
+                failures += 1
+                self.stderr.write("%s FAILED after %.2fs\n%s" % (cohortId, elapsed, error))
+            else:
+                self.stdout.write("%s %d scores in %.2fs" % (cohortId, written, elapsed))
+        return failures
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from match import scheduler
+import random
+import time
+
+
+class Command(BaseCommand):
+    help = "Matches cohorts once their closeDate has passed, checking again every so often until stopped."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+            help="Match the cohorts due now and exit.")
+        parser.add_argument('--interval', type=float, default=60,
+            help="Seconds between looking for closed cohorts.")
+        parser.add_argument('--jitter', type=float, default=10,
+            help="Most seconds to wait at random before each cohort, and to add to each interval, "
+                 "so nodes don't all start matching at once.")
+
+    def handle(self, *args, **options):
+        while True:
+            for cohortId, written, error in scheduler.run_due(jitter=options['jitter']):
+                if error:
+                    self.stderr.write("%s FAILED\n%s" % (cohortId, error))
+                elif written is None:
+                    self.stdout.write("%s matched by another node" % cohortId)
+                else:
+                    self.stdout.write("%s matched, %d pairs scored" % (cohortId, written))
+            if options['once']:
+                return
+            time.sleep(options['interval'] + random.uniform(0, options['jitter']))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from match import jobs
+import os
+import socket
+import time
+
+
+class Command(BaseCommand):
+    help = "Runs queued cohort match jobs until stopped."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+            help="Exit once there are no jobs left to run.")
+        parser.add_argument('--sleep', type=float, default=5,
+            help="Seconds to wait before looking for new jobs when the queue is empty.")
+        parser.add_argument('--worker-id', default="%s:%d" % (socket.gethostname(), os.getpid()),
+            help="Name recorded on the jobs this worker runs.")
+
+    def handle(self, *args, **options):
+        while True:
+            job = jobs.claim(options['worker_id'])
+            if job is None:
+                if options['once']:
+                    return
+                time.sleep(options['sleep'])
+                continue
+
+            self.stdout.write("Matching cohort %s (job %s, attempt %d)" % (job.cohort_id, job.jobId, job.attempts))
+            start = time.perf_counter()
+            if jobs.run(job):
+                self.stdout.write("Job %s done in %.1fs" % (job.jobId, time.perf_counter() - start))
+            else:
+                self.stderr.write("Job %s failed after %.1fs" % (job.jobId, time.perf_counter() - start))
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from match.models import Cohort
+
+
+# Sets participantCount from the participants themselves on the given
+# cohorts, or all of them, returning {cohortId: (stored, actual)} for those
+# that were wrong.
+def recount(cohortIds=None):
+    cohorts = Cohort.objects.all()
+    if cohortIds:
+        cohorts = cohorts.filter(pk__in=cohortIds)
+    wrong = {}
+    with transaction.atomic():
+        # Locked first, as registrations update the same rows; FOR UPDATE
+        # can't be combined with the GROUP BY of the count.
+        stored = dict(cohorts.select_for_update().values_list('cohortId', 'participantCount'))
+        counts = cohorts.annotate(n=Count('participants')).values_list('cohortId', 'n')
+        for cohortId, actual in counts:
+            if stored.get(cohortId, actual) != actual:
+                wrong[cohortId] = (stored[cohortId], actual)
+        for cohortId, (stored, actual) in wrong.items():
+            Cohort.objects.filter(pk=cohortId).update(participantCount=actual)
+    return wrong
+
+
+class Command(BaseCommand):
+    help = "Recounts Cohort.participantCount from the participants, fixing any that have drifted."
+
+    def add_arguments(self, parser):
+        parser.add_argument('cohorts', nargs='*',
+            help="Only recount these cohort ids (default: every cohort).")
+
+    def handle(self, *args, **options):
+        wrong = recount(options['cohorts'])
+        for cohortId, (stored, actual) in sorted(wrong.items()):
+            self.stdout.write("%s had %d, has %d" % (cohortId, stored, actual))
+        self.stdout.write("Fixed %d cohort(s)" % len(wrong))
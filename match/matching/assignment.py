@@ -0,0 +1,328 @@
+"""
+Global mentor assignment.
+
+Turns a cohort's MentorshipScores into Mentorship rows by solving a maximum
+weight bipartite assignment: every mentee gets at most one mentor, every
+mentor takes at most their capacity of mentees, and the total score of the
+chosen pairs is as large as possible. Ranking each mentee on their own lets
+a popular mentor end up at the top of everyone's list; this does not.
+
+solve() treats it as a min-cost flow where each mentee sends one unit either
+to a mentor with a free place or to staying unassigned. Costs are (best
+score - score), so they are never negative, and are kept reduced by node
+potentials. It works in phases: a Dijkstra search from every mentee still to
+be placed finds the cheapest way any of them can be placed and moves the
+potentials so that exactly the cheapest paths cost nothing, then a depth
+first search places as many of those mentees as it can along zero cost
+paths, moving already placed mentees along the way when that frees up a
+better mentor. Every placement is along a cheapest path, so the result is
+optimal, and one phase usually places a large batch of mentees at once.
+
+Only pairs with a positive score are edges, and a mentee's edges are looked
+at cheapest first and only as far as the search actually needs; edges into
+mentors a search has already finished with are stepped over without going
+through its heap.
+
+Every edge is still sorted and, when not every mentee can be placed, looked
+at before a mentee is left unassigned, so time grows with the number of
+pairs that score above zero. A dense 5000 x 1000 cohort, where nearly every
+pair shares a tag, takes about five seconds (benchmark_suite --dense). When
+scores are all different, as with IDF weights, phases place few mentees
+each and the same size can take close to a minute.
+"""
+from bisect import bisect_right
+from django.db import transaction
+from match.matching.capacity import available, remaining, reserve
+from match.models import Mentorship, MentorshipScore, Participant
+import heapq
+
+# Heap entry kinds, in the order entries with equal distance are taken.
+_MENTEE, _MENTOR, _UNASSIGNED, _EDGE = range(4)
+
+# Marks the end of a path where the last mentee on it is left unassigned.
+_DROP = object()
+
+# Largest number of ids put in a single IN (...) clause.
+IN_CHUNK_SIZE = 500
+
+class _Flow(object):
+    # Residual graph and potentials for solve().
+
+    def __init__(self, edges, capacity, top):
+        self.edges = edges
+        self.edgeCosts = [[c for c, j in row] for row in edges]
+        self.costs = [{j: c for c, j in row} for row in edges]
+        self.capacity = capacity
+        self.top = top
+        self.assigned = [None] * len(edges)
+        self.holders = [set() for _ in capacity]
+        # Mentors with room and the unassigned sink always keep a potential
+        # of 0, and the others only ever go down.
+        self.menteePotential = [0] * len(edges)
+        self.mentorPotential = [0] * len(capacity)
+
+    def has_room(self, j):
+        return len(self.holders[j]) < self.capacity[j]
+
+    # Runs Dijkstra from every mentee in sources at once, stopping at the
+    # first free mentor or drop out, then lowers the potentials of everything
+    # closer than that so every cheapest path has a reduced cost of 0.
+    def reprice(self, sources):
+        menteePotential, mentorPotential = self.menteePotential, self.mentorPotential
+        edges, costs = self.edges, self.costs
+        menteeDone, mentorDone = {}, {}
+        menteeDist, mentorDist = {}, {}
+        heap = []
+        for i in sources:
+            menteeDist[i] = 0
+            heap.append((0, _MENTEE, i, 0))
+        heapq.heapify(heap)
+
+        distance = None
+        while heap:
+            d, kind, x, k = heapq.heappop(heap)
+            if kind == _MENTEE:
+                if x in menteeDone:
+                    continue
+                menteeDone[x] = d
+                base = d + menteePotential[x]
+                heapq.heappush(heap, (base + self.top, _UNASSIGNED, x, 0))
+                k = self._next_edge(x, 0, mentorDone)
+                if k is not None:
+                    heapq.heappush(heap, (base + edges[x][k][0], _EDGE, x, k))
+            elif kind == _EDGE:
+                # Mentor potentials are never above 0, so cost + the mentee's
+                # potential bounds the reduced cost of this edge and of every
+                # edge after it from below.
+                c, j = edges[x][k]
+                n = self._next_edge(x, k + 1, mentorDone)
+                if n is not None:
+                    heapq.heappush(heap, (menteeDone[x] + menteePotential[x] + edges[x][n][0], _EDGE, x, n))
+                if j == self.assigned[x] or j in mentorDone:
+                    continue
+                nd = menteeDone[x] + c + menteePotential[x] - mentorPotential[j]
+                if nd < mentorDist.get(j, nd + 1):
+                    mentorDist[j] = nd
+                    heapq.heappush(heap, (nd, _MENTOR, j, 0))
+            elif kind == _MENTOR:
+                if x in mentorDone:
+                    continue
+                mentorDone[x] = d
+                if self.has_room(x):
+                    distance = d
+                    break
+                for i in self.holders[x]:
+                    if i in menteeDone:
+                        continue
+                    nd = d - costs[i][x] + mentorPotential[x] - menteePotential[i]
+                    if nd < menteeDist.get(i, nd + 1):
+                        menteeDist[i] = nd
+                        heapq.heappush(heap, (nd, _MENTEE, i, 0))
+            else:
+                distance = d
+                break
+
+        # Sources that were never reached sit at distance 0 like the rest.
+        for i in sources:
+            menteeDone.setdefault(i, 0)
+        for i, d in menteeDone.items():
+            menteePotential[i] += d - distance
+        for j, d in mentorDone.items():
+            mentorPotential[j] += d - distance
+
+    # Returns the index of mentee i's first edge from k on whose mentor isn't
+    # in done, or None. Edges into mentors Dijkstra has already finished
+    # can't shorten anything, and skipping them here rather than popping them
+    # off the heap one by one is what keeps dense problems, where nearly
+    # every edge ends up behind a finished mentor, from costing two heap
+    # operations an edge.
+    def _next_edge(self, i, k, done):
+        row = self.edges[i]
+        while k < len(row) and row[k][1] in done:
+            k += 1
+        return k if k < len(row) else None
+
+    # Looks for a zero reduced cost path from source to a free mentor or a
+    # drop out, never entering a node in seen, and returns it as an
+    # alternating list of mentees and mentors (ending in _DROP when the last
+    # mentee is left unassigned), or None.
+    def find_path(self, source, seen):
+        menteePotential, mentorPotential = self.menteePotential, self.mentorPotential
+        seen.add((_MENTEE, source))
+        path = [source]
+        stack = [self._mentee_moves(source)]
+        while stack:
+            step = next(stack[-1], None)
+            if step is None:
+                stack.pop()
+                path.pop()
+                continue
+            if step is _DROP:
+                path.append(_DROP)
+                return path
+            kind, x = step
+            if (kind, x) in seen:
+                continue
+            seen.add((kind, x))
+            path.append(x)
+            if kind == _MENTOR:
+                if self.has_room(x):
+                    return path
+                stack.append(self._mentor_moves(x))
+            else:
+                stack.append(self._mentee_moves(x))
+        return None
+
+    def _mentee_moves(self, i):
+        potential = self.menteePotential[i]
+        row = self.edges[i]
+        # Only edges with cost <= -potential can have a reduced cost of 0.
+        for n in range(bisect_right(self.edgeCosts[i], -potential)):
+            c, j = row[n]
+            if j != self.assigned[i] and c + potential - self.mentorPotential[j] == 0:
+                yield (_MENTOR, j)
+        if self.top + potential == 0:
+            yield _DROP
+
+    def _mentor_moves(self, j):
+        potential = self.mentorPotential[j]
+        for i in list(self.holders[j]):
+            if potential - self.costs[i][j] - self.menteePotential[i] == 0:
+                yield (_MENTEE, i)
+
+    # Moves every mentee on a path found by find_path() one place along.
+    def augment(self, path):
+        if path[-1] is _DROP:
+            path = path[:-1]
+            last = path[-1]
+            if self.assigned[last] is not None:
+                self.holders[self.assigned[last]].discard(last)
+            self.assigned[last] = None
+            path = path[:-1]
+        for n in range(0, len(path) - 1, 2):
+            i, j = path[n], path[n + 1]
+            if self.assigned[i] is not None:
+                self.holders[self.assigned[i]].discard(i)
+            self.holders[j].add(i)
+            self.assigned[i] = j
+
+# Returns the optimal {mentee: mentor} assignment.
+#
+# weights maps each mentee to an iterable of (mentor, score) pairs and
+# capacities maps each mentor to the number of mentees they can take. Pairs
+# with a score of zero or less, and mentors missing from capacities, are
+# never assigned. Ties are broken by the order of the two mappings.
+def solve(weights, capacities):
+    mentors = list(capacities)
+    mentorIndex = {mentor: j for j, mentor in enumerate(mentors)}
+    capacity = [max(0, capacities[mentor]) for mentor in mentors]
+    mentees = list(weights)
+
+    usable = []
+    top = 0
+    for mentee in mentees:
+        row = [
+            (mentorIndex[mentor], score)
+            for mentor, score in weights[mentee]
+            if score > 0 and mentor in mentorIndex and capacity[mentorIndex[mentor]]
+        ]
+        usable.append(row)
+        if row:
+            top = max(top, max(score for j, score in row))
+
+    # Each mentee's edges as (cost, mentor), cheapest first.
+    flow = _Flow([sorted((top - score, j) for j, score in row) for row in usable], capacity, top)
+
+    pending = list(range(len(mentees)))
+    while pending:
+        flow.reprice(pending)
+        seen = set()
+        remaining = []
+        for i in pending:
+            path = flow.find_path(i, seen)
+            if path is None:
+                remaining.append(i)
+            else:
+                flow.augment(path)
+        pending = remaining
+
+    return {
+        mentees[i]: mentors[j]
+        for i, j in enumerate(flow.assigned)
+        if j is not None
+    }
+
+# Baseline for comparison: takes pairs best score first while both sides
+# still have room.
+def greedy(weights, capacities):
+    remaining = dict(capacities)
+    pairs = sorted(
+        ((score, n, mentee, mentor)
+        for n, mentee in enumerate(weights)
+        for mentor, score in weights[mentee]
+        if score > 0 and remaining.get(mentor, 0) > 0),
+        key=lambda p: (-p[0], p[1])
+    )
+    result = {}
+    for score, n, mentee, mentor in pairs:
+        if mentee not in result and remaining[mentor] > 0:
+            result[mentee] = mentor
+            remaining[mentor] -= 1
+    return result
+
+# Total score of an assignment.
+def total_score(weights, assignment):
+    scores = {mentee: dict(row) for mentee, row in weights.items()}
+    return sum(scores[mentee][mentor] for mentee, mentor in assignment.items())
+
+# Returns the scores and remaining mentor capacities for the cohort's mentees
+# that do not have a mentor yet. Saturated mentors are left out.
+def load_problem(cohort):
+    mentees = list(cohort.participants.filter(
+        isMentor=False, isMatched=False
+    ).order_by('signUpDate', 'participantId').values_list('participantId', flat=True))
+    capacities = {
+        row[0]: remaining(*row[1:])
+        for row in cohort.participants.filter(available(), isMentor=True).order_by(
+            'signUpDate', 'participantId'
+        ).values_list('participantId', 'capacity', 'load', 'user__profile__mentorCapacity', 'user__profile__mentorLoad')
+    }
+
+    weights = {mentee: [] for mentee in mentees}
+    rows = MentorshipScore.objects.filter(
+        mentee__cohort=cohort,
+        mentee__isMatched=False,
+        score__gt=0
+    ).values_list('mentee_id', 'mentor_id', 'score')
+    for mentee, mentor, score in rows:
+        if mentee in weights:
+            weights[mentee].append((mentor, score))
+    return weights, capacities
+
+# Assigns mentors to every unmatched mentee in the cohort that can have one,
+# writes the Mentorship rows and flags both sides as matched. Returns the
+# {menteeId: mentorId} assignment that was made.
+def assign_cohort(cohort):
+    weights, capacities = load_problem(cohort)
+    return save_assignment(solve(weights, capacities))
+
+# Writes the Mentorship rows of a {menteeId: mentorId} assignment and flags
+# both sides as matched, returning the part of the assignment made: mentors
+# that have no room left by then keep only the mentees that still fit.
+def save_assignment(assignment):
+    if not assignment:
+        return assignment
+
+    with transaction.atomic():
+        # Mentors may have filled up since the problem was loaded.
+        assignment = reserve(assignment)
+        Mentorship.objects.bulk_create([
+            Mentorship(mentee_id=mentee, mentor_id=mentor)
+            for mentee, mentor in assignment.items()
+        ])
+        matched = list(assignment) + list(set(assignment.values()))
+        for start in range(0, len(matched), IN_CHUNK_SIZE):
+            Participant.objects.filter(
+                participantId__in=matched[start:start + IN_CHUNK_SIZE]
+            ).update(isMatched=True)
+    return assignment
@@ -0,0 +1,99 @@
+"""
+Mentor capacity and load.
+
+A mentor takes at most Participant.capacity mentees in each cohort, and if
+their UserProfile.mentorCapacity is set, at most that many over all their
+cohorts together. Participant.load and UserProfile.mentorLoad count the
+mentees they have now, so whether a mentor is saturated is a comparison of
+two columns that queries can filter on instead of counting Mentorships.
+
+Assigning reserves places with reserve(), which locks the mentors' rows,
+keeps only as many of the new mentees as still fit and raises the counters
+in the same transaction, so assignments running at the same time can never
+take a mentor past either capacity.
+"""
+from django.db.models import F, Q
+from match.models import Participant, UserProfile
+
+# Largest number of ids put in a single IN (...) clause.
+IN_CHUNK_SIZE = 500
+
+# Returns a filter for mentors with room for another mentee, on Participant
+# or, with a prefix such as 'mentor__', on a model pointing to one.
+def available(prefix=''):
+    return Q(**{prefix + 'load__lt': F(prefix + 'capacity')}) & (
+        Q(**{prefix + 'user__profile__mentorCapacity__isnull': True}) |
+        Q(**{prefix + 'user__profile__mentorLoad__lt': F(prefix + 'user__profile__mentorCapacity')})
+    )
+
+# Returns how many more mentees a mentor with the given capacities and loads
+# can take.
+def remaining(capacity, load, mentorCapacity, mentorLoad):
+    room = capacity - load
+    if mentorCapacity is not None:
+        room = min(room, mentorCapacity - mentorLoad)
+    return max(room, 0)
+
+def _chunks(ids, size=IN_CHUNK_SIZE):
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+# Takes places for a {menteeId: mentorId} assignment, returning the part of
+# it that fit: mentors that filled up in the meantime keep the mentees that
+# come first in the assignment. Must run inside a transaction, which holds
+# the mentors' rows locked until it ends.
+def reserve(assignment):
+    mentees = {}
+    for mentee, mentor in assignment.items():
+        mentees.setdefault(mentor, []).append(mentee)
+
+    rooms = {}
+    for chunk in _chunks(sorted(mentees)):
+        rows = Participant.objects.select_for_update().filter(participantId__in=chunk).values_list(
+            'participantId', 'user_id', 'capacity', 'load'
+        )
+        for mentor, user, capacity, load in rows:
+            rooms[mentor] = (user, capacity - load)
+    users = sorted(set(user for user, room in rooms.values()))
+    profiles = {}
+    for chunk in _chunks(users):
+        rows = UserProfile.objects.select_for_update().filter(user_id__in=chunk).values_list(
+            'user_id', 'mentorCapacity', 'mentorLoad'
+        )
+        for user, mentorCapacity, mentorLoad in rows:
+            if mentorCapacity is not None:
+                profiles[user] = mentorCapacity - mentorLoad
+
+    reserved = {}
+    taken = {}
+    for mentor in sorted(mentees):
+        if mentor not in rooms:
+            continue
+        user, room = rooms[mentor]
+        if user in profiles:
+            room = min(room, profiles[user])
+        kept = mentees[mentor][:max(room, 0)]
+        if not kept:
+            continue
+        if user in profiles:
+            profiles[user] -= len(kept)
+        taken[mentor] = (user, len(kept))
+        for mentee in kept:
+            reserved[mentee] = mentor
+
+    userTaken = {}
+    for mentor, (user, n) in taken.items():
+        userTaken[user] = userTaken.get(user, 0) + n
+    _add(Participant, 'participantId', 'load', dict((m, n) for m, (user, n) in taken.items()))
+    _add(UserProfile, 'user_id', 'mentorLoad', userTaken)
+    return reserved
+
+# Adds {key: n} to a counter field with one update per distinct n, of which
+# there are few.
+def _add(model, key, field, counts):
+    byCount = {}
+    for pk, n in counts.items():
+        byCount.setdefault(n, []).append(pk)
+    for n, pks in byCount.items():
+        for chunk in _chunks(sorted(pks)):
+            model.objects.filter(**{key + '__in': chunk}).update(**{field: F(field) + n})
@@ -0,0 +1,355 @@
+"""
+Bulk scoring engine behind Cohort.match().
+
+A score is the number of tags a mentee shares with a mentor, exactly what
+MentorshipScore.calculateScore() works out for a single pair. Here it is
+worked out for many pairs at once, a block of mentees at a time, through an
+inverted index of which mentors have each tag, so pairs that share no tag
+are never looked at. Only pairs with a score other than 0 are stored, and a
+pair without a MentorshipScore row counts as scoring 0 everywhere scores are
+read. The rows are written with bulk_create() in bounded batches inside one
+transaction. Each mentee's best mentors, counting those they share nothing
+with, are ranked in MentorRanking as their scores are written.
+
+Memory is bounded whatever the size of the cohort. The mentors' tags are
+read once and kept indexed for the whole run, while the mentees are read
+a page at a time, each page fetched by its own query after the last id of
+the one before, then scored against them, written and dropped before the
+next. Pages and write batches are sized from the MATCH_MEMORY_LIMIT setting.
+
+Runs are incremental. Each participant carries a tagVersion that is bumped
+whenever their tags change and a scoredVersion recording which tagVersion
+their scores were worked out from, so a run only rescores the participants
+where the two differ and the work scales with the number of changes rather
+than with the size of the cohort. Running it again with nothing changed
+writes nothing. Scores of withdrawn participants go with them, through the
+MentorshipScore foreign keys. Rescoring a pair would drop the bonus
+setTopThree() added to it, so each run reads the bonuses back from the
+mentees' Preferences and adds them again. Under IDF scoring every score depends on the
+weights of the cohort's tags, so a run whose weights differ from those saved
+by the last one rescores the whole cohort, and the same goes for a change to
+the programme's ScoringProfile, whose extra terms are added to each block of
+tag scores by match.matching.profiles. Each run holds a lock on its cohort's
+row, so runs for the same cohort from different processes never overlap.
+
+Approximate runs swap the inverted index for the MinHash buckets of
+match.matching.minhash, which only offer each mentee the mentors most likely
+to be close to them, and add scoring profile terms to those pairs alone.
+They always rescore the whole cohort, and the cohort is flagged so that the
+next exact run does as well.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from match.matching.minhash import LSHIndex, MinHashLSH
+from match.matching.profiles import compile_profile
+from match.matching.ranking import RankingWriter, load_rankings, rank_mentees
+from match.matching.tags import TagBitsets, TagPostings, TagVocabulary, idf_weights, load_tags
+from match.models import Cohort, MentorRanking, MentorshipScore, Participant, Programme, ScoringProfile, TagWeight, preference_bonuses
+import numpy as np
+
+# Number of MentorshipScore rows handed to each bulk_create() call.
+BATCH_SIZE = 1000
+
+# Most mentees scored at once.
+PAGE_SIZE = 500
+
+# Rough bytes held per mentee being scored and per score waiting to be
+# written, used to size pages and batches to MATCH_MEMORY_LIMIT.
+MENTEE_BYTES = 4096
+SCORE_BYTES = 1024
+
+# Bytes a run may use when MATCH_MEMORY_LIMIT isn't set.
+DEFAULT_MEMORY_LIMIT = 32 * 1024 * 1024
+
+# Participants whose scores are missing or out of date.
+STALE = Q(scoredVersion__isnull=True) | Q(scoredVersion__lt=F('tagVersion'))
+
+# Largest number of ids put in a single IN (...) clause.
+IN_CHUNK_SIZE = 500
+
+# Splits a list into IN_CHUNK_SIZE sized pieces.
+def _chunks(ids, size=IN_CHUNK_SIZE):
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+class _ScoreWriter(object):
+    # Buffers MentorshipScore rows and writes them with bulk_create(),
+    # reporting the pairs scored so far with each batch to an optional
+    # progress(scored, total) callback.
+
+    def __init__(self, batch_size, total=0, progress=None):
+        self.batch_size = batch_size
+        self.total = total
+        self.progress = progress
+        self.batch = []
+        self.scored = 0
+        self.written = 0
+
+    # Adds a block of scores, a len(menteeIds) x len(mentorIds) matrix,
+    # keeping only those other than 0.
+    def add_block(self, menteeIds, mentorIds, scores):
+        rows, columns = np.nonzero(scores)
+        for row, column, score in zip(rows.tolist(), columns.tolist(), scores[rows, columns].tolist()):
+            self.add(menteeIds[row], mentorIds[column], score)
+        self.scored += scores.size
+
+    def add(self, menteeId, mentorId, score):
+        self.batch.append(MentorshipScore(mentee_id=menteeId, mentor_id=mentorId, score=score))
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.batch:
+            MentorshipScore.objects.bulk_create(self.batch)
+            self.written += len(self.batch)
+            self.batch = []
+        if self.progress:
+            self.progress(self.scored, self.total)
+
+# Scores every mentee in a set of bitsets against every mentor in a
+# TagPostings, weighting shared tags if given an array of weights over the
+# vocabulary, adding scoring profile terms if given a compiled profile and
+# setTopThree() bonuses if given preference_bonuses(), and ranking the
+# mentees' mentors as well if given a RankingWriter.
+def _score_block(writer, mentees, mentors, ranker=None, weights=None, profile=None, bonuses=None):
+    if not (len(mentees) and len(mentors)):
+        return
+    if profile:
+        profile = profile.block(mentees.ids, mentors.ids)
+    columns = {mentorId: column for column, mentorId in enumerate(mentors.ids)} if bonuses else {}
+    # Only hold one batch worth of overlaps in memory at a time.
+    rowsPerChunk = max(1, writer.batch_size // len(mentors))
+    for start in range(0, len(mentees), rowsPerChunk):
+        rows = slice(start, start + rowsPerChunk)
+        if profile and isinstance(mentors, LSHIndex):
+            # Profile terms would give nearly every pair a score, so keep
+            # them to the pairs MinHash picked.
+            candidates = np.zeros((len(mentees.ids[rows]), len(mentors)), dtype=bool)
+            overlap = mentors.overlap(mentees, rows, weights, candidates)
+            overlap = np.where(candidates, profile.apply(overlap, rows), 0)
+        else:
+            overlap = mentors.overlap(mentees, rows, weights)
+            if profile:
+                overlap = profile.apply(overlap, rows)
+        menteeIds = mentees.ids[start:start + rowsPerChunk]
+        for row, menteeId in enumerate(menteeIds):
+            for mentorId, points in (bonuses or {}).get(menteeId, {}).items():
+                if mentorId in columns:
+                    overlap[row, columns[mentorId]] += points
+        if ranker:
+            ranker.add_block(menteeIds, mentors.ids, overlap)
+        writer.add_block(menteeIds, mentors.ids, overlap)
+
+# Returns the cohorts that closed before the given time and whose scores are
+# missing or out of date: they have participants who changed tags since they
+# were last scored, their programme's ScoringProfile changed or was added or
+# removed, they were last scored approximately, or their programme switched
+# to or from IDF weights since.
+def stale_cohorts(closedBefore):
+    stale = Participant.objects.filter(STALE, cohort__closeDate__lte=closedBefore).values('cohort')
+    profiled = Q(programme__scoringProfile__isnull=False)
+    weighted = Q(cohortId__in=TagWeight.objects.values('cohort'))
+    scored = Q(cohortId__in=MentorshipScore.objects.values('mentee__cohort'))
+    return Cohort.objects.filter(closeDate__lte=closedBefore).filter(
+        Q(cohortId__in=stale) |
+        Q(profiled, profileVersion__isnull=True) |
+        Q(profiled, ~Q(profileVersion=F('programme__scoringProfile__version'))) |
+        Q(programme__scoringProfile__isnull=True, profileVersion__isnull=False) |
+        Q(isApproximate=True) |
+        Q(scored, ~weighted, programme__scoringMode=Programme.IDF) |
+        Q(weighted, ~Q(programme__scoringMode=Programme.IDF))
+    )
+
+# Scores every mentee/mentor pair in the cohort that involves a participant
+# whose tags changed since they were last scored, or every pair if full is
+# set, and returns the number of pairs scored. approximate, True or a
+# MinHashLSH, scores only the candidate pairs MinHash picks instead.
+def score_cohort(cohort, full=False, batch_size=BATCH_SIZE, progress=None, limit=None, approximate=None):
+    if limit is None:
+        limit = getattr(settings, 'MATCH_MEMORY_LIMIT', DEFAULT_MEMORY_LIMIT)
+    if approximate is True:
+        approximate = MinHashLSH()
+    with transaction.atomic():
+        # Runs for the same cohort take turns, so a second one started while
+        # the first is still going finds nothing left to do.
+        Cohort.objects.select_for_update().get(pk=cohort.pk)
+        return _score_changes(cohort, full, batch_size, progress, limit, approximate or None)
+
+# Returns the cohort's IDF weights if its programme scores by IDF, and
+# whether they differ from those the existing scores were worked out with,
+# saving them if so.
+def _update_weights(cohort, programme):
+    weights = None
+    if programme.scoringMode == Programme.IDF:
+        weights = idf_weights(cohort)
+    saved = dict(cohort.tagWeights.values_list('tag_id', 'weight'))
+    if (weights or {}) == saved:
+        return weights, False
+    cohort.tagWeights.all().delete()
+    if weights:
+        TagWeight.objects.bulk_create([
+            TagWeight(cohort=cohort, tag_id=tagId, weight=weight) for tagId, weight in weights.items()
+        ])
+    return weights, True
+
+# Returns whether the programme's scoring profile has changed since the
+# cohort was last scored, recording the version now in use.
+def _update_profile_version(cohort, programme):
+    try:
+        version = programme.scoringProfile.version
+    except ScoringProfile.DoesNotExist:
+        version = None
+    if version == cohort.profileVersion:
+        return False
+    Cohort.objects.filter(pk=cohort.pk).update(profileVersion=version)
+    cohort.profileVersion = version
+    return True
+
+# Returns whether switching between approximate and exact scoring means the
+# whole cohort needs rescoring, recording which this run is.
+def _update_approximate(cohort, approximate):
+    isApproximate = approximate is not None
+    if not (isApproximate or cohort.isApproximate):
+        return False
+    if isApproximate != cohort.isApproximate:
+        Cohort.objects.filter(pk=cohort.pk).update(isApproximate=isApproximate)
+        cohort.isApproximate = isApproximate
+    return True
+
+# Yields pages of rows from a values_list() queryset whose first column is
+# participantId, in participantId order. Each page is fetched by its own
+# query starting after the last id of the one before, so however many rows
+# there are only one page is ever held at a time.
+def _pages(rows, size):
+    last = None
+    while True:
+        page = rows if last is None else rows.filter(participantId__gt=last)
+        page = list(page.order_by('participantId')[:size])
+        if page:
+            yield page
+        if len(page) < size:
+            return
+        last = page[-1][0]
+
+# Marks participants as scored at the given tagVersions, {participantId:
+# tagVersion}. Only those whose tags have not moved on again while we were
+# scoring are marked; anyone else is picked up by the next run.
+def _mark_scored(changed):
+    versions = {}
+    for participantId, tagVersion in changed.items():
+        versions.setdefault(tagVersion, []).append(participantId)
+    for tagVersion, ids in versions.items():
+        for chunk in _chunks(ids):
+            Participant.objects.filter(
+                participantId__in=chunk,
+                tagVersion=tagVersion
+            ).update(scoredVersion=tagVersion)
+
+# Works out how many mentees to score at once and how many scores to write
+# at once so that a run stays within about `limit` bytes.
+def _sizes(limit, batch_size):
+    half = max(limit // 2, 1)
+    return (max(1, min(PAGE_SIZE, half // MENTEE_BYTES)),
+        max(1, min(batch_size, half // SCORE_BYTES)))
+
+def _score_changes(cohort, full, batch_size, progress, limit, approximate):
+    programme = Programme.objects.select_related('scoringProfile').get(cohorts=cohort)
+    weights, moved = _update_weights(cohort, programme)
+    full = _update_profile_version(cohort, programme) or moved or full
+    full = _update_approximate(cohort, approximate) or full
+
+    # Mentors are kept in memory for the whole run. Sorted so that mentors
+    # with equal scores are ranked by id.
+    mentors, changedMentors = [], {}
+    rows = cohort.participants.filter(isMentor=True).order_by('participantId')
+    for participantId, tagVersion, scoredVersion in rows.values_list('participantId', 'tagVersion', 'scoredVersion'):
+        mentors.append(participantId)
+        if full or scoredVersion != tagVersion:
+            changedMentors[participantId] = tagVersion
+    changedMentorIds = [p for p in mentors if p in changedMentors]
+
+    mentees = cohort.participants.filter(isMentor=False)
+    menteeCount = mentees.count()
+    changedMenteeCount = menteeCount if full else mentees.filter(STALE).count()
+    if not (changedMentors or changedMenteeCount):
+        return 0
+    # With no mentor changed, mentees whose own tags are unchanged have
+    # nothing to rescore and needn't be read at all.
+    if not (full or changedMentors):
+        mentees = mentees.filter(STALE)
+
+    mentorTags = load_tags(participant__cohort=cohort, participant__isMentor=True)
+    # Tags no mentor has can't add to any score, so leave them out.
+    vocabulary = TagVocabulary()
+    for names in mentorTags.values():
+        for name in names:
+            vocabulary.add(name)
+    if weights is not None:
+        weights = vocabulary.weight_array(weights)
+    if approximate:
+        mentorIndex = approximate.index(vocabulary, mentors, mentorTags)
+    else:
+        mentorIndex = TagPostings(vocabulary, mentors, mentorTags)
+    changedMentorIndex = TagPostings(vocabulary, changedMentorIds, mentorTags)
+    del mentorTags
+    profile = compile_profile(programme, participantId__in=mentors)
+
+    pageSize, batch_size = _sizes(limit, batch_size)
+    total = changedMenteeCount * len(mentors) + (menteeCount - changedMenteeCount) * len(changedMentors)
+    writer = _ScoreWriter(batch_size, total, progress)
+    if full:
+        MentorshipScore.objects.filter(mentee__cohort=cohort).delete()
+        MentorRanking.objects.filter(mentee__cohort=cohort).delete()
+    else:
+        for ids in _chunks(changedMentorIds):
+            MentorshipScore.objects.filter(mentor_id__in=ids).delete()
+
+    for page in _pages(mentees.values_list('participantId', 'tagVersion', 'scoredVersion'), pageSize):
+        changed, changedIds, unchangedIds = {}, [], []
+        for participantId, tagVersion, scoredVersion in page:
+            if full or scoredVersion != tagVersion:
+                changed[participantId] = tagVersion
+                changedIds.append(participantId)
+            else:
+                unchangedIds.append(participantId)
+        tags = load_tags(participant_id__in=changedIds + (unchangedIds if changedMentors else []))
+        if profile:
+            profile.load(participantId__in=[p for p, v, s in page])
+
+        # Rankings of mentees who only see some mentors rescored are merged
+        # with what they held before, unless that already listed a changed
+        # mentor.
+        previous, stale = {}, []
+        if changedMentors and unchangedIds:
+            previous, stale = load_rankings(unchangedIds, changedMentorIds, len(mentors) - len(changedMentors))
+        if not full:
+            if changedIds:
+                MentorshipScore.objects.filter(mentee_id__in=changedIds).delete()
+            rerank = changedIds + (unchangedIds if changedMentors else [])
+            if rerank:
+                MentorRanking.objects.filter(mentee_id__in=rerank).delete()
+
+        # Rescoring a pair drops any setTopThree() bonus it held, so add
+        # them back.
+        bonuses = preference_bonuses(changedIds + (unchangedIds if changedMentors else []), programme.scoreScale)
+        ranker, merger = RankingWriter(), RankingWriter(previous=previous)
+        _score_block(writer,
+            TagBitsets(vocabulary, changedIds, tags),
+            mentorIndex,
+            ranker, weights, profile, bonuses)
+        if changedMentors:
+            _score_block(writer,
+                TagBitsets(vocabulary, unchangedIds, tags),
+                changedMentorIndex,
+                merger, weights, profile, bonuses)
+        writer.flush()
+        ranker.flush()
+        merger.flush()
+        rank_mentees(stale, mentorIds=mentors, readSize=batch_size)
+        _mark_scored(changed)
+        if profile:
+            profile.unload([p for p, v, s in page])
+
+    _mark_scored(changedMentors)
+    return writer.scored
@@ -0,0 +1,128 @@
+"""
+Approximate candidate generation with MinHash and locality-sensitive hashing.
+
+For very large cohorts even the inverted index finds too many pairs sharing
+some tag. An approximate run instead gives every participant a MinHash
+signature of their tags: bands * rows hash functions, each keeping the
+smallest hash of any of their tags, so two participants agree on a position
+with probability equal to the Jaccard similarity of their tags. Signatures
+are cut into bands of rows positions and mentors are bucketed by each band;
+a mentee's candidates are the mentors sharing a bucket with them in at least
+one band, and only those pairs are scored, exactly as the engine would,
+scoring profile terms included; every other pair scores 0.
+
+A pair with similarity s becomes a candidate with probability
+1 - (1 - s ** rows) ** bands, so more bands or fewer rows per band raise
+recall at the cost of more candidates. candidates, if set, keeps only that
+many per mentee, those whose signatures agree on the most positions.
+"""
+from match.matching.tags import POPCOUNT, TagBitsets
+import numpy as np
+
+# Default number of bands and of signature positions per band.
+BANDS = 32
+ROWS = 2
+
+# Modulus of the hash functions, a Mersenne prime above any tag id.
+PRIME = (1 << 31) - 1
+
+class MinHashLSH(object):
+    # Settings for an approximate run, passed as Cohort.match(approximate=).
+    # The hash functions are drawn from seed, so the same settings always
+    # pick the same candidates.
+
+    def __init__(self, bands=BANDS, rows=ROWS, candidates=None, seed=0):
+        if bands < 1 or rows < 1:
+            raise ValueError("bands and rows must be at least 1")
+        self.bands = bands
+        self.rows = rows
+        self.candidates = candidates
+        self.seed = seed
+
+    # Chance that a pair with the given Jaccard similarity is a candidate.
+    def probability(self, similarity):
+        return 1 - (1 - similarity ** self.rows) ** self.bands
+
+    # Returns a bands * rows x vocabulary array of every hash function
+    # applied to every tag id.
+    def hashes(self, vocabularySize):
+        rng = np.random.RandomState(self.seed)
+        count = self.bands * self.rows
+        a = rng.randint(1, PRIME, size=(count, 1)).astype(np.int64)
+        b = rng.randint(0, PRIME, size=(count, 1)).astype(np.int64)
+        return (a * np.arange(vocabularySize, dtype=np.int64) + b) % PRIME
+
+    def index(self, vocabulary, ids, tags):
+        return LSHIndex(self, vocabulary, ids, tags)
+
+# Returns the MinHash signatures of rows of packed tag bits, one row per
+# participant, and whether each participant has any tags to sign.
+def signatures(bits, hashes):
+    size = hashes.shape[1]
+    sigs = np.full((len(bits), hashes.shape[0]), PRIME, dtype=np.int64)
+    tagged = np.zeros(len(bits), dtype=bool)
+    for row, packed in enumerate(bits):
+        tagIds = np.flatnonzero(np.unpackbits(packed)[:size])
+        if len(tagIds):
+            sigs[row] = hashes[:, tagIds].min(axis=1)
+            tagged[row] = True
+    return sigs, tagged
+
+class LSHIndex(object):
+    # Mentors bucketed by band of their MinHash signatures. Scores mentees
+    # like TagPostings, but only against their candidates.
+
+    def __init__(self, lsh, vocabulary, ids, tags):
+        self.lsh = lsh
+        self.vocabulary = vocabulary
+        self.ids = list(ids)
+        self.bitsets = TagBitsets(vocabulary, self.ids, tags)
+        self.hashes = lsh.hashes(len(vocabulary))
+        self.signatures, tagged = signatures(self.bitsets.bits, self.hashes)
+        self.buckets = {}
+        for column in np.flatnonzero(tagged).tolist():
+            for band, key in enumerate(self._keys(self.signatures[column])):
+                self.buckets.setdefault((band, key), []).append(column)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _keys(self, signature):
+        rows = self.lsh.rows
+        return [signature[start:start + rows].tobytes() for start in range(0, len(signature), rows)]
+
+    # Returns the columns of the mentors sharing a bucket with a signature.
+    def candidates(self, signature):
+        columns = set()
+        for band, key in enumerate(self._keys(signature)):
+            columns.update(self.buckets.get((band, key), ()))
+        columns = np.array(sorted(columns), dtype=np.int64)
+        limit = self.lsh.candidates
+        if limit is not None and len(columns) > limit:
+            agreement = (self.signatures[columns] == signature).sum(axis=1)
+            # Most similar first, ties by column.
+            columns = np.sort(columns[np.argsort(-agreement, kind='mergesort')[:limit]])
+        return columns
+
+    # Returns a len(rows) x len(self) matrix of shared tag counts, or summed
+    # weights, between the given slice of a TagBitsets over the same
+    # vocabulary and each mentee's candidates, with 0 for everyone else.
+    # If given a boolean array of the same shape as candidates, marks each
+    # mentee's candidates in it.
+    def overlap(self, bitsets, rows=slice(None), weights=None, candidates=None):
+        bits = bitsets.bits[rows]
+        scores = np.zeros((len(bits), len(self.ids)), dtype=np.int64)
+        sigs, tagged = signatures(bits, self.hashes)
+        for row in np.flatnonzero(tagged).tolist():
+            columns = self.candidates(sigs[row])
+            if not len(columns):
+                continue
+            if candidates is not None:
+                candidates[row, columns] = True
+            both = bits[row] & self.bitsets.bits[columns]
+            if weights is None:
+                scores[row, columns] = POPCOUNT[both].sum(axis=1, dtype=np.int64)
+            else:
+                shared = np.unpackbits(both, axis=1)[:, :len(self.vocabulary)]
+                scores[row, columns] = np.rint(shared.dot(weights)).astype(np.int64)
+        return scores
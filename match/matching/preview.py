@@ -0,0 +1,92 @@
+"""
+What-if match previews that write nothing.
+
+preview_cohort() scores a cohort the way Cohort.match() would and ranks each
+mentee's best mentors, but entirely in memory: the participants and their
+tags are read in one query each, edits are applied to those in-memory copies,
+and the result comes back as a plain dict instead of MentorshipScore and
+MentorRanking rows. Staff can try out different tags or a smaller cohort and
+see the matches that would come of it without running the real match.
+"""
+from match.matching.profiles import compile_profile
+from match.matching.ranking import RANKING_SIZE
+from match.matching.tags import TagBitsets, TagPostings, TagVocabulary, idf_weight, load_tags
+from match.models import Programme, Tag
+import numpy as np
+
+# Most pairs scored at once.
+BLOCK_SIZE = 100000
+
+# Returns the matches the cohort would get with the given changes:
+#
+#   tags        {participantId: [tag names]} replacing those participants'
+#               tags; names need not exist yet
+#   cohortSize  only the first cohortSize participants to sign up take part,
+#               as if registration had closed there
+#
+# The result is {'mentees', 'mentors', 'pairs', 'topThree'}, where pairs is
+# the number of pairs with a score other than 0 and topThree maps each
+# mentee id to [[mentorId, score], ...], best first. Raises ValueError for
+# tags given for someone outside the cohort.
+def preview_cohort(cohort, tags=None, cohortSize=None, size=RANKING_SIZE):
+    participants = list(cohort.participants.order_by('signUpDate', 'participantId').values_list(
+        'participantId', 'isMentor'
+    ))
+    if cohortSize is not None:
+        participants = participants[:max(cohortSize, 0)]
+    cohortTags = load_tags(participant__cohort=cohort)
+    ids = set(p for p, isMentor in participants)
+    for participantId in (tags or {}):
+        if participantId not in ids:
+            raise ValueError("%s is not a participant in this cohort" % participantId)
+    if tags:
+        # Tags are stored by id. Names that aren't tags yet stay as they
+        # are, which no id can be mistaken for.
+        tagIds = dict(Tag.objects.filter(
+            name__in=set(name for names in tags.values() for name in names)
+        ).values_list('name', 'pk'))
+        for participantId, names in tags.items():
+            cohortTags[participantId] = [tagIds.get(name, name) for name in names]
+
+    mentees = sorted(p for p, isMentor in participants if not isMentor)
+    mentors = sorted(p for p, isMentor in participants if isMentor)
+    result = {'mentees': len(mentees), 'mentors': len(mentors), 'pairs': 0, 'topThree': {}}
+    if not (mentees and mentors):
+        return result
+
+    programme = Programme.objects.select_related('scoringProfile').get(cohorts=cohort)
+    vocabulary = TagVocabulary()
+    for participantId in mentors:
+        for name in cohortTags.get(participantId, ()):
+            vocabulary.add(name)
+    weights = None
+    if programme.scoringMode == Programme.IDF:
+        weights = vocabulary.weight_array(_idf_weights(cohortTags, ids))
+    mentorIndex = TagPostings(vocabulary, mentors, cohortTags)
+    menteeBits = TagBitsets(vocabulary, mentees, cohortTags)
+    profile = compile_profile(programme, cohort=cohort)
+    if profile:
+        profile = profile.block(mentees, mentors)
+
+    topThree = result['topThree']
+    rowsPerBlock = max(1, BLOCK_SIZE // len(mentors))
+    for start in range(0, len(mentees), rowsPerBlock):
+        rows = slice(start, start + rowsPerBlock)
+        scores = mentorIndex.overlap(menteeBits, rows, weights)
+        if profile:
+            scores = profile.apply(scores, rows)
+        result['pairs'] += int(np.count_nonzero(scores))
+        # A stable sort on the negated scores keeps tied mentors in id order.
+        order = np.argsort(-scores, axis=1, kind='mergesort')[:, :size]
+        for offset, (columns, row) in enumerate(zip(order.tolist(), scores.tolist())):
+            topThree[str(mentees[start + offset])] = [[str(mentors[c]), row[c]] for c in columns]
+    return result
+
+# IDF weights of every tag among the given participants' tags, worked out
+# as match.matching.tags.idf_weights() does from the database.
+def _idf_weights(tags, ids):
+    documents = {}
+    for participantId in ids:
+        for name in set(tags.get(participantId, ())):
+            documents[name] = documents.get(name, 0) + 1
+    return {name: idf_weight(len(ids), count) for name, count in documents.items()}
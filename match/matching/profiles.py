@@ -0,0 +1,111 @@
+"""
+Programme scoring profiles compiled into array arithmetic.
+
+A ScoringProfile adds terms to the tag score of every mentee/mentor pair:
+points per year the mentor has worked longer than the mentee, up to a cap,
+and points for a mentor from another department. Rather than calling
+getYearsWorked() and comparing departments pair by pair, the participants'
+years worked and departments are read in one query, turned into arrays, and
+each block of tag scores coming out of the engine is adjusted with a few
+broadcast operations. Programmes without a profile skip all of this.
+
+The terms go into the stored scores themselves, so they cost storage: with
+a nonzero seniorityWeight or departmentWeight nearly every pair scores
+above zero, and a profiled cohort stores close to mentees x mentors
+MentorshipScores where tag overlap alone stores only the pairs that share a
+tag. Matching, rematching and assigning a profiled cohort scale with that
+too; benchmark_suite --profiled measures both side by side.
+"""
+from datetime import date
+from match.models import Participant, ScoringProfile
+import numpy as np
+
+# Stands in for a missing joinDate or department.
+UNKNOWN = -1
+
+class CompiledProfile(object):
+    # A ScoringProfile together with the features of the participants it
+    # scores: {participantId: years worked} and {participantId: department
+    # code}, with UNKNOWN where the profile is missing a value. Features are
+    # read with load() and can be dropped again with unload(), so a run can
+    # keep its mentors' features while it works through the mentees a page
+    # at a time.
+
+    def __init__(self, profile):
+        self.profile = profile
+        self.years = {}
+        self.departments = {}
+        self.codes = {}
+        self.today = date.today()
+
+    # Reads the features of participants matching the given filters.
+    def load(self, *args, **filters):
+        rows = Participant.objects.filter(*args, **filters).values_list(
+            'participantId', 'user__profile__joinDate', 'user__profile__department'
+        )
+        for participantId, joinDate, department in rows:
+            self.years[participantId] = _years_worked(joinDate, self.today)
+            if department:
+                self.departments[participantId] = self.codes.setdefault(department.strip().lower(), len(self.codes))
+        return self
+
+    def unload(self, ids):
+        for participantId in ids:
+            self.years.pop(participantId, None)
+            self.departments.pop(participantId, None)
+
+    # Returns the profile's terms for scoring the given mentees against the
+    # given mentors.
+    def block(self, menteeIds, mentorIds):
+        return _ProfileBlock(self, menteeIds, mentorIds)
+
+    # Returns the full score of a single pair given their tag score.
+    def score_pair(self, menteeId, mentorId, tagScore):
+        scores = self.block([menteeId], [mentorId]).apply(np.array([[tagScore]], dtype=np.int64))
+        return int(scores[0, 0])
+
+class _ProfileBlock(object):
+
+    def __init__(self, compiled, menteeIds, mentorIds):
+        self.profile = compiled.profile
+        self.menteeYears = _features(compiled.years, menteeIds)
+        self.mentorYears = _features(compiled.years, mentorIds)
+        self.menteeDepartments = _features(compiled.departments, menteeIds)
+        self.mentorDepartments = _features(compiled.departments, mentorIds)
+
+    # Turns a len(rows) x mentors matrix of tag scores for the given slice
+    # of mentees into full scores.
+    def apply(self, tagScores, rows=slice(None)):
+        profile = self.profile
+        scores = tagScores * profile.tagWeight
+        if profile.seniorityWeight:
+            mentees = self.menteeYears[rows][:, np.newaxis]
+            mentors = self.mentorYears[np.newaxis, :]
+            gap = np.clip(mentors - mentees, 0, max(profile.seniorityCap, 0))
+            gap[(mentees == UNKNOWN) | (mentors == UNKNOWN)] = 0
+            scores += profile.seniorityWeight * gap
+        if profile.departmentWeight:
+            mentees = self.menteeDepartments[rows][:, np.newaxis]
+            mentors = self.mentorDepartments[np.newaxis, :]
+            cross = (mentees != mentors) & (mentees != UNKNOWN) & (mentors != UNKNOWN)
+            scores += profile.departmentWeight * cross
+        return scores
+
+# Lines up per-participant features with a list of ids.
+def _features(values, ids):
+    return np.array([values.get(participantId, UNKNOWN) for participantId in ids], dtype=np.int64)
+
+# Whole years between joinDate and today, as UserProfile.getYearsWorked().
+def _years_worked(joinDate, today):
+    if not joinDate:
+        return UNKNOWN
+    return int((today - joinDate).days // 365.25)
+
+# Compiles the programme's scoring profile against participants matching the
+# given filters, or returns None if the programme has none.
+def compile_profile(programme, *args, **filters):
+    try:
+        profile = programme.scoringProfile
+    except ScoringProfile.DoesNotExist:
+        return None
+    return CompiledProfile(profile).load(*args, **filters)
@@ -0,0 +1,183 @@
+"""
+Materialised per-mentee rankings of mentors.
+
+MentorRanking holds each mentee's RANKING_SIZE best scoring mentors in order,
+so getTopThree() is a single indexed read rather than a sort over all of the
+mentee's MentorshipScores. Mentors with equal scores are ordered by
+participantId, both here and in the fallback query, so the same scores always
+give the same ranking. Mentors with no room left are skipped in the query;
+if that leaves a ranking short, or mentors withdrawing have taken their rows
+out of it, the mentee's scores are read instead.
+
+The engine ranks mentees from the overlaps it has just worked out. When only
+some of a mentee's mentors were rescored, their new scores are merged into
+the ranking already held, which is still the best of the other mentors unless
+it listed one of those that changed; only those mentees, and anything else
+that changes scores, call rank_mentees() to rebuild from the MentorshipScore
+table. Only scores other than 0 are stored there, so rebuilding fills a
+ranking out with the lowest id mentors the mentee has no score with, which
+score 0.
+"""
+from django.db.models import BooleanField, Case, Value, When
+from match.matching.capacity import available
+from match.models import MentorRanking, MentorshipScore, Participant
+import numpy as np
+
+# Number of mentors kept per mentee.
+RANKING_SIZE = 3
+
+# Number of MentorRanking rows handed to each bulk_create() call.
+BATCH_SIZE = 1000
+
+# Roughly how many scores are read back at once when ranking from the table.
+READ_SIZE = 50000
+
+# Largest number of ids put in a single IN (...) clause.
+IN_CHUNK_SIZE = 500
+
+class RankingWriter(object):
+    # Buffers MentorRanking rows and writes them with bulk_create(). Rankings
+    # given in previous, {menteeId: [(mentorId, score)]}, are merged with the
+    # mentors added for the same mentee.
+
+    def __init__(self, size=RANKING_SIZE, batch_size=BATCH_SIZE, previous=None):
+        self.size = size
+        self.batch_size = batch_size
+        self.previous = previous or {}
+        self.batch = []
+
+    # Ranks a block of mentees from their overlaps with a set of mentors.
+    # mentorIds must be sorted so that ties fall to the lowest id.
+    def add_block(self, menteeIds, mentorIds, overlap):
+        if not len(mentorIds):
+            return
+        # A stable sort on the negated scores keeps tied mentors in id order.
+        order = np.argsort(-np.asarray(overlap, dtype=np.int64), axis=1, kind='mergesort')[:, :self.size]
+        for menteeId, columns, scores in zip(menteeIds, order.tolist(), np.asarray(overlap).tolist()):
+            self.add(menteeId, [(mentorIds[column], scores[column]) for column in columns])
+
+    # Adds the rows for one mentee, given (mentorId, score) pairs best first.
+    def add(self, menteeId, ranked):
+        if menteeId in self.previous:
+            ranked = sorted(self.previous[menteeId] + ranked, key=_best_first)
+        for rank, (mentorId, score) in enumerate(ranked[:self.size]):
+            self.batch.append(MentorRanking(mentee_id=menteeId, mentor_id=mentorId, rank=rank, score=score))
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.batch:
+            MentorRanking.objects.bulk_create(self.batch)
+            self.batch = []
+
+# Splits a list into pieces of the given size.
+def _chunks(ids, size=IN_CHUNK_SIZE):
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+# Sort key putting the best score first and breaking ties by mentor id.
+def _best_first(pair):
+    mentorId, score = pair
+    return -score, mentorId
+
+# Reads the rankings of the given mentees ahead of some of their mentors
+# being rescored, returning ({menteeId: [(mentorId, score)]}, stale ids). A
+# ranking can be kept if it still holds the best of the unchanged mentors;
+# mentees whose ranking listed a changed mentor or is short are stale.
+def load_rankings(menteeIds, changedMentorIds, unchangedMentorCount, size=RANKING_SIZE):
+    changedMentorIds = set(changedMentorIds)
+    rankings = {menteeId: [] for menteeId in menteeIds}
+    for chunk in _chunks(list(menteeIds)):
+        rows = MentorRanking.objects.filter(mentee_id__in=chunk).order_by('mentee', 'rank')
+        for menteeId, mentorId, score in rows.values_list('mentee_id', 'mentor_id', 'score'):
+            rankings[menteeId].append((mentorId, score))
+    previous, stale = {}, []
+    for menteeId, ranked in rankings.items():
+        if len(ranked) < min(size, unchangedMentorCount) or any(m in changedMentorIds for m, s in ranked):
+            stale.append(menteeId)
+        else:
+            previous[menteeId] = ranked
+    return previous, stale
+
+# Returns the ids of the mentors in the mentee's cohort, in order.
+def cohort_mentors(menteeId):
+    return list(Participant.objects.filter(
+        isMentor=True,
+        cohort__participants=menteeId
+    ).order_by('participantId').values_list('participantId', flat=True))
+
+# Rebuilds the rankings of the given mentees from their MentorshipScores.
+# mentorIds are the sorted ids of the mentors in the mentees' cohort, which
+# are read if not given; those a mentee has no score with count as 0.
+def rank_mentees(menteeIds, size=RANKING_SIZE, mentorIds=None, readSize=READ_SIZE):
+    menteeIds = list(menteeIds)
+    if not menteeIds:
+        return
+    if mentorIds is None:
+        mentorIds = cohort_mentors(menteeIds[0])
+    # Read back at most about readSize scores at a time.
+    perChunk = max(1, min(IN_CHUNK_SIZE, readSize // max(len(mentorIds), 1)))
+    writer = RankingWriter(size)
+    for chunk in _chunks(menteeIds, perChunk):
+        MentorRanking.objects.filter(mentee_id__in=chunk).delete()
+        scores = {menteeId: [] for menteeId in chunk}
+        rows = MentorshipScore.objects.filter(mentee_id__in=chunk).values_list('mentee_id', 'mentor_id', 'score')
+        for menteeId, mentorId, score in rows.iterator():
+            scores[menteeId].append((mentorId, score))
+        for menteeId, pairs in scores.items():
+            writer.add(menteeId, sorted(pairs + _unscored(mentorIds, pairs, size), key=_best_first))
+    writer.flush()
+
+# Returns (mentorId, 0) for the first `size` of the sorted mentorIds that
+# have no score among the given (mentorId, score) pairs.
+def _unscored(mentorIds, pairs, size):
+    scored = set(m for m, s in pairs)
+    unscored = []
+    for mentorId in mentorIds:
+        if len(unscored) >= size:
+            break
+        if mentorId not in scored:
+            unscored.append((mentorId, 0))
+    return unscored
+
+# Returns the mentee's top mentors with room for another mentee, best first,
+# with each mentor's user and profile loaded in the same query.
+def top_mentors(mentee, count=RANKING_SIZE):
+    ranked = list(MentorRanking.objects.filter(mentee=mentee, rank__lt=count).annotate(
+        isAvailable=Case(When(available('mentor__'), then=Value(True)), default=Value(False), output_field=BooleanField())
+    ).select_related(
+        'mentor__user__profile', 'mentor__cohort'
+    ).order_by('rank'))
+    if ranked and all(r.isAvailable for r in ranked) and (len(ranked) >= count or len(ranked) >= Participant.objects.filter(
+        cohort_id=mentee.cohort_id, isMentor=True
+    ).count()):
+        return [r.mentor for r in ranked]
+    # Scores written without a ranking, e.g. by calculateScore(), a ranking
+    # listing saturated mentors, or one left short by mentors withdrawing:
+    # the best positive scores, then mentors scoring 0, stored or not, then
+    # the rest.
+    scores = MentorshipScore.objects.filter(mentee=mentee).select_related(
+        'mentor__user__profile', 'mentor__cohort'
+    )
+    mentors = [s.mentor for s in scores.filter(available('mentor__'), score__gt=0).order_by('-score', 'mentor')[:count]]
+    if not mentors and not ranked and mentee.scoredVersion is None and not scores.exists():
+        # Not scored at all yet.
+        return []
+    if len(mentors) < count:
+        nonzero = MentorshipScore.objects.filter(mentee=mentee).exclude(score=0).values('mentor')
+        mentors += list(Participant.objects.filter(available(), cohort_id=mentee.cohort_id, isMentor=True).exclude(
+            participantId__in=nonzero
+        ).select_related('user__profile', 'cohort').order_by('participantId')[:count - len(mentors)])
+    if len(mentors) < count:
+        mentors += [s.mentor for s in scores.filter(available('mentor__'), score__lt=0).order_by('-score', 'mentor')[:count - len(mentors)]]
+    return mentors
+
+# Replaces one mentee's ranking with one built from all of their scores,
+# already read as (mentorId, score) pairs. mentorIds are as for
+# rank_mentees() and only needed when fewer than size of the scores are
+# positive, as otherwise no mentor scoring 0 makes the ranking.
+def rank_mentee(menteeId, pairs, mentorIds=(), size=RANKING_SIZE):
+    MentorRanking.objects.filter(mentee_id=menteeId).delete()
+    writer = RankingWriter(size)
+    writer.add(menteeId, sorted(pairs + _unscored(mentorIds, pairs, size), key=_best_first))
+    writer.flush()
@@ -0,0 +1,165 @@
+"""
+Stable mentor assignment by deferred acceptance.
+
+Where match.matching.assignment makes the total score as large as it can,
+this gives a stable matching: no mentee and mentor both prefer each other to
+what they ended up with. Mentees propose down their preference lists, and
+each mentor holds on to the best proposals up to their capacity, turning
+away the worst one whenever a better one comes along (Gale-Shapley, with the
+capacities of the hospitals/residents problem). The result is the best
+stable matching for every mentee.
+
+Everyone prefers the people they chose as Preferences, in the order they
+chose them, then the rest by score, best first. A pair is only acceptable
+if it scores more than 0 or either side chose the other. Remaining ties go
+to the mentor with the lower participantId and to the mentee who signed up
+first.
+
+Mentee preference lists are kept as flat arrays, all of them end to end
+with each mentee's run given by offsets, and mentor preferences are worked
+out from the proposal's score and a small map of explicit choices, so
+nothing per pair is held besides the scores that were read. Each mentee
+proposes to each mentor at most once, so a run takes O(n*m log c) time for
+n mentees, m mentors and capacities of at most c.
+"""
+from match.matching.assignment import load_problem, save_assignment
+from match.models import Preference
+import heapq
+import numpy as np
+
+# Rank of anyone not explicitly chosen, after every explicit choice.
+UNCHOSEN = 1 << 30
+
+class Preferences(object):
+    # Every mentee's preference list over mentors as positions into mentors:
+    # mentee i's list is mentors[columns[offsets[i]:offsets[i + 1]]], with
+    # the scores of those pairs alongside in scores. chosen, {(i, j): rank},
+    # holds the mentees' explicit choices, and pairs chosen by either side
+    # with rank UNCHOSEN.
+
+    def __init__(self, mentees, mentors, weights, chosen):
+        mentorIndex = {mentor: j for j, mentor in enumerate(mentors)}
+        rowWeights = [weights.get(mentee, ()) for mentee in mentees]
+        count = sum(len(row) for row in rowWeights)
+        rows = np.repeat(np.arange(len(mentees), dtype=np.int64), [len(row) for row in rowWeights])
+        columns = np.fromiter(
+            (mentorIndex.get(mentor, -1) for row in rowWeights for mentor, score in row),
+            dtype=np.int64, count=count)
+        scores = np.fromiter(
+            (score for row in rowWeights for mentor, score in row),
+            dtype=np.int64, count=count)
+
+        # Chosen pairs without a score are added with a score of 0.
+        width = max(len(mentors), 1)
+        keys = rows * width + columns
+        chosenKeys = np.array(sorted(i * width + j for i, j in chosen), dtype=np.int64)
+        chosenRanks = np.array([chosen[divmod(k, width)] for k in chosenKeys.tolist()], dtype=np.int64)
+        missing = chosenKeys[~np.in1d(chosenKeys, keys)]
+        rows = np.concatenate((rows, missing // width))
+        columns = np.concatenate((columns, missing % width))
+        scores = np.concatenate((scores, np.zeros(len(missing), dtype=np.int64)))
+        keys = np.concatenate((keys, missing))
+
+        explicit = np.full(len(keys), UNCHOSEN, dtype=np.int64)
+        if len(chosenKeys):
+            found = np.minimum(np.searchsorted(chosenKeys, keys), len(chosenKeys) - 1)
+            isChosen = chosenKeys[found] == keys
+            explicit[isChosen] = chosenRanks[found[isChosen]]
+        keep = (columns >= 0) & ((scores > 0) | np.in1d(keys, chosenKeys))
+        rows, columns, scores, explicit = rows[keep], columns[keep], scores[keep], explicit[keep]
+
+        # Mentor order by participantId, for breaking ties between scores.
+        order = np.empty(len(mentors), dtype=np.int64)
+        order[np.argsort(np.array([str(m) for m in mentors], dtype=object), kind='mergesort')] = np.arange(len(mentors))
+        sort = _order(rows, explicit, scores, order[columns], len(mentors))
+        self.columns = columns[sort].tolist()
+        self.scores = scores[sort].tolist()
+        self.offsets = np.concatenate(([0], np.cumsum(np.bincount(rows, minlength=len(mentees))))).tolist()
+
+# Returns the order that sorts pairs by mentee, then explicit rank, then best
+# score, then mentor order. Packed into one integer key when that fits, as a
+# single sort of that is several times faster than np.lexsort().
+def _order(rows, explicit, scores, mentorOrder, mentorCount):
+    if not len(rows):
+        return np.zeros(0, dtype=np.int64)
+    ranks = explicit[explicit != UNCHOSEN]
+    explicit = np.where(explicit == UNCHOSEN, ranks.max() + 1 if len(ranks) else 0, explicit)
+    worst = scores.max() - scores
+    sizes = [int(rows.max()) + 1, int(explicit.max()) + 1, int(worst.max()) + 1, max(mentorCount, 1)]
+    total = 1
+    for size in sizes:
+        total *= size
+    if total >= 1 << 62:
+        return np.lexsort((mentorOrder, worst, explicit, rows))
+    key = ((rows * sizes[1] + explicit) * sizes[2] + worst) * sizes[3] + mentorOrder
+    return np.argsort(key, kind='mergesort')
+
+# Returns the stable {mentee: mentor} assignment.
+#
+# weights and capacities are as for match.matching.assignment.solve(), and
+# preferences, {participantId: [participantId]}, holds each side's explicit
+# choices, most wanted first. Mentors missing from capacities are never
+# assigned, and ties between mentees go to the one earlier in weights.
+def solve(weights, capacities, preferences=None):
+    mentees = list(weights)
+    mentors = list(capacities)
+    menteeIndex = {mentee: i for i, mentee in enumerate(mentees)}
+    mentorIndex = {mentor: j for j, mentor in enumerate(mentors)}
+    capacity = [max(0, capacities[mentor]) for mentor in mentors]
+
+    # Explicit choices as {(i, j): rank}, for each side.
+    menteeChoices, mentorChoices = {}, {}
+    for chooser, choices in (preferences or {}).items():
+        for rank, choice in enumerate(choices):
+            if chooser in menteeIndex and choice in mentorIndex:
+                menteeChoices[(menteeIndex[chooser], mentorIndex[choice])] = rank
+            elif chooser in mentorIndex and choice in menteeIndex:
+                mentorChoices[(menteeIndex[choice], mentorIndex[chooser])] = rank
+    chosen = dict(menteeChoices)
+    for pair in mentorChoices:
+        chosen.setdefault(pair, UNCHOSEN)
+    prefs = Preferences(mentees, mentors, weights, chosen)
+    columns, scores, offsets = prefs.columns, prefs.scores, prefs.offsets
+
+    # Each mentor's held proposals as a heap with the one they like least
+    # on top: (-explicit rank, score, -mentee, mentee).
+    held = [[] for _ in mentors]
+    following = offsets[:-1]
+    free = list(range(len(mentees) - 1, -1, -1))
+    while free:
+        i = free.pop()
+        while following[i] < offsets[i + 1]:
+            position = following[i]
+            following[i] += 1
+            j = columns[position]
+            if not capacity[j]:
+                continue
+            proposal = (-mentorChoices.get((i, j), UNCHOSEN), scores[position], -i, i)
+            if len(held[j]) < capacity[j]:
+                heapq.heappush(held[j], proposal)
+                break
+            if proposal > held[j][0]:
+                free.append(heapq.heapreplace(held[j], proposal)[3])
+                break
+
+    return {
+        mentees[proposal[3]]: mentors[j]
+        for j, proposals in enumerate(held)
+        for proposal in proposals
+    }
+
+# Returns {participantId: [participantId]} of the explicit choices made in
+# the cohort, most wanted first.
+def load_preferences(cohort):
+    preferences = {}
+    rows = Preference.objects.filter(participant__cohort=cohort).order_by('participant', 'rank')
+    for participantId, choiceId in rows.values_list('participant_id', 'choice_id'):
+        preferences.setdefault(participantId, []).append(choiceId)
+    return preferences
+
+# Stable counterpart of match.matching.assignment.assign_cohort(): assigns
+# the cohort's unmatched mentees, writes the Mentorship rows and flags both
+# sides as matched, returning the {menteeId: mentorId} assignment.
+def assign_cohort(cohort):
+    weights, capacities = load_problem(cohort)
+    return save_assignment(solve(weights, capacities, load_preferences(cohort)))
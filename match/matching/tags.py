@@ -0,0 +1,226 @@
+"""
+Compact tag encodings shared by the matching and scoring code.
+
+A TagVocabulary gives every tag seen in a cohort, keyed by its Tag id, a
+dense integer id of its own, and TagBitsets packs each participant's tags into a row of bits over that
+vocabulary. The overlap of two participants is then a popcount of the AND of
+their rows, which can be worked out for whole blocks of participants at a
+time instead of intersecting sets of Tag instances pair by pair. Most pairs
+in a real cohort share no tags at all, so TagPostings inverts the mapping,
+listing the participants that have each tag, and scores a participant by
+walking the lists of just the tags they have.
+
+Programmes that score by IDF weight each shared tag by how rare it is in the
+cohort instead of counting it as one. The weights come from idf_weights(),
+worked out once per match run from per-tag participant counts, and are
+scaled to whole numbers so scores stay integers.
+"""
+from django.db.models import Count
+from match.models import Participant
+import math
+import numpy as np
+
+# Points per unit of inverse document frequency. A tag every participant
+# has is worth IDF_SCALE points; rarer tags are worth more.
+IDF_SCALE = 100
+
+# Number of set bits in every possible byte.
+POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+# Returns the number of set bits in a Python int bitset.
+def popcount(bits):
+    return bin(bits).count('1')
+
+class TagVocabulary(object):
+    # Maps tags to dense integer ids, in the order they are first seen. Tags
+    # are usually Tag ids, but can be any hashable key.
+
+    def __init__(self, names=()):
+        self.ids = {}
+        self.names = []
+        for name in names:
+            self.add(name)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self.ids
+
+    def add(self, name):
+        if name not in self.ids:
+            self.ids[name] = len(self.names)
+            self.names.append(name)
+        return self.ids[name]
+
+    # Encodes a collection of tags as a Python int with one bit per tag.
+    # Tags outside the vocabulary are ignored.
+    def encode(self, names):
+        bits = 0
+        for name in names:
+            if name in self.ids:
+                bits |= 1 << self.ids[name]
+        return bits
+
+    def decode(self, bits):
+        return [name for i, name in enumerate(self.names) if bits >> i & 1]
+
+    # Turns {tag: weight} into an array over the vocabulary, as taken by
+    # TagBitsets.weighted_overlap(). Tags without a weight count for nothing.
+    def weight_array(self, weights):
+        return np.array([weights.get(name, 0) for name in self.names], dtype=np.float64)
+
+class TagBitsets(object):
+    # One packed row of bits per participant, over a shared vocabulary.
+
+    def __init__(self, vocabulary, ids, tags):
+        self.vocabulary = vocabulary
+        self._unpacked = None
+        self.ids = list(ids)
+        self.rows = {participantId: row for row, participantId in enumerate(self.ids)}
+        self.bits = np.zeros((len(self.ids), (len(vocabulary) + 7) // 8), dtype=np.uint8)
+
+        rows, cols = [], []
+        for row, participantId in enumerate(self.ids):
+            for name in tags.get(participantId, ()):
+                if name in vocabulary:
+                    rows.append(row)
+                    cols.append(vocabulary.ids[name])
+        if rows:
+            cols = np.array(cols)
+            np.bitwise_or.at(
+                self.bits,
+                (np.array(rows), cols >> 3),
+                (0x80 >> (cols & 7)).astype(np.uint8)
+            )
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def nbytes(self):
+        return self.bits.nbytes
+
+    # Number of tags on each participant.
+    def counts(self):
+        return POPCOUNT[self.bits].sum(axis=1, dtype=np.int64)
+
+    # Returns a len(rows) x len(other) matrix of shared tag counts between
+    # the given slice of these participants and every participant in other.
+    def overlap(self, other, rows=slice(None)):
+        both = self.bits[rows][:, np.newaxis, :] & other.bits[np.newaxis, :, :]
+        return POPCOUNT[both].sum(axis=2, dtype=np.int64)
+
+    # One column of 0s and 1s per vocabulary tag, as floats.
+    def unpacked(self, rows=slice(None)):
+        return np.unpackbits(self.bits[rows], axis=1)[:, :len(self.vocabulary)].astype(np.float64)
+
+    # Like overlap(), but each shared tag adds its weight from weights, an
+    # array over the vocabulary of whole numbers, instead of one.
+    def weighted_overlap(self, other, weights, rows=slice(None)):
+        if other._unpacked is None:
+            other._unpacked = other.unpacked()
+        weighted = self.unpacked(rows) * weights
+        return np.rint(weighted.dot(other._unpacked.T)).astype(np.int64)
+
+class TagPostings(object):
+    # Inverted index over a set of participants: for every vocabulary tag,
+    # the positions in ids of the participants that have it, stored end to
+    # end in indices with tag t's run at indices[indptr[t]:indptr[t + 1]].
+    # Scoring through it only ever visits pairs that share a tag.
+
+    def __init__(self, vocabulary, ids, tags):
+        self.vocabulary = vocabulary
+        self.ids = list(ids)
+        columns, tagIds = [], []
+        for column, participantId in enumerate(self.ids):
+            for name in tags.get(participantId, ()):
+                if name in vocabulary:
+                    columns.append(column)
+                    tagIds.append(vocabulary.ids[name])
+        columns = np.array(columns, dtype=np.int64)
+        tagIds = np.array(tagIds, dtype=np.int64)
+        order = np.argsort(tagIds, kind='mergesort')
+        self.indices = columns[order]
+        self.indptr = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(tagIds, minlength=len(vocabulary)), out=self.indptr[1:])
+
+    def __len__(self):
+        return len(self.ids)
+
+    # Returns a len(rows) x len(self) matrix of shared tag counts between
+    # the given slice of a TagBitsets over the same vocabulary and these
+    # participants, or of summed weights if given an array of weights over
+    # the vocabulary. Pairs sharing no tag are left at 0 without being
+    # looked at.
+    def overlap(self, bitsets, rows=slice(None), weights=None):
+        bits = np.unpackbits(bitsets.bits[rows], axis=1)[:, :len(self.vocabulary)]
+        count = len(self.ids)
+        shape = (bits.shape[0], count)
+        menteeRows, tagIds = np.nonzero(bits)
+        starts = self.indptr[tagIds]
+        lengths = self.indptr[tagIds + 1] - starts
+        if not lengths.sum():
+            return np.zeros(shape, dtype=np.int64)
+        # Every (row, column) pair reached through one of the row's tags.
+        offsets = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+        columns = self.indices[np.arange(lengths.sum()) + offsets]
+        pairs = np.repeat(menteeRows, lengths) * count + columns
+        values = None if weights is None else np.repeat(weights[tagIds], lengths)
+        flat = np.bincount(pairs, weights=values, minlength=shape[0] * count)
+        return np.rint(flat).astype(np.int64).reshape(shape)
+
+class CohortTagIndex(object):
+    # Vocabulary and mentee/mentor bitsets for a single cohort, loaded with
+    # one query for the participants and one for their tags.
+
+    def __init__(self, mentees, mentors, tags):
+        self.vocabulary = TagVocabulary()
+        for names in tags.values():
+            for name in names:
+                self.vocabulary.add(name)
+        self.mentees = TagBitsets(self.vocabulary, mentees, tags)
+        self.mentors = TagBitsets(self.vocabulary, mentors, tags)
+
+    @classmethod
+    def load(cls, cohort):
+        return cls(*load_cohort(cohort))
+
+# Returns (mentee ids, mentor ids, {participantId: [tag ids]}) for a cohort.
+def load_cohort(cohort):
+    mentees, mentors = [], []
+    for participantId, isMentor in cohort.participants.values_list('participantId', 'isMentor'):
+        (mentors if isMentor else mentees).append(participantId)
+    return mentees, mentors, load_tags(participant__cohort=cohort)
+
+# Returns {participantId: [tag ids]} read straight from the join table in a
+# single query. Takes the same filters as Participant.tags.through.objects.
+def load_tags(*args, **filters):
+    return _load(Participant.tags.through.objects.filter(*args, **filters).values_list('participant_id', 'tag_id'))
+
+# As load_tags(), but with the tags' names, joined in by the same query.
+def load_tag_names(*args, **filters):
+    return _load(Participant.tags.through.objects.filter(*args, **filters).values_list('participant_id', 'tag__name'))
+
+def _load(rows):
+    tags = {}
+    for participantId, tag in rows:
+        tags.setdefault(participantId, []).append(tag)
+    return tags
+
+# Returns {tag id: weight} for every tag in the cohort, or only those in
+# tagIds, where the weight is the tag's smoothed inverse document frequency
+# over the cohort's participants, times IDF_SCALE and rounded. Takes two
+# queries however many participants there are.
+def idf_weights(cohort, tagIds=None):
+    participants = cohort.participants.count()
+    frequencies = Participant.tags.through.objects.filter(participant__cohort=cohort)
+    if tagIds is not None:
+        frequencies = frequencies.filter(tag_id__in=tagIds)
+    frequencies = frequencies.values_list('tag_id').annotate(Count('participant_id'))
+    return {tagId: idf_weight(participants, documents) for tagId, documents in frequencies}
+
+# Returns the weight of a tag that `documents` of `participants` have.
+def idf_weight(participants, documents):
+    idf = math.log((1.0 + participants) / (1.0 + documents)) + 1
+    return int(round(IDF_SCALE * idf))
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.5 on 2026-10-18 13:39
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+# Counts participants that already have scores as scored with their current
+# tags, so the first match() after upgrading doesn't rescore every cohort.
+def mark_scored(apps, schema_editor):
+    Participant = apps.get_model('match', 'Participant')
+    MentorshipScore = apps.get_model('match', 'MentorshipScore')
+    Participant.objects.filter(participantId__in=MentorshipScore.objects.values('mentee')).update(scoredVersion=F('tagVersion'))
+    Participant.objects.filter(participantId__in=MentorshipScore.objects.values('mentor')).update(scoredVersion=F('tagVersion'))
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('match', '0012_participant_istopthreeselected'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='participant',
+            name='scoredVersion',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='participant',
+            name='tagVersion',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(mark_scored, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.5 on 2026-10-18 13:42
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('match', '0013_participant_tag_versions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='participant',
+            name='capacity',
+            field=models.IntegerField(default=1),
+        ),
+    ]
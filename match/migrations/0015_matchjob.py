@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.5 on 2026-10-18 13:48
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('match', '0014_participant_capacity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MatchJob',
+            fields=[
+                ('jobId', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False, unique=True)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=10)),
+                ('attempts', models.IntegerField(default=0)),
+                ('maxAttempts', models.IntegerField(default=3)),
+                ('progress', models.IntegerField(default=0)),
+                ('total', models.IntegerField(default=0)),
+                ('message', models.TextField(blank=True, default='')),
+                ('workerId', models.CharField(blank=True, default='', max_length=100)),
+                ('createdAt', models.DateTimeField(default=django.utils.timezone.now)),
+                ('runAfter', models.DateTimeField(default=django.utils.timezone.now)),
+                ('startedAt', models.DateTimeField(blank=True, null=True)),
+                ('heartbeatAt', models.DateTimeField(blank=True, null=True)),
+                ('finishedAt', models.DateTimeField(blank=True, null=True)),
+                ('cohort', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='matchJobs', to='match.Cohort')),
+                ('createdBy', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='matchJobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ('-createdAt',),
+            },
+        ),
+    ]
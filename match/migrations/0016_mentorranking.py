@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.5 on 2026-10-18 13:54
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('match', '0015_matchjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MentorRanking',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.IntegerField()),
+                ('score', models.IntegerField(default=0)),
+                ('mentee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rankings', to='match.Participant')),
+                ('mentor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='match.Participant')),
+            ],
+            options={
+                'ordering': ('mentee', 'rank'),
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='mentorranking',
+            unique_together=set([('mentee', 'rank')]),
+        ),
+    ]
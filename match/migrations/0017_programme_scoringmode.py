@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.5 on 2026-10-18 14:05
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('match', '0016_mentorranking'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TagWeight',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('weight', models.IntegerField()),
+                ('cohort', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tagWeights', to='match.Cohort')),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='match.Tag')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='programme',
+            name='scoringMode',
+            field=models.CharField(choices=[('overlap', 'Shared tags'), ('idf', 'Shared tags weighted by rarity')], default='overlap', max_length=10),
+        ),
+        migrations.AlterUniqueTogether(
+            name='tagweight',
+            unique_together=set([('cohort', 'tag')]),
+        ),
+    ]
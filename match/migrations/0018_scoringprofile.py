@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.5 on 2026-10-18 14:08
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('match', '0017_programme_scoringmode'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScoringProfile',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tagWeight', models.IntegerField(default=1)),
+                ('seniorityWeight', models.IntegerField(default=0)),
+                ('seniorityCap', models.IntegerField(default=10)),
+                ('departmentWeight', models.IntegerField(default=0)),
+                ('version', models.IntegerField(default=0)),
+                ('programme', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='scoringProfile', to='match.Programme')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='cohort',
+            name='profileVersion',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+    ]
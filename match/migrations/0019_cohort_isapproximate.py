@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.5 on 2026-10-18 14:29
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('match', '0018_scoringprofile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cohort',
+            name='isApproximate',
+            field=models.BooleanField(default=False),
+        ),
+    ]
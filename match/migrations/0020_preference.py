@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.5 on 2026-10-18 14:36
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('match', '0019_cohort_isapproximate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Preference',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.IntegerField()),
+                ('choice', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='match.Participant')),
+                ('participant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='preferences', to='match.Participant')),
+            ],
+            options={
+                'ordering': ('participant', 'rank'),
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='preference',
+            unique_together=set([('participant', 'choice'), ('participant', 'rank')]),
+        ),
+    ]
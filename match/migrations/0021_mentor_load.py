@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.5 on 2026-10-18 14:53
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+# Counts the Mentorships that already exist into the new load fields.
+def count_loads(apps, schema_editor):
+    Participant = apps.get_model('match', 'Participant')
+    UserProfile = apps.get_model('match', 'UserProfile')
+    Mentorship = apps.get_model('match', 'Mentorship')
+    loads = Mentorship.objects.values_list('mentor').annotate(n=Count('pk')).values_list('mentor', 'mentor__user', 'n')
+    users = {}
+    for mentor, user, n in loads:
+        Participant.objects.filter(pk=mentor).update(load=n)
+        users[user] = users.get(user, 0) + n
+    for user, n in users.items():
+        UserProfile.objects.filter(user=user).update(mentorLoad=n)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('match', '0020_preference'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='participant',
+            name='load',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='mentorCapacity',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='mentorLoad',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(count_loads, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.5 on 2026-10-18 14:57
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+# Marks the cohorts that were matched before the scheduler existed, those
+# with scores or already past their matchDate, as matched, so that the
+# scheduler doesn't match every old cohort again on its first pass.
+def mark_matched(apps, schema_editor):
+    Cohort = apps.get_model('match', 'Cohort')
+    MentorshipScore = apps.get_model('match', 'MentorshipScore')
+    now = timezone.now()
+    Cohort.objects.filter(cohortId__in=MentorshipScore.objects.values('mentee__cohort')).update(matchedAt=now)
+    Cohort.objects.filter(matchDate__lte=now, matchedAt__isnull=True).update(matchedAt=now)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('match', '0021_mentor_load'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cohort',
+            name='matchedAt',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(mark_matched, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.5 on 2026-10-18 15:07
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+# Counts the participants of the cohorts that already exist.
+def count_participants(apps, schema_editor):
+    Cohort = apps.get_model('match', 'Cohort')
+    for cohortId, n in Cohort.objects.annotate(n=Count('participants')).values_list('cohortId', 'n'):
+        Cohort.objects.filter(pk=cohortId).update(participantCount=n)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('match', '0022_cohort_matchedat'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cohort',
+            name='participantCount',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(count_participants, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.5 on 2026-10-18 15:25
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+# Indexes Django 1.10 can't declare on a model, in SQL that PostgreSQL and
+# SQLite both accept.
+SCORES_BY_MENTEE = """
+CREATE INDEX "match_mentorshipscore_best" ON "match_mentorshipscore" ("mentee_id", "score" DESC, "mentor_id")
+"""
+
+# Only cohorts without matchedAt, which the scheduler polls for, are
+# indexed; every matched cohort is left out.
+UNMATCHED_COHORTS = """
+CREATE INDEX "match_cohort_unmatched" ON "match_cohort" ("closeDate", "cohortId") WHERE "matchedAt" IS NULL
+"""
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('match', '0023_cohort_participantcount'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='tag',
+            name='slug',
+            field=models.CharField(db_index=True, default='', max_length=30),
+        ),
+        migrations.AlterIndexTogether(
+            name='cohort',
+            index_together=set([('programme', 'openDate', 'closeDate')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='participant',
+            index_together=set([('cohort', 'isMentor')]),
+        ),
+        migrations.RunSQL([SCORES_BY_MENTEE], ['DROP INDEX "match_mentorshipscore_best"']),
+        migrations.RunSQL([UNMATCHED_COHORTS], ['DROP INDEX "match_cohort_unmatched"']),
+    ]
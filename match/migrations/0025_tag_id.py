@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+from slugify import slugify
+
+# Rows copied at a time.
+BATCH_SIZE = 5000
+
+# Gives every tag an integer id: copies the tags keyed by name, now OldTag,
+# into the new Tag table and points copies of every reference to them. 0026
+# then drops the old references and takes the copies' place. Tags whose
+# slugs clash are merged into the first by name, as only the first could
+# ever be found by slug, and any IDF weights saved for the others are
+# dropped so the next match of their cohorts rescores them.
+def copy_tags(apps, schema_editor):
+    OldTag = apps.get_model('match', 'OldTag')
+    Tag = apps.get_model('match', 'Tag')
+    TagWeight = apps.get_model('match', 'TagWeight')
+
+    first = {}
+    merged = {}
+    for name, slug in OldTag.objects.order_by('name').values_list('name', 'slug'):
+        slug = slug or slugify(name)
+        merged[name] = first.setdefault(slug, name)
+    Tag.objects.bulk_create([Tag(name=name, slug=slug) for slug, name in first.items()])
+    ids = dict(Tag.objects.values_list('name', 'pk'))
+    ids = {name: ids[kept] for name, kept in merged.items()}
+
+    _copy_m2m(apps.get_model('match', 'UserProfile'), 'tags', 'newTags', ids)
+    _copy_m2m(apps.get_model('match', 'Participant'), 'tags', 'newTags', ids)
+    for name, kept in merged.items():
+        weights = TagWeight.objects.filter(tag_id=name)
+        if name == kept:
+            weights.update(newTag=ids[name])
+        else:
+            weights.delete()
+
+# Puts the tags back the way they were, keyed by name.
+def copy_tags_back(apps, schema_editor):
+    OldTag = apps.get_model('match', 'OldTag')
+    Tag = apps.get_model('match', 'Tag')
+    TagWeight = apps.get_model('match', 'TagWeight')
+
+    names = dict(Tag.objects.values_list('pk', 'name'))
+    OldTag.objects.bulk_create([OldTag(name=name, slug=slug) for name, slug in Tag.objects.values_list('name', 'slug')])
+    _copy_m2m(apps.get_model('match', 'UserProfile'), 'newTags', 'tags', names)
+    _copy_m2m(apps.get_model('match', 'Participant'), 'newTags', 'tags', names)
+    for tagId, name in names.items():
+        TagWeight.objects.filter(newTag=tagId).update(tag=name)
+    # The rest of the reversal alters the tables just written, which
+    # PostgreSQL refuses while their foreign key checks are still deferred.
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+
+# Copies the rows of model's many to many field source into target, mapping
+# each tag through ids and leaving out duplicates that merging tags made.
+def _copy_m2m(model, source, target, ids):
+    source = model._meta.get_field(source)
+    target = model._meta.get_field(target)
+    Through = target.remote_field.through
+    owner, tag = source.m2m_field_name() + '_id', source.m2m_reverse_field_name() + '_id'
+    newOwner, newTag = target.m2m_field_name() + '_id', target.m2m_reverse_field_name() + '_id'
+    rows = source.remote_field.through.objects.order_by(owner).values_list(owner, tag)
+
+    batch, current, seen = [], None, set()
+    for ownerId, tagId in rows.iterator():
+        if ownerId != current:
+            current, seen = ownerId, set()
+        if ids[tagId] in seen:
+            continue
+        seen.add(ids[tagId])
+        batch.append(Through(**{newOwner: ownerId, newTag: ids[tagId]}))
+        if len(batch) >= BATCH_SIZE:
+            Through.objects.bulk_create(batch)
+            batch = []
+    Through.objects.bulk_create(batch)
+
+# RenameModel only renames the table, so on PostgreSQL, where index names
+# are unique across the schema, OldTag's indexes keep the names Django and
+# PostgreSQL give Tag's, which CreateModel then needs for the new table.
+# These move them to names of OldTag's own and back again.
+def rename_old_indexes(apps, schema_editor):
+    _rename_indexes(schema_editor, 'match_tag_', 'match_oldtag_')
+
+def restore_old_indexes(apps, schema_editor):
+    _rename_indexes(schema_editor, 'match_oldtag_', 'match_tag_')
+
+def _rename_indexes(schema_editor, old, new):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT indexname FROM pg_indexes WHERE schemaname = current_schema() AND tablename = 'match_oldtag'"
+        )
+        names = [name for name, in cursor.fetchall() if name.startswith(old)]
+    for name in names:
+        schema_editor.execute("ALTER INDEX %s RENAME TO %s" % (
+            schema_editor.quote_name(name),
+            schema_editor.quote_name(new + name[len(old):])
+        ))
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('match', '0024_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='tagweight',
+            unique_together=set([]),
+        ),
+        # RenameModel only repoints relations with a reverse accessor, so
+        # TagWeight.tag needs one while Tag is renamed.
+        migrations.AlterField(
+            model_name='tagweight',
+            name='tag',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='oldTagWeights', to='match.Tag'),
+        ),
+        migrations.RenameModel('Tag', 'OldTag'),
+        migrations.RunPython(rename_old_indexes, restore_old_indexes),
+        migrations.CreateModel(
+            name='Tag',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=30, unique=True)),
+                ('slug', models.CharField(default='', max_length=30, unique=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='newTags',
+            field=models.ManyToManyField(related_name='+', to='match.Tag'),
+        ),
+        migrations.AddField(
+            model_name='participant',
+            name='newTags',
+            field=models.ManyToManyField(related_name='+', to='match.Tag'),
+        ),
+        migrations.AddField(
+            model_name='tagweight',
+            name='newTag',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='match.Tag'),
+        ),
+        migrations.RunPython(copy_tags, copy_tags_back),
+    ]
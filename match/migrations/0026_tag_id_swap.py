@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# Swaps in the references to the integer keyed tags that 0025 copied. Kept
+# apart from the copy as PostgreSQL won't alter tables with rows written
+# earlier in the same transaction still waiting on deferred constraint checks.
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('match', '0025_tag_id'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='userprofile',
+            name='tags',
+        ),
+        migrations.RemoveField(
+            model_name='participant',
+            name='tags',
+        ),
+        migrations.RemoveField(
+            model_name='tagweight',
+            name='tag',
+        ),
+        migrations.RenameField(
+            model_name='userprofile',
+            old_name='newTags',
+            new_name='tags',
+        ),
+        migrations.RenameField(
+            model_name='participant',
+            old_name='newTags',
+            new_name='tags',
+        ),
+        migrations.RenameField(
+            model_name='tagweight',
+            old_name='newTag',
+            new_name='tag',
+        ),
+        migrations.AlterField(
+            model_name='userprofile',
+            name='tags',
+            field=models.ManyToManyField(related_name='UserTag', to='match.Tag'),
+        ),
+        migrations.AlterField(
+            model_name='participant',
+            name='tags',
+            field=models.ManyToManyField(related_name='ParticipantTag', to='match.Tag'),
+        ),
+        migrations.AlterField(
+            model_name='tagweight',
+            name='tag',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='match.Tag'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='tagweight',
+            unique_together=set([('cohort', 'tag')]),
+        ),
+        migrations.DeleteModel(
+            name='OldTag',
+        ),
+    ]
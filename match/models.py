@@ -1,7 +1,8 @@
 from datetime import date,timedelta
 from django.contrib.auth.models import User
-from django.db import models
-from django.db.models.signals import post_save
+from django.db import models, transaction
+from django.db.models import Case, F, Value, When
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
 from django.utils import timezone
 from match.validators import user_validators
 import os
@@ -25,8 +26,11 @@ def _get_default_match_date():
     return timezone.now() + timedelta(days=21)
 
 class Tag(models.Model):
-    name = models.CharField(max_length=30, primary_key=True)
-    slug = models.CharField(max_length=30, default="")
+    # Tags are keyed by an integer id, which keeps the join tables small and
+    # their joins cheap, but are only ever shown and looked up by name or
+    # slug.
+    name = models.CharField(max_length=30, unique=True)
+    slug = models.CharField(max_length=30, default="", unique=True)
 
     def __str__(self):
         return self.name
@@ -52,6 +56,10 @@ class UserProfile(models.Model):
     bio = models.TextField(default="", blank=True)
     profileImage = models.ImageField(upload_to=_get_image_path, blank=True, null=True)
     profileSetupComplete = models.BooleanField(default=False)
+    # Most mentees the user mentors at once over all their cohorts, or no
+    # limit; mentorLoad is how many they mentor now.
+    mentorCapacity = models.IntegerField(blank=True, null=True)
+    mentorLoad = models.IntegerField(default=0)
 
     def __str__(self):
         return self.user.get_full_name()
@@ -72,6 +80,14 @@ class UserProfile(models.Model):
             return self.image.url
 
 class Programme(models.Model):
+    # How mentees and mentors are scored against each other.
+    OVERLAP = 'overlap'
+    IDF = 'idf'
+    SCORING_CHOICES = (
+        (OVERLAP, 'Shared tags'),
+        (IDF, 'Shared tags weighted by rarity'),
+    )
+
     programmeId = models.UUIDField(primary_key=True,default=uuid.uuid4, editable=False, unique=True)
     name = models.CharField(max_length=40)
     description = models.TextField()
@@ -79,6 +95,7 @@ class Programme(models.Model):
     bannerImage = models.ImageField(upload_to=_get_image_path, blank=True, null=True)
     defaultCohortSize = models.IntegerField(default=100)
     createdBy = models.ForeignKey(User, on_delete=models.CASCADE, related_name="programmes")
+    scoringMode = models.CharField(max_length=10, choices=SCORING_CHOICES, default=OVERLAP)
 
     def __str__(self):
         return self.name
@@ -86,24 +103,74 @@ class Programme(models.Model):
     class Meta:
         ordering = ('name',)
 
+    # Points a single shared tag is worth at least, which setTopThree()
+    # preference bonuses are measured in.
+    @property
+    def scoreScale(self):
+        scale = 1
+        if self.scoringMode == Programme.IDF:
+            from match.matching.tags import IDF_SCALE
+            scale = IDF_SCALE
+        try:
+            scale *= max(self.scoringProfile.tagWeight, 1)
+        except ScoringProfile.DoesNotExist:
+            pass
+        return scale
+
+    # The earliest open cohort with seats left, or the earliest open one if
+    # they are all full.
     @property
     def activeCohort(self):
-        qs = self.cohorts.filter(
-            openDate__lte=timezone.now(),
-            closeDate__gt=timezone.now()
-        ).order_by('openDate')
-
-        # select if not empty
-        cohorts = [c for c in qs if c.participantCount < c.cohortSize]
-
-        if len(cohorts):
-            return cohorts[0]
-        
-        # If all full, pick earliest.
-        cohorts = qs.all()
-        if len(cohorts):
-            return cohorts[0]
-        return None
+        return _active_first(self.cohorts.all(), timezone.now()).first()
+
+# Returns {programmeId: active cohort} for programmes, a queryset or list of
+# them, with a single query. Programmes with no open cohort are left out.
+# cohorts is the queryset to read them from, so callers can add the
+# select_related() their serializers need.
+def active_cohorts(programmes, cohorts=None):
+    if cohorts is None:
+        cohorts = Cohort.objects.all()
+    active = {}
+    for cohort in _active_first(cohorts.filter(programme__in=programmes), timezone.now()).order_by('programme', 'isFull', 'openDate'):
+        active.setdefault(cohort.programme_id, cohort)
+    return active
+
+# Narrows cohorts to those open for registration at now, ordered so that
+# ones with seats left come first, earliest to open first.
+def _active_first(cohorts, now):
+    return cohorts.filter(
+        openDate__lte=now,
+        closeDate__gt=now
+    ).annotate(
+        isFull=Case(
+            When(participantCount__lt=F('cohortSize'), then=Value(0)),
+            default=Value(1),
+            output_field=models.IntegerField()
+        )
+    ).order_by('isFull', 'openDate')
+
+# Extra terms a programme adds to its scores on top of shared tags, all in
+# score points. Programmes without one score on shared tags alone.
+class ScoringProfile(models.Model):
+    programme = models.OneToOneField(Programme, on_delete=models.CASCADE, related_name="scoringProfile")
+    # Multiplies the shared tag score.
+    tagWeight = models.IntegerField(default=1)
+    # Points per year a mentor has worked longer than their mentee, counting
+    # at most seniorityCap years. Negative to prefer closer seniority.
+    seniorityWeight = models.IntegerField(default=0)
+    seniorityCap = models.IntegerField(default=10)
+    # Points for a mentor from another department; negative to prefer the
+    # mentee's own.
+    departmentWeight = models.IntegerField(default=0)
+    # Bumped on every save, so cohorts scored with older weights are rescored.
+    version = models.IntegerField(default=0)
+
+    def __str__(self):
+        return "%s scoring" % self.programme.name
+
+    def save(self, *args, **kwargs):
+        self.version += 1
+        super(ScoringProfile, self).save(*args, **kwargs)
 
 class Cohort(models.Model):
     cohortId = models.UUIDField(primary_key=True,default=uuid.uuid4, editable=False, unique=True)
@@ -113,23 +180,63 @@ class Cohort(models.Model):
     closeDate = models.DateTimeField(default=_get_default_close_date)
     matchDate = models.DateTimeField(default=_get_default_match_date)
     createdBy = models.ForeignKey(User, on_delete=models.CASCADE, related_name="cohorts")
+    # Version of the programme's ScoringProfile the scores were worked out
+    # with, if it had one.
+    profileVersion = models.IntegerField(blank=True, null=True)
+    # Whether the scores come from an approximate run, which only scored
+    # the pairs it picked as candidates.
+    isApproximate = models.BooleanField(default=False)
+    # When the scheduler matched the cohort after it closed.
+    matchedAt = models.DateTimeField(blank=True, null=True)
+    # Number of participants, kept up to date as they register and withdraw
+    # so that it can be read without counting them.
+    participantCount = models.IntegerField(default=0)
+
+    class Meta:
+        # A programme's open cohorts. The cohorts still to be matched have
+        # a partial index of their own, see migration 0024.
+        index_together = (("programme", "openDate", "closeDate",),)
 
     def __str__(self):
         return "%s - %s" % (self.programme.name, self.openDate)
 
-    @property
-    def participantCount(self):
-        return self.participants.count()
-
-    def match(self):
-        mentors = self.participants.filter(isMentor=True)
-        for mentee in self.participants.filter(isMentor=False):
-            for mentor in mentors:
-                p = MentorshipScore.objects.create(
-                        mentor=mentor,
-                        mentee=mentee
-                )
-                p.calculateScore()
+    # participantCount only ever changes through updates in the database,
+    # so saving a cohort loaded before some participants registered leaves
+    # it out rather than writing back the count it was loaded with.
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name != 'participantCount']
+        super(Cohort, self).save(*args, **kwargs)
+
+    # Scores every participant whose tags changed since they were last
+    # scored (all of them on the first run). Pass full=True to rescore the
+    # whole cohort from scratch. Only scores other than 0 are stored, so a
+    # pair without one scores 0. Returns the number of pairs scored,
+    # and progress, if given, is called with the number scored so far and
+    # the number to score.
+    #
+    # approximate rescores the whole cohort but only scores the pairs that
+    # MinHash picks as likely to be close, for cohorts too big to score
+    # every pair sharing a tag. Pass True for the default settings or a
+    # match.matching.minhash.MinHashLSH to tune recall. The next exact run
+    # rescores the whole cohort again.
+    def match(self, full=False, progress=None, approximate=None):
+        # Imported here as the engine itself depends on these models.
+        from match.matching import engine
+        return engine.score_cohort(self, full=full, progress=progress, approximate=approximate)
+
+    # Assigns mentors to the cohort's unmatched mentees from their scores,
+    # creating Mentorship rows. By default the total score is as high as it
+    # can be; stable=True instead gives a stable matching of both sides'
+    # preferences, where no mentee and mentor would both rather have each
+    # other than what they got.
+    def assign(self, stable=False):
+        if stable:
+            from match.matching import stable as matcher
+        else:
+            from match.matching import assignment as matcher
+        return matcher.assign_cohort(self)
 
 class Participant(models.Model):
     participantId = models.UUIDField(primary_key=True,default=uuid.uuid4, editable=False, unique=True)
@@ -139,51 +246,239 @@ class Participant(models.Model):
     isMentor = models.BooleanField(null=False)
     isMatched = models.BooleanField(default=False)
     isTopThreeSelected = models.BooleanField(default=False)
+    # Number of mentees a mentor can take, and how many they have now.
+    capacity = models.IntegerField(default=1)
+    load = models.IntegerField(default=0)
     tags = models.ManyToManyField(Tag, related_name="ParticipantTag")
+    # Bumped whenever tags, or the profile details that scoring profiles
+    # use, change; scoredVersion is the tagVersion the participant's
+    # MentorshipScores were last worked out from.
+    tagVersion = models.IntegerField(default=0)
+    scoredVersion = models.IntegerField(blank=True, null=True)
 
     class Meta:
+        # Also serves looking participants up by user.
         unique_together  = (("user", "cohort",),)
+        index_together = (("cohort", "isMentor",),)
 
     def getTopThree(self):
         if not (self.isMentor or self.isTopThreeSelected):
-            topThree = MentorshipScore.objects.filter(mentee=self).order_by("-score")[:3]
-            return list(map(lambda p: p.mentor, topThree))
+            from match.matching import ranking
+            return ranking.top_mentors(self, 3)
         else:
             return []
 
+    # Records the mentee's ordered choice of their top three, adding 10 points
+    # to the score of their first preference and 5 to their second, in units
+    # of the programme's scoreScale, and keeping the order as their
+    # Preferences. This is one transaction that only goes ahead if the top
+    # three have not been chosen yet, so a repeated submission changes
+    # nothing; returns whether this call made the choice. Load the
+    # participant with cohort__programme__scoringProfile to save the queries
+    # for those.
     def setTopThree(self, choices):
-        # Adjust MentorshipScores accordingly. 10 points for first preference, 5 for second, 0 for third.
-            try:
-                mentor = Participant.objects.get(participantId=choices[0])
-                score = MentorshipScore.objects.get(mentee=self, mentor=mentor)
-                score.score += 10
-                score.save()
-
-                mentor = Participant.objects.get(participantId=choices[1])
-                score = MentorshipScore.objects.get(mentee=self, mentor=mentor)
-                score.score += 5
-                score.save()
-            except KeyError:
-                pass
-            self.isTopThreeSelected = True
-            self.save()
+        from match.matching import ranking
+        programme = self.cohort.programme
+        choices = [uuid.UUID(str(choice)) for choice in choices]
+        with transaction.atomic():
+            chosen = Participant.objects.filter(
+                pk=self.pk,
+                isTopThreeSelected=False
+            ).update(isTopThreeSelected=True)
+            if not chosen:
+                return False
+            scores = dict(MentorshipScore.objects.filter(mentee=self).values_list('mentor_id', 'score'))
+            mentorIds = []
+            if any(c not in scores for c in choices) or sum(1 for s in scores.values() if s > 0) < ranking.RANKING_SIZE:
+                # Every mentor in the cohort, to check the choices with no
+                # score and to fill the ranking up with mentors scoring 0.
+                mentorIds = list(Participant.objects.filter(
+                    cohort_id=self.cohort_id,
+                    isMentor=True
+                ).order_by('participantId').values_list('participantId', flat=True))
+            mentors = set(scores) | set(mentorIds)
+            choices = [c for c in choices if c in mentors]
+            Preference.objects.bulk_create([
+                Preference(participant=self, choice_id=choice, rank=rank)
+                for rank, choice in enumerate(choices)
+            ])
+            bonuses = {}
+            for choice, bonus in zip(choices, TOP_THREE_BONUSES):
+                bonuses[choice] = bonus * programme.scoreScale
+            scored = [mentorId for mentorId in bonuses if mentorId in scores]
+            if scored:
+                MentorshipScore.objects.filter(mentee=self, mentor_id__in=scored).update(
+                    score=F('score') + Case(
+                        *[When(mentor_id=mentorId, then=Value(bonuses[mentorId])) for mentorId in scored],
+                        default=Value(0),
+                        output_field=models.IntegerField()
+                    )
+                )
+            # Pairs sharing no tags have no row, as they score 0.
+            MentorshipScore.objects.bulk_create([
+                MentorshipScore(mentee=self, mentor_id=mentorId, score=bonus)
+                for mentorId, bonus in bonuses.items()
+                if mentorId not in scores
+            ])
+            for mentorId, bonus in bonuses.items():
+                scores[mentorId] = scores.get(mentorId, 0) + bonus
+            # The ranking may hold scores from before calculateScore() or
+            # other changes, so rebuild it from all of the scores.
+            ranking.rank_mentee(self.pk, list(scores.items()), mentorIds)
+        self.isTopThreeSelected = True
+        return True
+
+    # Replaces the participant's Preferences with the given ids of people on
+    # the other side of their cohort, most wanted first. Mentors have no
+    # other way to say who they would like to mentor. Raises ValueError if
+    # any of them can't be chosen.
+    def setPreferences(self, choices):
+        choices = [uuid.UUID(str(choice)) for choice in choices]
+        if len(set(choices)) != len(choices):
+            raise ValueError("Each participant can only be chosen once")
+        valid = Participant.objects.filter(
+            cohort_id=self.cohort_id,
+            isMentor=not self.isMentor,
+            participantId__in=choices
+        ).count()
+        if valid != len(choices):
+            raise ValueError("Choices must be %s in the same cohort" % ("mentees" if self.isMentor else "mentors"))
+        with transaction.atomic():
+            self.preferences.all().delete()
+            Preference.objects.bulk_create([
+                Preference(participant=self, choice_id=choice, rank=rank)
+                for rank, choice in enumerate(choices)
+            ])
 
 class MentorshipScore(models.Model):
     mentorshipScoreId = models.UUIDField(primary_key=True,default=uuid.uuid4, editable=False, unique=True)
     mentor = models.ForeignKey(Participant, related_name="+")
     mentee = models.ForeignKey(Participant, related_name="scores")
+    # A mentee's scores are read best first through an index on (mentee,
+    # score DESC, mentor), which migration 0024 creates in SQL as
+    # index_together can't order columns.
     score = models.IntegerField(default=0)
 
+    # Works the pair's score out again from the two participants' tags
+    # alone, reading the weights of only the tags they share, plus the
+    # programme's profile terms and any setTopThree() bonus, as match() would.
     def calculateScore(self):
-        mentee_tags = list(self.mentee.tags.all())
-        mentor_tags = list(self.mentor.tags.all())
-        self.score = len(set(mentee_tags).intersection(mentor_tags))
+        from match.matching.profiles import compile_profile
+        from match.matching.tags import idf_weights, load_tags
+        tags = load_tags(participant_id__in=[self.mentee_id, self.mentor_id])
+        shared = set(tags.get(self.mentee_id, [])) & set(tags.get(self.mentor_id, []))
+        cohort = Cohort.objects.select_related('programme__scoringProfile').get(participants=self.mentee_id)
+        programme = cohort.programme
+        if programme.scoringMode == Programme.IDF:
+            weights = dict(cohort.tagWeights.filter(tag_id__in=shared).values_list('tag_id', 'weight')) if shared else {}
+            missing = shared - set(weights)
+            if missing:
+                # Not saved until the cohort is next matched.
+                weights.update(idf_weights(cohort, missing))
+            self.score = sum(weights.get(tagId, 0) for tagId in shared)
+        else:
+            self.score = len(shared)
+        profile = compile_profile(programme, participantId__in=[self.mentee_id, self.mentor_id])
+        if profile:
+            self.score = profile.score_pair(self.mentee_id, self.mentor_id, self.score)
+        self.score += preference_bonuses([self.mentee_id], programme.scoreScale).get(self.mentee_id, {}).get(self.mentor_id, 0)
         self.save()
 
+# A mentee's best scoring mentors, best first, kept alongside MentorshipScore
+# so the top three can be read without sorting every score. Ties go to the
+# mentor with the lowest participantId.
+class MentorRanking(models.Model):
+    mentee = models.ForeignKey(Participant, on_delete=models.CASCADE, related_name="rankings")
+    mentor = models.ForeignKey(Participant, on_delete=models.CASCADE, related_name="+")
+    rank = models.IntegerField()
+    score = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ('mentee', 'rank')
+        unique_together = (("mentee", "rank",),)
+
+# The weight each tag carried in the last IDF scoring of a cohort. Scores only
+# stay valid while the weights do, so a run that finds they have moved
+# rescores the whole cohort.
+class TagWeight(models.Model):
+    cohort = models.ForeignKey(Cohort, on_delete=models.CASCADE, related_name="tagWeights")
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE, related_name="+")
+    weight = models.IntegerField()
+
+    class Meta:
+        unique_together = (("cohort", "tag",),)
+
+# A participant's explicit choice of who they want on the other side, most
+# wanted first. Stable assignment puts these ahead of the scores.
+class Preference(models.Model):
+    participant = models.ForeignKey(Participant, on_delete=models.CASCADE, related_name="preferences")
+    choice = models.ForeignKey(Participant, on_delete=models.CASCADE, related_name="+")
+    rank = models.IntegerField()
+
+    class Meta:
+        ordering = ('participant', 'rank')
+        unique_together = (("participant", "rank",), ("participant", "choice",),)
+
+# Points setTopThree() adds to a mentee's first and second choices, in units
+# of the programme's scoreScale.
+TOP_THREE_BONUSES = (10, 5)
+
+# Returns the setTopThree() bonuses of the given mentees, {menteeId:
+# {mentorId: points}}, read back from their Preferences, so that rescoring
+# their pairs can add them again. Only mentees' Preferences come from
+# setTopThree().
+def preference_bonuses(menteeIds, scale):
+    bonuses = {}
+    rows = Preference.objects.filter(
+        participant_id__in=menteeIds,
+        participant__isMentor=False,
+        rank__lt=len(TOP_THREE_BONUSES)
+    ).values_list('participant_id', 'choice_id', 'rank')
+    for menteeId, mentorId, rank in rows:
+        bonuses.setdefault(menteeId, {})[mentorId] = TOP_THREE_BONUSES[rank] * scale
+    return bonuses
+
 class Mentorship(models.Model):
     mentor = models.ForeignKey(Participant, related_name="mentor_mentorships")
     mentee = models.ForeignKey(Participant, related_name="mentee_mentorships")
 
+class MatchJob(models.Model):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    )
+
+    jobId = models.UUIDField(primary_key=True,default=uuid.uuid4, editable=False, unique=True)
+    cohort = models.ForeignKey(Cohort, on_delete=models.CASCADE, related_name="matchJobs")
+    createdBy = models.ForeignKey(User, on_delete=models.SET_NULL, blank=True, null=True, related_name="matchJobs")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.IntegerField(default=0)
+    maxAttempts = models.IntegerField(default=3)
+    # Scores written so far out of the number the run has to write.
+    progress = models.IntegerField(default=0)
+    total = models.IntegerField(default=0)
+    # Error from the last failed attempt.
+    message = models.TextField(default="", blank=True)
+    workerId = models.CharField(max_length=100, blank=True, default="")
+    createdAt = models.DateTimeField(default=timezone.now)
+    # Not picked up before this time, used to back off between retries.
+    runAfter = models.DateTimeField(default=timezone.now)
+    startedAt = models.DateTimeField(blank=True, null=True)
+    heartbeatAt = models.DateTimeField(blank=True, null=True)
+    finishedAt = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ('-createdAt',)
+
+    def __str__(self):
+        return "%s - %s" % (self.cohort_id, self.status)
+
 class Update(models.Model):
     updateId = models.UUIDField(primary_key=True,default=uuid.uuid4, editable=False, unique=True)
     mentorship = models.ForeignKey(Mentorship, related_name="updates")
@@ -204,3 +499,69 @@ def create_user_profile(sender, instance, created, **kwargs):
         UserProfile.objects.create(user=instance)
 
 post_save.connect(create_user_profile, sender=User)
+
+# Bumps tagVersion on every participant whose tags change, from either side of
+# the relation, so that matching knows who needs to be scored again.
+def bump_participant_tag_version(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear':
+        if reverse:
+            participants = Participant.objects.filter(tags=instance)
+        else:
+            participants = Participant.objects.filter(pk=instance.pk)
+    elif action in ('post_add', 'post_remove') and pk_set:
+        if reverse:
+            participants = Participant.objects.filter(pk__in=pk_set)
+        else:
+            participants = Participant.objects.filter(pk=instance.pk)
+    else:
+        return
+    participants.update(tagVersion=F('tagVersion') + 1)
+
+m2m_changed.connect(bump_participant_tag_version, sender=Participant.tags.through)
+
+# Bumps tagVersion on a user's participants when they change the profile
+# details scoring profiles look at, so their scores are worked out again.
+# Only participants whose programme has a scoring profile, in cohorts not yet
+# past their matchDate, have scores that could change.
+def bump_participant_profile_version(sender, instance, raw=False, **kwargs):
+    if raw or instance.pk is None:
+        return
+    previous = UserProfile.objects.filter(pk=instance.pk).values_list('joinDate', 'department').first()
+    if previous and previous != (instance.joinDate, instance.department):
+        Participant.objects.filter(
+            user_id=instance.user_id,
+            cohort__programme__scoringProfile__isnull=False,
+            cohort__matchDate__gt=timezone.now()
+        ).update(tagVersion=F('tagVersion') + 1)
+
+pre_save.connect(bump_participant_profile_version, sender=UserProfile)
+
+# Keeps Cohort.participantCount in step with participants registering and
+# withdrawing. bulk_create() sends no signals, so code that bulk creates
+# participants updates the count itself, as does registration, which
+# reserves the seat before saving the participant.
+def count_participant(sender, instance, created, raw=False, **kwargs):
+    if created and not raw and not getattr(instance, 'seatReserved', False):
+        Cohort.objects.filter(pk=instance.cohort_id).update(participantCount=F('participantCount') + 1)
+
+def uncount_participant(sender, instance, **kwargs):
+    Cohort.objects.filter(pk=instance.cohort_id).update(participantCount=F('participantCount') - 1)
+
+post_save.connect(count_participant, sender=Participant)
+post_delete.connect(uncount_participant, sender=Participant)
+
+# Keeps mentor loads in step with Mentorships saved one at a time. Assigning
+# a cohort bulk creates them and reserves the places itself.
+def count_mentorship(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        _add_load(instance.mentor_id, 1)
+
+def uncount_mentorship(sender, instance, **kwargs):
+    _add_load(instance.mentor_id, -1)
+
+def _add_load(mentorId, change):
+    Participant.objects.filter(pk=mentorId).update(load=F('load') + change)
+    UserProfile.objects.filter(user__mentorships__participantId=mentorId).update(mentorLoad=F('mentorLoad') + change)
+
+post_save.connect(count_mentorship, sender=Mentorship)
+post_delete.connect(uncount_mentorship, sender=Mentorship)
@@ -0,0 +1,84 @@
+"""
+Matching cohorts as soon as they close.
+
+`manage.py match_scheduler` runs on every app node and every so often
+matches the cohorts whose closeDate has passed and that have no matchedAt
+yet, so no one has to remember to. Cohorts past their matchDate are left
+alone: matching is over for them and rescoring would only move scores
+under mentorships already made. Each cohort is matched under a lock, a
+PostgreSQL advisory lock or else a lock on the cohort's row, and matchedAt
+is checked again once it is held, so however many nodes run the scheduler
+each cohort is matched once. Nodes wait a random delay before each cohort
+they match, so that when many cohorts close together, e.g. at midnight,
+the runs are spread out rather than all starting at the same moment.
+"""
+from contextlib import contextmanager
+from django.db import connection, transaction
+from django.utils import timezone
+from match.models import Cohort
+import random
+import time
+import traceback
+
+# Returns the closed cohorts, not yet past their matchDate, that the
+# scheduler has not matched yet, the longest closed first.
+def due_cohorts(now=None):
+    now = now or timezone.now()
+    return Cohort.objects.filter(
+        closeDate__lte=now,
+        matchDate__gt=now,
+        matchedAt__isnull=True
+    ).order_by('closeDate', 'cohortId')
+
+# Advisory lock key for a cohort: the top 64 bits of its id, as the signed
+# bigint PostgreSQL takes.
+def lock_key(cohortId):
+    key = cohortId.int >> 64
+    return key - (1 << 64) if key >= 1 << 63 else key
+
+# Holds the cohort's lock for the duration of the block and yields whether
+# it is still due once the lock is held. On PostgreSQL this is a session
+# advisory lock, not waited for: if another node holds it, that node is
+# matching the cohort already. Elsewhere the cohort's row is locked for
+# the transaction, and a node that had to wait finds matchedAt set.
+@contextmanager
+def cohort_lock(cohort):
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_try_advisory_lock(%s)", [lock_key(cohort.pk)])
+            locked = cursor.fetchone()[0]
+        if not locked:
+            yield False
+            return
+        try:
+            yield due_cohorts().filter(pk=cohort.pk).exists()
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_unlock(%s)", [lock_key(cohort.pk)])
+    else:
+        with transaction.atomic():
+            yield due_cohorts().select_for_update().filter(pk=cohort.pk).exists()
+
+# Matches one cohort if it is still due, returning the number of pairs
+# scored, or None if it was left to another node.
+def match_cohort(cohort):
+    with cohort_lock(cohort) as due:
+        if not due:
+            return None
+        written = cohort.match()
+        Cohort.objects.filter(pk=cohort.pk).update(matchedAt=timezone.now())
+        return written
+
+# Matches every due cohort, waiting up to jitter seconds first each time,
+# and returns [(cohortId, pairs scored or None, error)]. A cohort that fails
+# keeps no matchedAt, so it is tried again on the next pass.
+def run_due(jitter=0, now=None, sleep=time.sleep, rng=random):
+    results = []
+    for cohort in due_cohorts(now):
+        if jitter > 0:
+            sleep(rng.uniform(0, jitter))
+        try:
+            results.append((cohort.pk, match_cohort(cohort), None))
+        except Exception:
+            results.append((cohort.pk, None, traceback.format_exc()))
+    return results
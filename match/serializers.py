@@ -2,6 +2,8 @@ from rest_framework import serializers,validators
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Group, User
 from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
+from django.db.models import F
 from django.utils import timezone
 from django.utils.encoding import smart_text
 import json
@@ -37,6 +39,14 @@ class TagSerializer(serializers.ModelSerializer):
             'name': { 'validators': [] }
         }
 
+    # Tags are unique by slug, so posting one that exists returns it.
+    def create(self, validated_data):
+        tag, created = models.Tag.objects.get_or_create(
+            slug=slugify(validated_data['name']),
+            defaults=validated_data
+        )
+        return tag
+
 class UserProfileSerializer(serializers.ModelSerializer):
     tags = TagSerializer(many=True, required=False)
 
@@ -48,9 +58,11 @@ class UserProfileSerializer(serializers.ModelSerializer):
             'dateOfBirth',
             'bio',
             'profileImageUrl',
+            'mentorCapacity',
+            'mentorLoad',
             'tags',
         )
-        read_only_fields = ('tags',)
+        read_only_fields = ('tags', 'mentorLoad',)
 
 class UserSerializer(serializers.ModelSerializer):
     profile = UserProfileSerializer(required=False)
@@ -79,7 +91,7 @@ class UserSerializer(serializers.ModelSerializer):
 
         for tag in tags_data:
             try:
-                obj = models.Tag.objects.get(name=tag['name'])
+                obj = models.Tag.objects.get(slug=slugify(tag['name']))
                 user.tags.add(obj)
             except models.Tag.DoesNotExist:
                 user.tags.create(**tag)
@@ -112,6 +124,7 @@ class ProgrammeSerializer(serializers.ModelSerializer):
             'logo',
             'bannerImage',
             'defaultCohortSize',
+            'scoringMode',
             'createdBy'
         )
 
@@ -131,6 +144,7 @@ class CohortSerializer(serializers.ModelSerializer):
             'matchDate',
             'createdBy'
         )
+        read_only_fields = ('participantCount',)
 
 class ParticipantSerializer(serializers.ModelSerializer):
     tags = CreatableSlugRelatedField(many=True,
@@ -160,29 +174,65 @@ class ParticipantSerializer(serializers.ModelSerializer):
         }
 
     def create(self, validated_data):
-        # prevent too many signups
-        if validated_data['cohort'].participants.count() >= validated_data['cohort'].cohortSize:
-            raise serializers.ValidationError("This cohort is full.")
-
-        # prevent signups before opening date and after closing date
-        if timezone.now() > validated_data['cohort'].closeDate:
-            raise serializers.ValidationError("This cohort has closed for registration.")
-        if timezone.now() < validated_data['cohort'].openDate:
-            raise serializers.ValidationError("This cohort is not yet open for registration.")
-        
-        tags = []
-        try:
-            tags = validated_data.pop('tags')
-        except KeyError:
-            pass
-        p = models.Participant.objects.create(**validated_data)
-        
-        # Adding tags manually AFTER participant created to
-        # avoid IntegrityError.
-        for tag in tags:
-            p.tags.add(tag)
+        cohort = validated_data['cohort']
+        tags = validated_data.pop('tags', [])
+        now = timezone.now()
+        with transaction.atomic():
+            # Take a seat in a single statement that only counts it while
+            # the cohort is open and not full, so concurrent signups can't
+            # overfill it. The cohort row stays locked until the end of the
+            # transaction, so signups to it queue here and the duplicate
+            # check below can't race another signup by the same user.
+            reserved = models.Cohort.objects.filter(
+                pk=cohort.pk,
+                openDate__lte=now,
+                closeDate__gte=now,
+                participantCount__lt=F('cohortSize')
+            ).update(participantCount=F('participantCount') + 1)
+            if not reserved:
+                raise serializers.ValidationError(self._refusal(cohort, now))
+            if models.Participant.objects.filter(cohort=cohort, user=validated_data['user']).exists():
+                # Rolls back the seat taken above.
+                raise serializers.ValidationError("You have already applied for this cohort.")
+
+            p = models.Participant(**validated_data)
+            # The seat was counted when it was reserved.
+            p.seatReserved = True
+            p.save()
+            # Adding tags manually AFTER participant created to
+            # avoid IntegrityError.
+            p.tags.add(*tags)
         return p
 
+    # Says why a seat couldn't be reserved, from the cohort as it is now.
+    def _refusal(self, cohort, now):
+        participantCount, cohortSize, openDate, closeDate = models.Cohort.objects.values_list(
+            'participantCount', 'cohortSize', 'openDate', 'closeDate'
+        ).get(pk=cohort.pk)
+        if participantCount >= cohortSize:
+            return "This cohort is full."
+        if now > closeDate:
+            return "This cohort has closed for registration."
+        return "This cohort is not yet open for registration."
+
+
+class MatchJobSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = models.MatchJob
+        fields = (
+            'jobId',
+            'cohort',
+            'status',
+            'attempts',
+            'progress',
+            'total',
+            'message',
+            'createdAt',
+            'startedAt',
+            'finishedAt'
+        )
+        read_only_fields = fields
 
 class GroupSerializer(serializers.ModelSerializer):
     class Meta:
@@ -1,6 +1,8 @@
 from datetime import timedelta
 import json
 from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 from match.models import Cohort,Programme
@@ -44,6 +46,21 @@ class CohortAPITests(TestCaseUtils, APITestCase):
         response = self.client.get(url, HTTP_AUTHORIZATION=self._get_auth_header(token=token.token))
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+    def test_list_queries_dont_grow_with_cohorts(self):
+        url = reverse('cohort-list')
+        token = self._create_token(self.test_user, 'read')
+        counts = []
+        for total in (2, 12):
+            while Cohort.objects.count() < total:
+                cohort = Cohort.objects.create(programme=self.programme, createdBy=self.staff_user)
+                cohort.participants.create(user=self.test_user, isMentor=False)
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url, HTTP_AUTHORIZATION=self._get_auth_header(token=token.token))
+            self.assertEqual(len(json.loads(response.content.decode('utf-8'))), total)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+        self.assertFalse([q for q in queries.captured_queries if 'COUNT(' in q['sql']])
+
     def test_can_get_specific_cohort(self):
         cohort = Cohort.objects.create(
             programme=self.programme,
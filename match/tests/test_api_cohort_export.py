@@ -0,0 +1,89 @@
+from datetime import timedelta
+import csv
+import io
+import json
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+from match import export
+from match.benchmarks import synthetic
+from match.models import Mentorship, MentorshipScore
+from oauth2_provider.models import AccessToken, Application
+from oauth2_provider.tests.test_utils import TestCaseUtils
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+class CohortExportAPITests(TestCaseUtils, APITestCase):
+
+    def setUp(self):
+        self.test_user = User.objects.create_user("test@example.com", "test@example.com", "hunter23")
+        self.staff_user = User.objects.create_user("staff@example.com", "staff@example.com", "hunter23", is_staff=True)
+
+        self.application = Application(
+            name = "Django Test",
+            user= self.test_user,
+            client_type = Application.CLIENT_PUBLIC,
+            authorization_grant_type = Application.GRANT_PASSWORD,
+        )
+        self.application.save()
+
+        self.cohort = synthetic.build_cohort(5, 3, vocabulary=5, tagsPerParticipant=2, seed=3)
+        User.objects.filter(mentorships__cohort=self.cohort).update(first_name="Ada", last_name="Lovelace")
+        self.cohort.match()
+
+    def get(self, kind, fileFormat, user=None):
+        url = reverse('cohort-export', kwargs={'cohortId': self.cohort.cohortId, 'kind': kind, 'fileFormat': fileFormat})
+        token = self._create_token(user or self.staff_user, 'read staff')
+        return self.client.get(url, HTTP_AUTHORIZATION=self._get_auth_header(token.token))
+
+    def test_staff_can_export_scores_as_csv(self):
+        response = self.get('scores', 'csv')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.DictReader(io.StringIO(b"".join(response.streaming_content).decode('utf-8'))))
+        self.assertEqual(len(rows), MentorshipScore.objects.count())
+        scores = {(str(s.mentee_id), str(s.mentor_id)): s.score for s in MentorshipScore.objects.all()}
+        for row in rows:
+            self.assertEqual(int(row['score']), scores[(row['menteeId'], row['mentorId'])])
+            self.assertEqual(row['menteeName'], "Ada Lovelace")
+            self.assertEqual(len(row['mentorTags'].split(";")), 2)
+            self.assertTrue(row['mentorTags'].startswith("synthetic-tag-"))
+
+    def test_staff_can_export_rankings_as_ndjson(self):
+        response = self.get('rankings', 'ndjson')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in b"".join(response.streaming_content).decode('utf-8').splitlines()]
+        self.assertEqual(len(rows), 15)
+        self.assertEqual(sorted(rows[0]), sorted(export.columns('rankings')))
+        self.assertTrue(all(isinstance(row['menteeTags'], list) for row in rows))
+
+    def test_cant_export_if_not_staff(self):
+        response = self.get('scores', 'csv', user=self.test_user)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_pages_cover_every_row_once(self):
+        rows = list(export.export_rows(self.cohort, 'scores', pageSize=2))
+        self.assertEqual(len(rows), MentorshipScore.objects.count())
+        self.assertEqual(len(set((r[0], r[3]) for r in rows)), len(rows))
+
+    def test_command_exports_mentorships(self):
+        self.cohort.assign()
+        out = io.StringIO()
+        call_command('export_cohort', str(self.cohort.cohortId), kind='mentorships', fileFormat='ndjson', stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), Mentorship.objects.count())
+
+    ## HELPER FUNCTIONS
+
+    def _get_auth_header(self, token=None):
+        return "Bearer {0}".format(token or self.access_token.token)
+
+    def _create_token(self,user,scope):
+        return AccessToken.objects.create(
+            user=user,
+            token='123456789',
+            application=self.application,
+            expires=timezone.now() + timedelta(days=1),
+            scope=scope
+        )
@@ -0,0 +1,123 @@
+from datetime import timedelta
+import json
+from django.contrib.auth.models import User
+from django.urls import reverse
+from django.utils import timezone
+from match.benchmarks import synthetic
+from match.models import MatchJob,MentorshipScore,Programme
+from oauth2_provider.models import AccessToken, Application
+from oauth2_provider.tests.test_utils import TestCaseUtils
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+class CohortMatchAPITests(TestCaseUtils, APITestCase):
+
+    def setUp(self):
+        self.test_user = User.objects.create_user("test@example.com", "test@example.com", "hunter23")
+        self.staff_user = User.objects.create_user("staff@example.com", "staff@example.com", "hunter23", is_staff=True)
+
+        self.application = Application(
+            name = "Django Test",
+            user= self.test_user,
+            client_type = Application.CLIENT_PUBLIC,
+            authorization_grant_type = Application.GRANT_PASSWORD,
+        )
+        self.application.save()
+
+        self.programme = Programme.objects.create(
+            name="Test Programme",
+            description="Test programme for the API tests",
+            createdBy=self.staff_user
+        )
+        self.cohort = self.programme.cohorts.create(
+            cohortSize=10,
+            createdBy=self.staff_user
+        )
+
+    def test_staff_can_queue_match(self):
+        url = reverse('cohort-match', kwargs={'cohortId': self.cohort.cohortId})
+        token = self._create_token(self.staff_user, 'read write staff')
+        response = self.client.post(url, HTTP_AUTHORIZATION=self._get_auth_header(token.token))
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        res_data = json.loads(response.content.decode('utf-8'))
+        job = MatchJob.objects.get()
+        self.assertEqual(res_data['jobId'], str(job.jobId))
+        self.assertEqual(res_data['status'], MatchJob.QUEUED)
+        self.assertTrue(res_data['statusUrl'].endswith(
+            reverse('cohort-match-status', kwargs={'cohortId': self.cohort.cohortId, 'jobId': job.jobId})))
+
+    def test_queueing_twice_returns_existing_job(self):
+        url = reverse('cohort-match', kwargs={'cohortId': self.cohort.cohortId})
+        token = self._create_token(self.staff_user, 'read write staff')
+        self.client.post(url, HTTP_AUTHORIZATION=self._get_auth_header(token.token))
+        response = self.client.post(url, HTTP_AUTHORIZATION=self._get_auth_header(token.token))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(MatchJob.objects.count(), 1)
+
+    def test_cant_queue_match_if_not_staff(self):
+        url = reverse('cohort-match', kwargs={'cohortId': self.cohort.cohortId})
+        token = self._create_token(self.test_user, 'read write staff')
+        response = self.client.post(url, HTTP_AUTHORIZATION=self._get_auth_header(token.token))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(MatchJob.objects.count(), 0)
+
+    def test_staff_can_get_match_status(self):
+        job = MatchJob.objects.create(cohort=self.cohort, status=MatchJob.RUNNING, progress=5, total=20)
+        url = reverse('cohort-match-status', kwargs={'cohortId': self.cohort.cohortId, 'jobId': job.jobId})
+        token = self._create_token(self.staff_user, 'read staff')
+        response = self.client.get(url, HTTP_AUTHORIZATION=self._get_auth_header(token.token))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        res_data = json.loads(response.content.decode('utf-8'))
+        self.assertEqual(res_data['status'], MatchJob.RUNNING)
+        self.assertEqual((res_data['progress'], res_data['total']), (5, 20))
+
+    def test_match_status_not_found_for_other_cohort(self):
+        other = self.programme.cohorts.create(createdBy=self.staff_user)
+        job = MatchJob.objects.create(cohort=other)
+        url = reverse('cohort-match-status', kwargs={'cohortId': self.cohort.cohortId, 'jobId': job.jobId})
+        token = self._create_token(self.staff_user, 'read staff')
+        response = self.client.get(url, HTTP_AUTHORIZATION=self._get_auth_header(token.token))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_staff_can_preview_match(self):
+        cohort = synthetic.build_cohort(6, 3, vocabulary=5, tagsPerParticipant=2, seed=2)
+        mentee = cohort.participants.filter(isMentor=False).first()
+        url = reverse('cohort-match-preview', kwargs={'cohortId': cohort.cohortId})
+        token = self._create_token(self.staff_user, 'read staff')
+        response = self.client.post(url, json.dumps({'tags': {str(mentee.participantId): []}, 'cohortSize': 9}),
+            content_type='application/json', HTTP_AUTHORIZATION=self._get_auth_header(token.token))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        res_data = json.loads(response.content.decode('utf-8'))
+        self.assertEqual((res_data['mentees'], res_data['mentors']), (6, 3))
+        self.assertEqual(len(res_data['topThree']), 6)
+        self.assertEqual([s for m, s in res_data['topThree'][str(mentee.participantId)]], [0, 0, 0])
+        self.assertFalse(MentorshipScore.objects.exists())
+
+    def test_preview_rejects_bad_changes(self):
+        url = reverse('cohort-match-preview', kwargs={'cohortId': self.cohort.cohortId})
+        token = self._create_token(self.staff_user, 'read staff')
+        for body in ({'tags': {'not-an-id': []}}, {'tags': ['python']}, {'cohortSize': 'ten'},
+                {'tags': {'12345678-90ab-cdef-1234-56789abcdef0': ['python']}}):
+            response = self.client.post(url, json.dumps(body), content_type='application/json',
+                HTTP_AUTHORIZATION=self._get_auth_header(token.token))
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, body)
+
+    def test_cant_preview_match_if_not_staff(self):
+        url = reverse('cohort-match-preview', kwargs={'cohortId': self.cohort.cohortId})
+        token = self._create_token(self.test_user, 'read staff')
+        response = self.client.post(url, HTTP_AUTHORIZATION=self._get_auth_header(token.token))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    ## HELPER FUNCTIONS
+
+    def _get_auth_header(self, token=None):
+        return "Bearer {0}".format(token or self.access_token.token)
+
+    def _create_token(self,user,scope):
+        return AccessToken.objects.create(
+            user=user,
+            token='123456789',
+            application=self.application,
+            expires=timezone.now() + timedelta(days=1),
+            scope=scope
+        )
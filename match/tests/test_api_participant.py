@@ -336,6 +336,35 @@ class ParticipantAPITests(TestCaseUtils, APITestCase):
     #TODO: Add test for can't choose top three if auth user isn't participant
     #TODO: Add test for pass when <3 choices given.
 
+    def test_can_choose_preferences_if_mentor(self):
+        objs = self._create_nominal_cohort_and_participants()
+        url = reverse('participant-preferences', kwargs={'participantId': objs['mentors'][0].participantId})
+        token = self._create_token(self.other_user, 'write')
+        data = {'choices': [str(objs['mentee'].participantId)]}
+        response = self.client.post(url, json.dumps(data), content_type='application/json',
+            HTTP_AUTHORIZATION=self._get_auth_header(token.token))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(objs['mentors'][0].preferences.values_list('choice_id', flat=True)), [objs['mentee'].participantId])
+
+    def test_cant_choose_preferences_if_mentee(self):
+        objs = self._create_nominal_cohort_and_participants()
+        url = reverse('participant-preferences', kwargs={'participantId': objs['mentee'].participantId})
+        token = self._create_token(self.test_user, 'write')
+        data = {'choices': [str(objs['mentors'][0].participantId)]}
+        response = self.client.post(url, json.dumps(data), content_type='application/json',
+            HTTP_AUTHORIZATION=self._get_auth_header(token.token))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_cant_choose_other_mentors_as_preferences(self):
+        objs = self._create_nominal_cohort_and_participants()
+        url = reverse('participant-preferences', kwargs={'participantId': objs['mentors'][0].participantId})
+        token = self._create_token(self.other_user, 'write')
+        data = {'choices': [str(objs['mentors'][1].participantId)]}
+        response = self.client.post(url, json.dumps(data), content_type='application/json',
+            HTTP_AUTHORIZATION=self._get_auth_header(token.token))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(objs['mentors'][0].preferences.exists())
+
     ## HELPER FUNCTIONS
 
     def _get_auth_header(self, token=None):
@@ -175,6 +175,26 @@ class ParticipantRegisterAPITests(TestCaseUtils, APITransactionTestCase):
         response = self.client.post(url, data=data, format='json', HTTP_AUTHORIZATION=self._get_auth_header(token=token.token))
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
 
+    def test_registering_twice_is_refused_without_taking_a_seat(self):
+        url = reverse('cohort-register', kwargs={'cohortId': self.cohort.cohortId})
+        token = self._create_token(self.test_user, 'read write')
+        for _ in range(2):
+            response = self.client.post(url, data={'isMentor': True}, format='json', HTTP_AUTHORIZATION=self._get_auth_header(token=token.token))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(json.loads(response.content.decode('utf-8'))['detail'], "You have already applied for this cohort.")
+        self.assertEqual(Cohort.objects.get(pk=self.cohort.pk).participantCount, 1)
+
+    def test_refused_registrations_leave_the_count_alone(self):
+        url = reverse('cohort-register', kwargs={'cohortId': self.cohort.cohortId})
+        for user in (self.test_user, self.other_user, self.fourth_user):
+            AccessToken.objects.all().delete()
+            token = self._create_token(user, 'read write')
+            response = self.client.post(url, data={'isMentor': True}, format='json', HTTP_AUTHORIZATION=self._get_auth_header(token=token.token))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(json.loads(response.content.decode('utf-8'))['detail'], "This cohort is full.")
+        self.assertEqual(Cohort.objects.get(pk=self.cohort.pk).participantCount, 2)
+        self.assertEqual(self.cohort.participants.count(), 2)
+
     ## HELPER FUNCTIONS
 
     def _get_auth_header(self, token=None):
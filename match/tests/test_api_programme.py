@@ -1,6 +1,8 @@
 from datetime import timedelta
 import json
 from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 from match.models import Cohort,Programme
@@ -285,6 +287,43 @@ class ProgrammeAPITests(TestCaseUtils, APITestCase):
         response = self.client.get(url, HTTP_AUTHORIZATION=self._get_auth_header(token.token))
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
 
+    def test_list_embeds_active_cohorts_in_constant_queries(self):
+        token = self._create_token(self.test_user, 'read')
+        url = reverse('programme-list') + '?embed=activeCohort'
+        counts = []
+        for n in range(2):
+            for i in range(3):
+                programme = Programme.objects.create(
+                    name = 'Programme %d %d' % (n, i),
+                    description = 'This is a test programme.',
+                    createdBy = self.staff_user
+                )
+                programme.cohorts.create(
+                    openDate = timezone.now() - timedelta(days=3),
+                    closeDate = timezone.now() + timedelta(days=4),
+                    createdBy = self.staff_user
+                )
+            Programme.objects.create(name='Without %d' % n, description='No cohorts.', createdBy=self.staff_user)
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url, HTTP_AUTHORIZATION=self._get_auth_header(token.token))
+            counts.append(len(queries))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        res_data = json.loads(response.content.decode('utf-8'))
+        self.assertEqual(len(res_data), 8)
+        for programme in res_data:
+            active = Programme.objects.get(programmeId=programme['programmeId']).activeCohort
+            if active is None:
+                self.assertIsNone(programme['activeCohort'])
+            else:
+                self.assertEqual(programme['activeCohort']['cohortId'], str(active.cohortId))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_list_leaves_out_active_cohorts_unless_asked(self):
+        Programme.objects.create(name='Programme', description='A programme.', createdBy=self.staff_user)
+        token = self._create_token(self.test_user, 'read')
+        response = self.client.get(reverse('programme-list'), HTTP_AUTHORIZATION=self._get_auth_header(token.token))
+        self.assertNotIn('activeCohort', json.loads(response.content.decode('utf-8'))[0])
+
     ## HELPER FUNCTIONS
 
     def _get_auth_header(self, token=None):
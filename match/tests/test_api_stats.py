@@ -0,0 +1,119 @@
+from datetime import timedelta
+import json
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from match import timing
+from match.models import Programme
+from oauth2_provider.models import AccessToken, Application
+from oauth2_provider.tests.test_utils import TestCaseUtils
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+class RequestStatsAPITests(TestCaseUtils, APITestCase):
+
+    def setUp(self):
+        self.test_user = User.objects.create_user("test@example.com", "test@example.com", "hunter23")
+        self.staff_user = User.objects.create_user("staff@example.com", "staff@example.com", "hunter23", is_staff=True)
+
+        self.application = Application(
+            name = "Django Test",
+            user= self.test_user,
+            client_type = Application.CLIENT_PUBLIC,
+            authorization_grant_type = Application.GRANT_PASSWORD,
+        )
+        self.application.save()
+        for n in range(3):
+            Programme.objects.create(name="Programme %d" % n, description="", createdBy=self.staff_user)
+        timing.stats.reset()
+        self.addCleanup(timing.set_enabled, None)
+
+    def test_staff_responses_carry_server_timing(self):
+        token = self._create_token(self.staff_user, 'read')
+        response = self.client.get(reverse('programme-list'), HTTP_AUTHORIZATION=self._get_auth_header(token.token))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        header = response['Server-Timing']
+        self.assertRegex(header, r'^db;dur=[0-9.]+;desc="[1-9][0-9]* queries", serialize;dur=[0-9.]+, render;dur=[0-9.]+, total;dur=[0-9.]+$')
+
+    def test_server_timing_only_for_staff_unless_set(self):
+        token = self._create_token(self.test_user, 'read')
+        response = self.client.get(reverse('programme-list'), HTTP_AUTHORIZATION=self._get_auth_header(token.token))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(response.has_header('Server-Timing'))
+        self.assertEqual(timing.stats.summary()['programme-list']['count'], 1)
+
+        with self.settings(SERVER_TIMING_HEADER=True):
+            response = self.client.get(reverse('programme-list'), HTTP_AUTHORIZATION=self._get_auth_header(token.token))
+        self.assertTrue(response.has_header('Server-Timing'))
+
+    def test_staff_can_read_stats(self):
+        token = self._create_token(self.staff_user, 'read staff')
+        for _ in range(2):
+            self.client.get(reverse('programme-list'), HTTP_AUTHORIZATION=self._get_auth_header(token.token))
+        response = self.client.get(reverse('stats-requests'), HTTP_AUTHORIZATION=self._get_auth_header(token.token))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        res_data = json.loads(response.content.decode('utf-8'))
+        self.assertTrue(res_data['enabled'])
+        programmes = res_data['urls']['programme-list']
+        self.assertEqual(programmes['count'], 2)
+        self.assertEqual(sum(n for bound, n in programmes['buckets']), 2)
+        self.assertGreater(programmes['meanQueries'], 0)
+
+    def test_cant_read_stats_if_not_staff(self):
+        token = self._create_token(self.test_user, 'read staff')
+        response = self.client.get(reverse('stats-requests'), HTTP_AUTHORIZATION=self._get_auth_header(token.token))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_staff_can_switch_timing_off(self):
+        token = self._create_token(self.staff_user, 'read write staff')
+        response = self.client.patch(reverse('stats-requests'), json.dumps({'enabled': False}),
+            content_type='application/json', HTTP_AUTHORIZATION=self._get_auth_header(token.token))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(json.loads(response.content.decode('utf-8'))['enabled'])
+        response = self.client.get(reverse('programme-list'), HTTP_AUTHORIZATION=self._get_auth_header(token.token))
+        self.assertFalse(response.has_header('Server-Timing'))
+
+        response = self.client.patch(reverse('stats-requests'), json.dumps({'enabled': 'yes'}),
+            content_type='application/json', HTTP_AUTHORIZATION=self._get_auth_header(token.token))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    ## HELPER FUNCTIONS
+
+    def _get_auth_header(self, token=None):
+        return "Bearer {0}".format(token or self.access_token.token)
+
+    def _create_token(self,user,scope):
+        return AccessToken.objects.create(
+            user=user,
+            token='123456789',
+            application=self.application,
+            expires=timezone.now() + timedelta(days=1),
+            scope=scope
+        )
+
+class RequestStatsTests(TestCase):
+
+    def test_windows_roll_over(self):
+        now = [0.0]
+        stats = timing.RequestStats(window=10, clock=lambda: now[0])
+        timer = timing.RequestTimer()
+        timer.total = 0.003
+        stats.record('a', timer)
+        now[0] = 15
+        stats.record('a', timer)
+        self.assertEqual(stats.summary()['a']['count'], 2)
+        now[0] = 25
+        self.assertEqual(stats.summary()['a']['count'], 1)
+        now[0] = 100
+        self.assertEqual(stats.summary(), {})
+
+    def test_percentiles_come_from_buckets(self):
+        histogram = timing.Histogram()
+        for milliseconds in [1] * 90 + [40] * 9 + [20000]:
+            timer = timing.RequestTimer()
+            timer.total = milliseconds / 1000.0
+            histogram.add(timer)
+        summary = histogram.summary()
+        self.assertEqual((summary['p50Ms'], summary['p95Ms'], summary['p99Ms']), (1, 50, 50))
+        self.assertIsNone(histogram.percentile(1.0))
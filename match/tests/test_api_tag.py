@@ -20,3 +20,10 @@ class TagAPITests(APITestCase):
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(json.loads(response.content.decode('utf-8')), [{'name': 'My Tag'}])
+
+    def test_adding_existing_tag_returns_it(self):
+        Tag(name="My Tag").save()
+        response = self.client.post(reverse('tag_list'), {'name': 'my tag'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(json.loads(response.content.decode('utf-8')), {'name': 'My Tag'})
+        self.assertEqual(Tag.objects.count(), 1)
@@ -0,0 +1,63 @@
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase
+from match.benchmarks import indexes
+from match.models import Tag
+from unittest import mock
+import io
+import unittest
+
+class HotQueryIndexTests(TestCase):
+
+    @unittest.skipUnless(indexes.reads_plans(), "can't read this database's query plans")
+    def test_every_hot_query_is_served_by_an_index(self):
+        sample = indexes.build(scores=100, cohorts=12, tags=50)
+        indexes.analyze()
+        results = indexes.check(sample, preferIndexes=True)
+        self.assertEqual([r['name'] for r in results], [q[0] for q in indexes.HOT_QUERIES])
+        for result in results:
+            self.assertTrue(result['ok'], result)
+
+    @unittest.skipUnless(indexes.reads_plans(), "can't read this database's query plans")
+    def test_best_scores_are_read_in_index_order(self):
+        sample = indexes.build(scores=100, cohorts=1, tags=1)
+        result = [r for r in indexes.check(sample, preferIndexes=True) if r['name'] == 'scoresByMentee'][0]
+        self.assertFalse(result['sorts'])
+
+    def test_reads_sqlite_plans(self):
+        paths, sorts = indexes._sqlite_paths([
+            'SEARCH match_cohort USING INDEX match_cohort_unmatched (closeDate<?)',
+            'SCAN TABLE match_tag',
+            'SEARCH TABLE auth_user USING INTEGER PRIMARY KEY (rowid=?)',
+            'USE TEMP B-TREE FOR ORDER BY',
+        ])
+        self.assertEqual(paths, [('match_cohort', 'match_cohort_unmatched'), ('match_tag', None), ('auth_user', 'PRIMARY KEY')])
+        self.assertTrue(sorts)
+
+    def test_reads_postgresql_plans(self):
+        plan = {'Node Type': 'Limit', 'Plans': [
+            {'Node Type': 'Sort', 'Plans': [
+                {'Node Type': 'Bitmap Heap Scan', 'Relation Name': 'match_participant', 'Plans': [
+                    {'Node Type': 'Bitmap Index Scan', 'Index Name': 'match_participant_e8701ad4'},
+                ]},
+                {'Node Type': 'Seq Scan', 'Relation Name': 'match_tag'},
+            ]},
+        ]}
+        paths = []
+        self.assertTrue(indexes._walk_postgresql(plan, paths))
+        self.assertEqual(paths, [('match_participant', 'match_participant_e8701ad4'), ('match_tag', None)])
+
+    @unittest.skipUnless(indexes.reads_plans(), "can't read this database's query plans")
+    def test_command_reports_each_query(self):
+        out = io.StringIO()
+        call_command('benchmark_indexes', scores=100, cohorts=5, tags=20, prefer_indexes=True, stdout=out)
+        self.assertEqual(out.getvalue().count("ok  "), len(indexes.HOT_QUERIES))
+
+    def test_other_databases_are_refused_up_front(self):
+        with mock.patch.object(connection, 'vendor', 'mysql'), mock.patch.object(indexes, 'build') as build:
+            with self.assertRaisesRegex(CommandError, "only be checked on postgresql or sqlite, not mysql"):
+                call_command('benchmark_indexes', stdout=io.StringIO())
+            with self.assertRaises(CommandError):
+                indexes.access_paths(Tag.objects.all())
+        self.assertFalse(build.called)
@@ -0,0 +1,41 @@
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TransactionTestCase, skipUnlessDBFeature
+from match.benchmarks import registration
+from match.models import Cohort, Participant
+import io
+
+class RegistrationStormTests(TransactionTestCase):
+
+    # An in-memory SQLite test database refuses concurrent writers outright
+    # rather than waiting for them, so the storms need a real database.
+    @skipUnlessDBFeature('test_db_allows_multiple_connections')
+    def test_storm_never_oversubscribes(self):
+        result = registration.storm(10, 40, threads=8, duplicates=10)
+        self.assertEqual(result['errors'], [])
+        self.assertEqual(result['registered'], 10)
+        self.assertEqual(result['participants'], 10)
+        self.assertEqual(result['participantCount'], 10)
+        self.assertEqual(result['refused'], {"This cohort is full.": 40})
+
+    @skipUnlessDBFeature('test_db_allows_multiple_connections')
+    def test_storm_refuses_duplicates(self):
+        result = registration.storm(30, 20, threads=8, duplicates=10)
+        self.assertEqual(result['errors'], [])
+        self.assertEqual(result['registered'], 20)
+        self.assertEqual(result['refused'], {"You have already applied for this cohort.": 10})
+        self.assertTrue(result['consistent'])
+
+    def test_single_thread_fills_the_cohort_and_cleans_up(self):
+        result = registration.storm(5, 10, threads=1, duplicates=2)
+        self.assertEqual(result['errors'], [])
+        self.assertEqual(result['registered'], 5)
+        self.assertEqual(result['refused'], {"This cohort is full.": 7})
+        self.assertFalse(Cohort.objects.exists())
+        self.assertFalse(Participant.objects.exists())
+        self.assertFalse(User.objects.exists())
+
+    def test_command_reports_registrations(self):
+        out = io.StringIO()
+        call_command('benchmark_registration', seats=5, signups=10, threads=1, duplicates=2, stdout=out)
+        self.assertIn("registered: 5", out.getvalue())
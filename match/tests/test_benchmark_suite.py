@@ -0,0 +1,103 @@
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from match.benchmarks import suite, synthetic
+from match.matching.minhash import MinHashLSH
+from match.models import Cohort, Tag
+import copy
+import io
+import json
+import os
+import tempfile
+
+class BenchmarkSuiteTests(TestCase):
+
+    def test_query_counter_matches_captured_queries(self):
+        def work():
+            Tag.objects.create(name="counted")
+            list(Tag.objects.all())
+            Tag.objects.filter(name="counted").delete()
+        with suite.QueryCounter() as counter:
+            work()
+        with CaptureQueriesContext(connection) as captured:
+            work()
+        self.assertEqual(counter.queries, len(captured))
+        self.assertTrue(counter.queries >= 3)
+
+    def test_run_case_measures_every_stage(self):
+        case = suite.run_case(10, 8, vocabulary=6, tags=2, assign=True, approximate=MinHashLSH())
+        self.assertEqual(set(case['stages']), set(suite.STAGES))
+        self.assertTrue(0 <= case['recallAt3'] <= 1)
+        self.assertEqual(case['scores'], 10 * 8)
+        for stage, stats in case['stages'].items():
+            self.assertGreater(stats['queries'], 0, stage)
+            self.assertGreater(stats['peakBytes'], 0, stage)
+            self.assertGreaterEqual(stats['seconds'], 0, stage)
+        self.assertFalse(Cohort.objects.exists())
+
+    def test_recall_is_measured_before_assigning(self):
+        # Enough bands that every pair sharing a tag is a candidate, so
+        # nothing but mentors filling up could cost recall.
+        case = suite.run_case(10, 8, vocabulary=6, tags=2, memory=False, assign=True,
+            approximate=MinHashLSH(bands=64, rows=1))
+        self.assertEqual(case['recallAt3'], 1.0)
+        self.assertTrue(case['assigned'])
+
+    def test_profiled_case_stores_nearly_every_pair(self):
+        plain = suite.run_case(10, 8, vocabulary=20, tags=2, memory=False)
+        profiled = suite.run_case(10, 8, vocabulary=20, tags=2, memory=False, profile=suite.PROFILE)
+        self.assertLess(plain['stored'], 10 * 8 / 2)
+        self.assertGreater(profiled['stored'], 10 * 8 / 2)
+        self.assertNotEqual(suite.case_key(plain), suite.case_key(profiled))
+
+    def test_run_case_is_repeatable(self):
+        first = suite.run_case(6, 4, vocabulary=5, tags=2, distribution='uniform', seed=3, memory=False)
+        second = suite.run_case(6, 4, vocabulary=5, tags=2, distribution='uniform', seed=3, memory=False)
+        for stage in suite.STAGES[:3]:
+            self.assertEqual(first['stages'][stage]['queries'], second['stages'][stage]['queries'])
+        self.assertEqual(first['rescored'], second['rescored'])
+        self.assertIsNone(first['stages']['match']['peakBytes'])
+
+    def test_compare_flags_regressions(self):
+        baseline = {'cases': [suite.run_case(5, 5, vocabulary=4, tags=2, memory=False)]}
+        current = copy.deepcopy(baseline)
+        self.assertFalse(any(r[-1] for r in suite.compare(baseline, current)))
+
+        current['cases'][0]['stages']['match']['queries'] += 1
+        current['cases'][0]['stages']['rematch']['seconds'] += 1
+        regressed = [stage for key, stage, old, new, r in suite.compare(baseline, current) if r]
+        self.assertEqual(regressed, ['match', 'rematch'])
+
+    def test_tag_count_distributions(self):
+        for distribution in synthetic.DISTRIBUTIONS:
+            cohort = synthetic.build_cohort(20, 5, vocabulary=30, tagsPerParticipant=4, distribution=distribution)
+            counts = [len(p.tags.all()) for p in cohort.participants.prefetch_related('tags')]
+            if distribution == 'fixed':
+                self.assertEqual(set(counts), {4})
+            else:
+                self.assertGreater(len(set(counts)), 1)
+        with self.assertRaises(ValueError):
+            synthetic.build_cohort(1, 1, distribution='normal')
+
+    def test_command_writes_and_compares_results(self):
+        handle, path = tempfile.mkstemp(suffix='.json')
+        os.close(handle)
+        try:
+            call_command('benchmark_suite', sizes=[(4, 3)], vocabulary=5, tags=2, output=path, stdout=io.StringIO())
+            with open(path) as f:
+                results = json.load(f)
+            self.assertEqual(len(results['cases']), 1)
+            self.assertEqual(results['environment']['database'], connection.vendor)
+
+            # Pretend the baseline needed fewer queries.
+            results['cases'][0]['stages']['match']['queries'] -= 1
+            with open(path, 'w') as f:
+                json.dump(results, f)
+            out = io.StringIO()
+            with self.assertRaises(CommandError):
+                call_command('benchmark_suite', sizes=[(4, 3)], vocabulary=5, tags=2, compare=path, stdout=out)
+            self.assertIn("REGRESSED", out.getvalue())
+        finally:
+            os.remove(path)
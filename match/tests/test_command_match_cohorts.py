@@ -0,0 +1,86 @@
+from datetime import timedelta
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from django.utils import timezone
+from match.benchmarks import synthetic
+from match.matching import engine
+from match.models import MentorshipScore, Programme, ScoringProfile
+from unittest import mock
+import io
+
+class MatchCohortsCommandTests(TestCase):
+
+    def setUp(self):
+        self.closed = synthetic.build_cohort(3, 2, vocabulary=4, tagsPerParticipant=2)
+        self.open = synthetic.build_cohort(3, 2, vocabulary=4, tagsPerParticipant=2)
+        self.open.closeDate = timezone.now() + timedelta(days=1)
+        self.open.save()
+
+    def test_stale_cohorts(self):
+        now = timezone.now()
+        self.assertEqual(list(engine.stale_cohorts(now)), [self.closed])
+        self.closed.match()
+        self.assertEqual(list(engine.stale_cohorts(now)), [])
+
+        mentee = self.closed.participants.filter(isMentor=False).first()
+        mentee.tags.clear()
+        self.assertEqual(list(engine.stale_cohorts(now)), [self.closed])
+
+    def test_stale_cohorts_after_scoring_changes(self):
+        now = timezone.now()
+        self.closed.match()
+        programme = self.closed.programme
+
+        profile = ScoringProfile.objects.create(programme=programme, seniorityWeight=1)
+        self.assertEqual(list(engine.stale_cohorts(now)), [self.closed])
+        self.closed.match()
+        self.assertEqual(list(engine.stale_cohorts(now)), [])
+        profile.save()
+        self.assertEqual(list(engine.stale_cohorts(now)), [self.closed])
+        profile.delete()
+        self.assertEqual(list(engine.stale_cohorts(now)), [self.closed])
+        self.closed.match()
+
+        programme.scoringMode = Programme.IDF
+        programme.save()
+        self.assertEqual(list(engine.stale_cohorts(now)), [self.closed])
+        self.closed.match()
+        self.assertEqual(list(engine.stale_cohorts(now)), [])
+        programme.scoringMode = Programme.OVERLAP
+        programme.save()
+        self.assertEqual(list(engine.stale_cohorts(now)), [self.closed])
+        self.closed.match()
+
+        self.closed.match(approximate=True)
+        self.assertEqual(list(engine.stale_cohorts(now)), [self.closed])
+        self.closed.match()
+        self.assertEqual(list(engine.stale_cohorts(now)), [])
+
+    def test_matches_stale_closed_cohorts(self):
+        out = io.StringIO()
+        call_command('match_cohorts', processes=1, stdout=out)
+        self.assertEqual(MentorshipScore.objects.filter(mentee__cohort=self.closed).count(), synthetic.shared_pairs(self.closed))
+        self.assertEqual(MentorshipScore.objects.filter(mentee__cohort=self.open).count(), 0)
+        self.assertIn("%s 6 scores" % self.closed.cohortId, out.getvalue())
+
+        out = io.StringIO()
+        call_command('match_cohorts', processes=1, stdout=out)
+        self.assertIn("No cohorts need matching", out.getvalue())
+
+    def test_explicit_cohorts(self):
+        call_command('match_cohorts', str(self.open.cohortId), processes=1, stdout=io.StringIO())
+        self.assertEqual(MentorshipScore.objects.filter(mentee__cohort=self.open).count(), synthetic.shared_pairs(self.open))
+
+    def test_dry_run_changes_nothing(self):
+        out = io.StringIO()
+        call_command('match_cohorts', dry_run=True, stdout=out)
+        self.assertEqual(out.getvalue().split(), [str(self.closed.cohortId)])
+        self.assertEqual(MentorshipScore.objects.count(), 0)
+
+    def test_failures_are_reported(self):
+        with mock.patch('match.models.Cohort.match', side_effect=RuntimeError("boom")):
+            err = io.StringIO()
+            with self.assertRaises(CommandError):
+                call_command('match_cohorts', processes=1, stdout=io.StringIO(), stderr=err)
+        self.assertIn("boom", err.getvalue())
@@ -0,0 +1,95 @@
+from datetime import timedelta
+from django.core.management import call_command
+from django.db.models.query import QuerySet
+from django.test import TestCase
+from django.utils import timezone
+from match import jobs
+from match.benchmarks import synthetic
+from match.models import MatchJob, MentorshipScore
+from unittest import mock
+import io
+
+class MatchJobTests(TestCase):
+
+    def setUp(self):
+        self.cohort = synthetic.build_cohort(4, 3, vocabulary=5, tagsPerParticipant=2)
+
+    def test_enqueue_reuses_pending_job(self):
+        job, created = jobs.enqueue(self.cohort)
+        self.assertTrue(created)
+        self.assertEqual(jobs.enqueue(self.cohort), (job, False))
+
+        MatchJob.objects.filter(pk=job.pk).update(status=MatchJob.DONE)
+        self.assertTrue(jobs.enqueue(self.cohort)[1])
+
+    def test_claim_marks_job_running(self):
+        job, _ = jobs.enqueue(self.cohort)
+        claimed = jobs.claim("worker-1")
+        self.assertEqual(claimed.pk, job.pk)
+        self.assertEqual(claimed.status, MatchJob.RUNNING)
+        self.assertEqual(claimed.attempts, 1)
+        self.assertEqual(claimed.workerId, "worker-1")
+        self.assertIsNone(jobs.claim("worker-2"))
+
+    def test_claim_skips_jobs_not_yet_due(self):
+        MatchJob.objects.create(cohort=self.cohort, runAfter=timezone.now() + timedelta(minutes=1))
+        self.assertIsNone(jobs.claim("worker-1"))
+
+    def test_claim_takes_over_stale_running_job(self):
+        job = MatchJob.objects.create(
+            cohort=self.cohort,
+            status=MatchJob.RUNNING,
+            attempts=1,
+            heartbeatAt=timezone.now() - jobs.STALE_AFTER - timedelta(seconds=1)
+        )
+        claimed = jobs.claim("worker-2")
+        self.assertEqual(claimed.pk, job.pk)
+        self.assertEqual(claimed.attempts, 2)
+
+    def test_claim_moves_on_when_another_worker_wins(self):
+        first = MatchJob.objects.create(cohort=self.cohort, runAfter=timezone.now() - timedelta(minutes=1))
+        second, _ = jobs.enqueue(synthetic.build_cohort(2, 2, vocabulary=3, tagsPerParticipant=1, seed=1))
+        update = QuerySet.update
+        raced = []
+        def race(queryset, **kwargs):
+            # Another worker takes the first job between the read and the UPDATE.
+            if not raced:
+                raced.append(update(MatchJob.objects.filter(pk=first.pk), status=MatchJob.RUNNING, workerId="worker-1"))
+            return update(queryset, **kwargs)
+        with mock.patch.object(QuerySet, 'update', race):
+            claimed = jobs.claim("worker-2")
+        self.assertEqual(claimed.pk, second.pk)
+        self.assertEqual(MatchJob.objects.get(pk=first.pk).workerId, "worker-1")
+
+    def test_run_matches_cohort(self):
+        jobs.enqueue(self.cohort)
+        job = jobs.claim("worker-1")
+        self.assertTrue(jobs.run(job))
+        job.refresh_from_db()
+        self.assertEqual(job.status, MatchJob.DONE)
+        self.assertEqual(job.progress, 12)
+        self.assertIsNotNone(job.finishedAt)
+        self.assertEqual(MentorshipScore.objects.count(), synthetic.shared_pairs(self.cohort))
+
+    def test_failed_job_is_retried_then_fails(self):
+        jobs.enqueue(self.cohort)
+        with mock.patch('match.models.Cohort.match', side_effect=RuntimeError("boom")):
+            job = jobs.claim("worker-1")
+            self.assertFalse(jobs.run(job))
+            job.refresh_from_db()
+            self.assertEqual(job.status, MatchJob.QUEUED)
+            self.assertIn("boom", job.message)
+            self.assertGreater(job.runAfter, timezone.now())
+
+            MatchJob.objects.filter(pk=job.pk).update(attempts=job.maxAttempts - 1, runAfter=timezone.now())
+            job = jobs.claim("worker-1")
+            self.assertFalse(jobs.run(job))
+            job.refresh_from_db()
+            self.assertEqual(job.status, MatchJob.FAILED)
+
+    def test_worker_command_runs_queue_once(self):
+        jobs.enqueue(self.cohort)
+        out = io.StringIO()
+        call_command('match_worker', once=True, stdout=out)
+        self.assertEqual(MatchJob.objects.get().status, MatchJob.DONE)
+        self.assertIn("done", out.getvalue())
@@ -0,0 +1,102 @@
+from django.test import TestCase
+from match.benchmarks import synthetic
+from match.matching import assignment
+from match.models import Mentorship
+import itertools
+import random
+
+# Best total score over every possible assignment, by exhaustive search.
+def brute_force(weights, capacities):
+    mentees = list(weights)
+    options = [[None] + [m for m, w in weights[mentee] if w > 0] for mentee in mentees]
+    best = 0
+    for choice in itertools.product(*options):
+        load = {}
+        for mentor in choice:
+            if mentor is not None:
+                load[mentor] = load.get(mentor, 0) + 1
+        if all(n <= capacities.get(m, 0) for m, n in load.items()):
+            best = max(best, sum(dict(weights[mentee])[m] for mentee, m in zip(mentees, choice) if m is not None))
+    return best
+
+class SolveTests(TestCase):
+
+    def check(self, weights, capacities):
+        result = assignment.solve(weights, capacities)
+        load = {}
+        for mentee, mentor in result.items():
+            load[mentor] = load.get(mentor, 0) + 1
+            self.assertGreater(dict(weights[mentee])[mentor], 0)
+        for mentor, n in load.items():
+            self.assertLessEqual(n, capacities[mentor])
+        self.assertEqual(assignment.total_score(weights, result), brute_force(weights, capacities))
+        return result
+
+    def test_beats_greedy(self):
+        # Greedy gives the shared favourite to "a" and leaves "b" with nothing.
+        weights = {
+            'a': [('x', 5), ('y', 4)],
+            'b': [('x', 4)],
+        }
+        capacities = {'x': 1, 'y': 1}
+        self.assertEqual(assignment.total_score(weights, assignment.greedy(weights, capacities)), 5)
+        self.assertEqual(self.check(weights, capacities), {'a': 'y', 'b': 'x'})
+
+    def test_capacity(self):
+        weights = {
+            'a': [('x', 3)],
+            'b': [('x', 2)],
+            'c': [('x', 1), ('y', 1)],
+        }
+        result = self.check(weights, {'x': 2, 'y': 1})
+        self.assertEqual(result, {'a': 'x', 'b': 'x', 'c': 'y'})
+
+    def test_zero_scores_and_unknown_mentors_never_assigned(self):
+        weights = {'a': [('x', 0), ('z', 5)], 'b': []}
+        self.assertEqual(assignment.solve(weights, {'x': 1}), {})
+
+    def test_random_instances_are_optimal(self):
+        rng = random.Random(11)
+        for _ in range(60):
+            mentors = ['m%d' % j for j in range(rng.randint(1, 4))]
+            weights = {
+                'e%d' % i: [(m, rng.randint(0, 6)) for m in mentors if rng.random() < 0.7]
+                for i in range(rng.randint(1, 6))
+            }
+            capacities = {m: rng.randint(0, 2) for m in mentors}
+            self.check(weights, capacities)
+
+    def test_dense_instances_with_ties_are_optimal(self):
+        # Every pair is an edge and scores repeat, so searches keep reaching
+        # mentors they have already finished with.
+        rng = random.Random(12)
+        for _ in range(30):
+            mentors = ['m%d' % j for j in range(rng.randint(2, 4))]
+            weights = {
+                'e%d' % i: [(m, rng.randint(1, 3)) for m in mentors]
+                for i in range(rng.randint(3, 6))
+            }
+            self.check(weights, {m: rng.randint(1, 2) for m in mentors})
+
+class AssignCohortTests(TestCase):
+
+    def setUp(self):
+        self.cohort = synthetic.build_cohort(8, 3, vocabulary=6, tagsPerParticipant=3, seed=5)
+        self.cohort.participants.filter(isMentor=True).update(capacity=2)
+        self.cohort.match()
+
+    def test_creates_mentorships_and_flags_matched(self):
+        result = self.cohort.assign()
+        self.assertEqual(Mentorship.objects.count(), len(result))
+        self.assertLessEqual(len(result), 6)
+        matched = set(self.cohort.participants.filter(isMatched=True).values_list('participantId', flat=True))
+        self.assertEqual(matched, set(result) | set(result.values()))
+
+    def test_respects_existing_mentorships(self):
+        first = self.cohort.assign()
+        second = self.cohort.assign()
+        self.assertFalse(set(first) & set(second))
+        load = {}
+        for m in Mentorship.objects.all():
+            load[m.mentor_id] = load.get(m.mentor_id, 0) + 1
+        self.assertTrue(all(n <= 2 for n in load.values()))
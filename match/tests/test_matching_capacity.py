@@ -0,0 +1,78 @@
+from django.test import TestCase
+from match.benchmarks import synthetic
+from match.matching import assignment, capacity
+from match.models import Mentorship, MentorshipScore, Participant, UserProfile
+
+class CapacityTests(TestCase):
+
+    def setUp(self):
+        self.cohort = synthetic.build_cohort(6, 3, vocabulary=4, tagsPerParticipant=3, seed=2)
+        self.mentors = list(self.cohort.participants.filter(isMentor=True).order_by('participantId'))
+        self.mentees = list(self.cohort.participants.filter(isMentor=False).order_by('participantId'))
+        for profile in [UserProfile(user_id=m.user_id) for m in self.mentors]:
+            profile.save()
+
+    def available(self):
+        return set(Participant.objects.filter(capacity.available(), isMentor=True).values_list('participantId', flat=True))
+
+    def test_available_skips_saturated_mentors(self):
+        first, second, third = self.mentors
+        Participant.objects.filter(pk=first.pk).update(load=1)
+        UserProfile.objects.filter(user_id=second.user_id).update(mentorCapacity=2, mentorLoad=2)
+        UserProfile.objects.filter(user_id=third.user_id).update(mentorCapacity=2, mentorLoad=1)
+        self.assertEqual(self.available(), {third.pk})
+
+    def test_mentorships_keep_loads_counted(self):
+        mentor = self.mentors[0]
+        mentorship = Mentorship.objects.create(mentor=mentor, mentee=self.mentees[0])
+        mentor.refresh_from_db()
+        self.assertEqual(mentor.load, 1)
+        self.assertEqual(UserProfile.objects.get(user_id=mentor.user_id).mentorLoad, 1)
+        mentorship.delete()
+        mentor.refresh_from_db()
+        self.assertEqual(mentor.load, 0)
+        self.assertEqual(UserProfile.objects.get(user_id=mentor.user_id).mentorLoad, 0)
+
+    def test_top_three_skips_saturated_mentors(self):
+        self.cohort.match()
+        mentee = self.mentees[0]
+        ranked = [m.pk for m in mentee.getTopThree()]
+        Participant.objects.filter(pk=ranked[0]).update(load=1)
+        mentors = [m.pk for m in mentee.getTopThree()]
+        self.assertEqual(mentors, ranked[1:])
+
+    def test_top_three_is_one_query_when_nobody_is_saturated(self):
+        self.cohort.match()
+        mentee = Participant.objects.get(pk=self.mentees[0].pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(len(mentee.getTopThree()), 3)
+
+    def test_user_capacity_spans_cohorts(self):
+        Participant.objects.filter(isMentor=True).update(capacity=3)
+        mentor = self.mentors[0]
+        UserProfile.objects.filter(user_id=mentor.user_id).update(mentorCapacity=2, mentorLoad=1)
+        MentorshipScore.objects.bulk_create([
+            MentorshipScore(mentee=mentee, mentor=m, score=10 if m == mentor else 1)
+            for mentee in self.mentees
+            for m in self.mentors
+        ])
+        weights, capacities = assignment.load_problem(self.cohort)
+        self.assertEqual(capacities[mentor.pk], 1)
+        result = self.cohort.assign()
+        self.assertEqual(list(result.values()).count(mentor.pk), 1)
+        self.assertEqual(UserProfile.objects.get(user_id=mentor.user_id).mentorLoad, 2)
+        self.assertEqual(Participant.objects.get(pk=mentor.pk).load, 1)
+        self.assertNotIn(mentor.pk, assignment.load_problem(self.cohort)[1])
+
+    def test_assignment_keeps_only_places_still_free(self):
+        # Another assignment takes a place between loading and saving.
+        mentor = self.mentors[0]
+        Participant.objects.filter(pk=mentor.pk).update(capacity=2)
+        weights = {m.pk: [(mentor.pk, 1)] for m in self.mentees[:2]}
+        result = assignment.solve(weights, assignment.load_problem(self.cohort)[1])
+        self.assertEqual(len(result), 2)
+        Mentorship.objects.create(mentor=mentor, mentee=self.mentees[5])
+        saved = assignment.save_assignment(result)
+        self.assertEqual(len(saved), 1)
+        self.assertEqual(Mentorship.objects.filter(mentor=mentor).count(), 2)
+        self.assertEqual(Participant.objects.get(pk=mentor.pk).load, 2)
@@ -0,0 +1,49 @@
+from django.test import TestCase
+from match.benchmarks import synthetic
+from match.matching import engine
+from match.models import MentorshipScore
+
+class MatchingEngineTests(TestCase):
+
+    def setUp(self):
+        self.cohort = synthetic.build_cohort(12, 7, vocabulary=10, tagsPerParticipant=3, seed=42)
+
+    def test_scores_every_pair(self):
+        created = engine.score_cohort(self.cohort)
+        self.assertEqual(created, 12 * 7)
+        self.assertEqual(synthetic.score_snapshot(self.cohort), synthetic.set_overlaps(self.cohort))
+
+    def test_only_pairs_sharing_a_tag_are_stored(self):
+        engine.score_cohort(self.cohort)
+        stored = MentorshipScore.objects.filter(mentee__cohort=self.cohort)
+        self.assertEqual(stored.count(), synthetic.shared_pairs(self.cohort))
+        self.assertLess(stored.count(), 12 * 7)
+        self.assertFalse(stored.filter(score=0).exists())
+
+    def test_scores_identical_to_legacy_path(self):
+        synthetic.legacy_match(self.cohort)
+        legacy = synthetic.score_snapshot(self.cohort)
+        MentorshipScore.objects.all().delete()
+
+        self.cohort.match()
+        self.assertEqual(synthetic.score_snapshot(self.cohort), legacy)
+
+    def test_small_batches_give_same_scores(self):
+        self.cohort.match()
+        expected = synthetic.score_snapshot(self.cohort)
+        MentorshipScore.objects.all().delete()
+
+        engine.score_cohort(self.cohort, full=True, batch_size=5)
+        self.assertEqual(synthetic.score_snapshot(self.cohort), expected)
+
+    def test_scores_match_calculate_score(self):
+        self.cohort.match()
+        for ms in MentorshipScore.objects.filter(mentee__cohort=self.cohort):
+            expected = ms.score
+            ms.calculateScore()
+            self.assertEqual(ms.score, expected)
+
+    def test_untagged_participants_score_zero(self):
+        cohort = synthetic.build_cohort(2, 2, tagsPerParticipant=0)
+        cohort.match()
+        self.assertEqual(set(synthetic.score_snapshot(cohort).values()), {0})
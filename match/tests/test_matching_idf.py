@@ -0,0 +1,109 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from match.benchmarks import synthetic
+from match.matching.tags import IDF_SCALE, idf_weights, load_tags
+from match.models import MentorshipScore, Programme, Tag
+
+class IDFScoringTests(TestCase):
+
+    def setUp(self):
+        self.cohort = synthetic.build_cohort(10, 6, vocabulary=8, tagsPerParticipant=3, seed=21)
+        self.programme = self.cohort.programme
+        self.programme.scoringMode = Programme.IDF
+        self.programme.save()
+
+    def expected(self):
+        weights = idf_weights(self.cohort)
+        tags = load_tags(participant__cohort=self.cohort)
+        scores = {}
+        for menteeId, mentorId in synthetic.set_overlaps(self.cohort):
+            shared = set(tags.get(menteeId, [])) & set(tags.get(mentorId, []))
+            scores[(menteeId, mentorId)] = sum(weights[name] for name in shared)
+        return scores
+
+    def test_scores_are_weighted_sums(self):
+        self.cohort.match()
+        self.assertEqual(synthetic.score_snapshot(self.cohort), self.expected())
+        self.assertEqual(self.cohort.tagWeights.count(), len(idf_weights(self.cohort)))
+
+    def test_rare_tags_outweigh_common_ones(self):
+        common = Tag.objects.create(name="common")
+        rare = Tag.objects.create(name="rare")
+        participants = list(self.cohort.participants.all())
+        for p in participants:
+            p.tags.set([common])
+        mentee = next(p for p in participants if not p.isMentor)
+        mentor = next(p for p in participants if p.isMentor)
+        mentee.tags.add(rare)
+        mentor.tags.set([rare])
+        self.cohort.match()
+        self.assertEqual(mentee.getTopThree()[0], mentor)
+        weights = idf_weights(self.cohort)
+        self.assertGreater(weights[rare.pk], weights[common.pk])
+        self.assertGreaterEqual(weights[common.pk], IDF_SCALE)
+
+    def test_tag_changes_rescore_the_whole_cohort(self):
+        self.cohort.match()
+        mentee = self.cohort.participants.filter(isMentor=False).first()
+        mentee.tags.set(Tag.objects.filter(name__startswith="synthetic-tag-"))
+        self.assertEqual(self.cohort.match(), 10 * 6)
+        self.assertEqual(synthetic.score_snapshot(self.cohort), self.expected())
+        self.assertEqual(self.cohort.match(), 0)
+
+    def test_changing_mode_rescores(self):
+        self.programme.scoringMode = Programme.OVERLAP
+        self.programme.save()
+        self.cohort.match()
+        self.assertEqual(synthetic.score_snapshot(self.cohort), synthetic.set_overlaps(self.cohort))
+
+        self.programme.scoringMode = Programme.IDF
+        self.programme.save()
+        self.assertEqual(self.cohort.match(), 10 * 6)
+        self.assertEqual(synthetic.score_snapshot(self.cohort), self.expected())
+
+        self.programme.scoringMode = Programme.OVERLAP
+        self.programme.save()
+        self.assertEqual(self.cohort.match(), 10 * 6)
+        self.assertEqual(synthetic.score_snapshot(self.cohort), synthetic.set_overlaps(self.cohort))
+        self.assertEqual(self.cohort.tagWeights.count(), 0)
+
+    def test_scores_match_calculate_score(self):
+        self.cohort.match()
+        for ms in MentorshipScore.objects.filter(mentee__cohort=self.cohort):
+            expected = ms.score
+            ms.calculateScore()
+            self.assertEqual(ms.score, expected)
+
+    def test_calculate_score_reads_only_the_pair(self):
+        self.cohort.match()
+        ms = MentorshipScore.objects.filter(mentee__cohort=self.cohort).first()
+        expected = ms.score
+        ms.score = 0
+        with CaptureQueriesContext(connection) as queries:
+            ms.calculateScore()
+        self.assertEqual(ms.score, expected)
+        pair = [ms.mentee_id, ms.mentor_id]
+        for query in queries.captured_queries:
+            if 'match_participant_tags' in query['sql']:
+                # Quoted as hex on SQLite, with dashes on PostgreSQL.
+                self.assertTrue(all(p.hex in query['sql'] or str(p) in query['sql'] for p in pair), query['sql'])
+            if 'match_tagweight' in query['sql']:
+                self.assertIn('tag_id" IN', query['sql'])
+
+        # Without saved weights, only the shared tags' frequencies are read.
+        self.cohort.tagWeights.all().delete()
+        with CaptureQueriesContext(connection) as queries:
+            ms.calculateScore()
+        self.assertEqual(ms.score, expected)
+        frequencies = [q['sql'] for q in queries.captured_queries if 'COUNT' in q['sql'] and 'match_participant_tags' in q['sql']]
+        self.assertEqual(len(frequencies), 1)
+        self.assertIn('tag_id" IN', frequencies[0])
+
+    def test_preference_bonus_is_scaled(self):
+        self.cohort.match()
+        mentee = self.cohort.participants.filter(isMentor=False).first()
+        first = mentee.getTopThree()[0]
+        before = MentorshipScore.objects.get(mentee=mentee, mentor=first).score
+        mentee.setTopThree([m.participantId for m in mentee.getTopThree()])
+        self.assertEqual(MentorshipScore.objects.get(mentee=mentee, mentor=first).score, before + 10 * IDF_SCALE)
@@ -0,0 +1,80 @@
+from django.contrib.auth.models import User
+from django.test import TestCase
+from match.benchmarks import synthetic
+from match.models import MentorshipScore, Participant, Tag
+
+class IncrementalMatchTests(TestCase):
+
+    def setUp(self):
+        self.cohort = synthetic.build_cohort(6, 4, vocabulary=8, tagsPerParticipant=3, seed=7)
+        self.cohort.match()
+        self.mentees = list(self.cohort.participants.filter(isMentor=False))
+        self.mentors = list(self.cohort.participants.filter(isMentor=True))
+
+    def assertScoresCorrect(self):
+        expected = synthetic.set_overlaps(self.cohort)
+        self.assertEqual(synthetic.score_snapshot(self.cohort), expected)
+
+    def score_ids(self):
+        return set(MentorshipScore.objects.filter(mentee__cohort=self.cohort).values_list('pk', flat=True))
+
+    def test_first_run_marks_everyone_scored(self):
+        self.assertFalse(self.cohort.participants.exclude(scoredVersion=0).exists())
+        self.assertScoresCorrect()
+
+    def test_second_run_is_a_no_op(self):
+        before = self.score_ids()
+        self.assertEqual(self.cohort.match(), 0)
+        self.assertEqual(self.score_ids(), before)
+        self.assertEqual(MentorshipScore.objects.count(), synthetic.shared_pairs(self.cohort))
+
+    def test_tag_change_bumps_version(self):
+        mentee = self.mentees[0]
+        mentee.tags.add(Tag.objects.create(name="Brand new"))
+        mentee.refresh_from_db()
+        self.assertEqual(mentee.tagVersion, 1)
+        self.assertEqual(mentee.scoredVersion, 0)
+
+    def test_changed_mentee_only_rescores_its_row(self):
+        mentee = self.mentees[0]
+        others = set(MentorshipScore.objects.exclude(mentee=mentee).values_list('pk', flat=True))
+        mentee.tags.set(self.mentors[0].tags.all())
+
+        self.assertEqual(self.cohort.match(), len(self.mentors))
+        self.assertTrue(others.issubset(self.score_ids()))
+        self.assertScoresCorrect()
+        self.assertEqual(MentorshipScore.objects.count(), synthetic.shared_pairs(self.cohort))
+
+    def test_changed_mentor_only_rescores_its_column(self):
+        mentor = self.mentors[0]
+        mentor.tags.clear()
+        self.assertEqual(self.cohort.match(), len(self.mentees))
+        self.assertFalse(MentorshipScore.objects.filter(mentor=mentor).exists())
+        self.assertScoresCorrect()
+
+    def test_tag_removed_from_reverse_side(self):
+        tag = self.mentors[1].tags.first()
+        tag.ParticipantTag.clear()
+        self.cohort.match()
+        self.assertScoresCorrect()
+
+    def test_late_registration_is_scored(self):
+        user = User.objects.create_user("late@example.com", "late@example.com", "hunter2")
+        late = self.cohort.participants.create(user=user, isMentor=False)
+        late.tags.add(*self.mentors[0].tags.all())
+
+        self.assertEqual(self.cohort.match(), len(self.mentors))
+        self.assertScoresCorrect()
+        self.assertEqual(MentorshipScore.objects.count(), synthetic.shared_pairs(self.cohort))
+
+    def test_withdrawn_participant_scores_removed(self):
+        self.mentors[0].delete()
+        self.cohort.match()
+        self.assertEqual(MentorshipScore.objects.count(), synthetic.shared_pairs(self.cohort))
+        self.assertScoresCorrect()
+
+    def test_full_rescores_everything(self):
+        before = self.score_ids()
+        self.assertEqual(self.cohort.match(full=True), 6 * 4)
+        self.assertFalse(before & self.score_ids())
+        self.assertScoresCorrect()
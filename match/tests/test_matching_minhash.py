@@ -0,0 +1,60 @@
+from django.test import TestCase
+from match.benchmarks import suite, synthetic
+from match.matching import minhash
+from match.models import Cohort, MentorshipScore
+
+class MinHashMatchTests(TestCase):
+
+    def setUp(self):
+        self.cohort = synthetic.build_cohort(30, 20, vocabulary=15, tagsPerParticipant=3, seed=21)
+
+    def test_candidate_scores_are_exact(self):
+        scored = self.cohort.match(approximate=minhash.MinHashLSH(bands=8, rows=2))
+        self.assertEqual(scored, 30 * 20)
+        exact = synthetic.set_overlaps(self.cohort)
+        snapshot = synthetic.score_snapshot(self.cohort)
+        stored = MentorshipScore.objects.filter(mentee__cohort=self.cohort).values_list('mentee_id', 'mentor_id')
+        self.assertTrue(stored.exists())
+        for pair in stored:
+            self.assertEqual(snapshot[pair], exact[pair])
+        self.assertLessEqual(len(stored), synthetic.shared_pairs(self.cohort))
+
+    def test_exact_run_after_approximate_rescores_everything(self):
+        self.cohort.match(approximate=True)
+        self.assertTrue(Cohort.objects.get(pk=self.cohort.pk).isApproximate)
+        self.assertEqual(self.cohort.match(), 30 * 20)
+        self.assertFalse(Cohort.objects.get(pk=self.cohort.pk).isApproximate)
+        self.assertEqual(synthetic.score_snapshot(self.cohort), synthetic.set_overlaps(self.cohort))
+        self.assertEqual(self.cohort.match(), 0)
+
+    def test_approximate_runs_always_rescore(self):
+        self.cohort.match()
+        self.assertEqual(self.cohort.match(approximate=True), 30 * 20)
+        self.assertEqual(self.cohort.match(approximate=True), 30 * 20)
+
+    def test_candidates_caps_scores_per_mentee(self):
+        self.cohort.match(approximate=minhash.MinHashLSH(bands=64, rows=1, candidates=2))
+        for mentee in self.cohort.participants.filter(isMentor=False):
+            self.assertLessEqual(MentorshipScore.objects.filter(mentee=mentee).count(), 2)
+
+    def test_more_bands_raise_recall(self):
+        mentees = list(self.cohort.participants.filter(isMentor=False))
+        self.cohort.match()
+        exact = {p.participantId: [m.participantId for m in p.getTopThree()] for p in mentees}
+        scores = {p.participantId: dict(MentorshipScore.objects.filter(mentee=p).values_list('mentor_id', 'score'))
+            for p in mentees}
+        recalls = []
+        for bands in (1, 64):
+            self.cohort.match(approximate=minhash.MinHashLSH(bands=bands, rows=3))
+            found = {p.participantId: [m.participantId for m in p.getTopThree()] for p in mentees}
+            recalls.append(suite.recall(exact, found, scores))
+        self.assertLess(recalls[0], recalls[1])
+        self.assertGreater(recalls[1], 0.9)
+
+    def test_probability(self):
+        lsh = minhash.MinHashLSH(bands=20, rows=5)
+        self.assertAlmostEqual(lsh.probability(1.0), 1.0)
+        self.assertEqual(lsh.probability(0.0), 0.0)
+        self.assertGreater(lsh.probability(0.8), 0.99)
+        with self.assertRaises(ValueError):
+            minhash.MinHashLSH(bands=0)
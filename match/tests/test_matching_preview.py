@@ -0,0 +1,64 @@
+from django.test import TestCase
+from match.benchmarks import synthetic
+from match.matching import preview
+from match.models import MentorRanking, MentorshipScore, Programme, ScoringProfile
+import uuid
+
+class MatchPreviewTests(TestCase):
+
+    def setUp(self):
+        self.cohort = synthetic.build_cohort(15, 8, vocabulary=10, tagsPerParticipant=3, seed=8)
+
+    def rankings(self):
+        ranked = {}
+        for menteeId, mentorId, score in MentorRanking.objects.filter(
+                mentee__cohort=self.cohort).order_by('mentee', 'rank').values_list('mentee_id', 'mentor_id', 'score'):
+            ranked.setdefault(str(menteeId), []).append([str(mentorId), score])
+        return ranked
+
+    def assertMatchesRealRun(self):
+        result = preview.preview_cohort(self.cohort)
+        self.assertFalse(MentorshipScore.objects.exists())
+        self.cohort.match()
+        self.assertEqual(result['topThree'], self.rankings())
+        self.assertEqual(result['pairs'], MentorshipScore.objects.count())
+        self.assertEqual((result['mentees'], result['mentors']), (15, 8))
+
+    def test_same_as_match(self):
+        self.assertMatchesRealRun()
+
+    def test_same_as_match_with_idf_and_profile(self):
+        Programme.objects.filter(pk=self.cohort.programme_id).update(scoringMode=Programme.IDF)
+        ScoringProfile.objects.create(programme=self.cohort.programme, tagWeight=2, departmentWeight=1)
+        self.assertMatchesRealRun()
+
+    def test_reads_in_a_few_queries(self):
+        # Participants, their tags and the programme.
+        with self.assertNumQueries(3):
+            preview.preview_cohort(self.cohort)
+
+    def test_tag_changes_apply_to_preview_only(self):
+        mentor = self.cohort.participants.filter(isMentor=True).order_by('participantId').last()
+        mentee = self.cohort.participants.filter(isMentor=False).first()
+        tags = {mentee.participantId: ["what-if"], mentor.participantId: ["what-if"]}
+        result = preview.preview_cohort(self.cohort, tags=tags)
+        self.assertEqual(result['topThree'][str(mentee.participantId)][0], [str(mentor.participantId), 1])
+        self.assertNotIn("what-if", [t.name for t in mentee.tags.all()])
+
+    def test_tag_changes_find_existing_tags_by_name(self):
+        mentor = self.cohort.participants.filter(isMentor=True).order_by('participantId').last()
+        mentee = self.cohort.participants.filter(isMentor=False).first()
+        names = [t.name for t in mentor.tags.all()]
+        result = preview.preview_cohort(self.cohort, tags={mentee.participantId: names})
+        self.assertEqual(result['topThree'][str(mentee.participantId)][0], [str(mentor.participantId), len(names)])
+
+    def test_cohort_size_takes_first_sign_ups(self):
+        first = list(self.cohort.participants.order_by('signUpDate', 'participantId')[:10])
+        result = preview.preview_cohort(self.cohort, cohortSize=10)
+        self.assertEqual(result['mentees'] + result['mentors'], 10)
+        mentees = set(str(p.participantId) for p in first if not p.isMentor)
+        self.assertEqual(set(result['topThree']), mentees if result['mentors'] else set())
+
+    def test_rejects_tags_for_outsiders(self):
+        with self.assertRaises(ValueError):
+            preview.preview_cohort(self.cohort, tags={uuid.uuid4(): ["x"]})
@@ -0,0 +1,110 @@
+from datetime import date, timedelta
+from django.test import TestCase
+from django.utils import timezone
+from match.benchmarks import synthetic
+from match.matching import minhash
+from match.models import MentorshipScore, Participant, ScoringProfile, UserProfile
+import random
+
+class ScoringProfileTests(TestCase):
+
+    def setUp(self):
+        self.cohort = synthetic.build_cohort(9, 6, vocabulary=8, tagsPerParticipant=3, seed=13)
+        rng = random.Random(13)
+        # build_cohort() bulk creates users, which skips their profiles.
+        UserProfile.objects.bulk_create([
+            UserProfile(
+                user_id=p.user_id,
+                joinDate=rng.choice([None, date.today() - timedelta(days=rng.randint(0, 20 * 365))]),
+                department=rng.choice(["", "Engineering", "Sales", "Finance"])
+            ) for p in self.cohort.participants.all()
+        ])
+        self.profile = ScoringProfile.objects.create(
+            programme=self.cohort.programme,
+            tagWeight=10,
+            seniorityWeight=2,
+            seniorityCap=5,
+            departmentWeight=-3
+        )
+
+    def expected(self):
+        overlaps = synthetic.set_overlaps(self.cohort)
+        participants = {p.participantId: p.user.profile for p in self.cohort.participants.select_related('user__profile')}
+        scores = {}
+        for (menteeId, mentorId), overlap in overlaps.items():
+            mentee, mentor = participants[menteeId], participants[mentorId]
+            score = self.profile.tagWeight * overlap
+            if mentee.joinDate and mentor.joinDate:
+                gap = mentor.getYearsWorked() - mentee.getYearsWorked()
+                score += self.profile.seniorityWeight * min(max(gap, 0), self.profile.seniorityCap)
+            if mentee.department and mentor.department and mentee.department != mentor.department:
+                score += self.profile.departmentWeight
+            scores[(menteeId, mentorId)] = score
+        return scores
+
+    def test_scores_include_profile_terms(self):
+        self.cohort.match()
+        self.assertEqual(synthetic.score_snapshot(self.cohort), self.expected())
+
+    def test_approximate_runs_add_profile_terms_to_candidates_only(self):
+        self.cohort.match(approximate=minhash.MinHashLSH(bands=16, rows=1, candidates=2))
+        expected = self.expected()
+        for mentee in self.cohort.participants.filter(isMentor=False):
+            scores = MentorshipScore.objects.filter(mentee=mentee).values_list('mentor_id', 'score')
+            self.assertLessEqual(len(scores), 2)
+            for mentorId, score in scores:
+                self.assertEqual(score, expected[(mentee.participantId, mentorId)])
+
+    def test_without_profile_scores_are_shared_tags(self):
+        self.profile.delete()
+        self.cohort.match()
+        self.assertEqual(synthetic.score_snapshot(self.cohort), synthetic.set_overlaps(self.cohort))
+
+    def test_changing_profile_rescores_cohort(self):
+        self.cohort.match()
+        self.profile.departmentWeight = 4
+        self.profile.save()
+        self.assertEqual(self.cohort.match(), 9 * 6)
+        self.assertEqual(synthetic.score_snapshot(self.cohort), self.expected())
+        self.assertEqual(self.cohort.match(), 0)
+
+    def test_profile_changes_rescore_participant(self):
+        self.cohort.match()
+        mentor = self.cohort.participants.filter(isMentor=True).first()
+        profile = mentor.user.profile
+        profile.department = "Marketing"
+        profile.joinDate = date.today() - timedelta(days=30 * 365)
+        profile.save()
+        self.assertEqual(self.cohort.match(), 9)
+        self.assertEqual(synthetic.score_snapshot(self.cohort), self.expected())
+
+    def test_profile_changes_skip_unprofiled_and_matched_cohorts(self):
+        mentor = self.cohort.participants.filter(isMentor=True).first()
+        other = synthetic.build_cohort(1, 1, vocabulary=2, tagsPerParticipant=1, seed=2)
+        unprofiled = Participant.objects.create(user=mentor.user, cohort=other, isMentor=False)
+        matched = synthetic.build_cohort(1, 1, vocabulary=2, tagsPerParticipant=1, seed=3)
+        ScoringProfile.objects.create(programme=matched.programme, seniorityWeight=1)
+        matched.matchDate = timezone.now() - timedelta(days=1)
+        matched.save()
+        past = Participant.objects.create(user=mentor.user, cohort=matched, isMentor=False)
+        profile = mentor.user.profile
+        profile.department = "Marketing"
+        profile.save()
+        versions = dict(Participant.objects.filter(user=mentor.user).values_list('participantId', 'tagVersion'))
+        self.assertEqual(versions[mentor.pk], mentor.tagVersion + 1)
+        self.assertEqual(versions[unprofiled.pk], unprofiled.tagVersion)
+        self.assertEqual(versions[past.pk], past.tagVersion)
+
+    def test_unrelated_profile_changes_keep_scores(self):
+        self.cohort.match()
+        profile = self.cohort.participants.first().user.profile
+        profile.bio = "Something new"
+        profile.save()
+        self.assertEqual(self.cohort.match(), 0)
+
+    def test_scores_match_calculate_score(self):
+        self.cohort.match()
+        for ms in MentorshipScore.objects.filter(mentee__cohort=self.cohort):
+            expected = ms.score
+            ms.calculateScore()
+            self.assertEqual(ms.score, expected)
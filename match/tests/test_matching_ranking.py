@@ -0,0 +1,96 @@
+from django.test import TestCase
+from match.benchmarks import synthetic
+from match.matching import ranking
+from match.models import MentorRanking, MentorshipScore, Participant, Tag, UserProfile
+import random
+
+class MentorRankingTests(TestCase):
+
+    def setUp(self):
+        self.cohort = synthetic.build_cohort(8, 6, vocabulary=6, tagsPerParticipant=2, seed=3)
+        self.cohort.match()
+
+    # Pairs without a stored score count as 0.
+    def expected(self, mentee):
+        scores = [(mentor, score) for (menteeId, mentor), score in synthetic.score_snapshot(self.cohort).items()
+            if menteeId == mentee.participantId]
+        return sorted(scores, key=lambda pair: (-pair[1], pair[0]))[:ranking.RANKING_SIZE]
+
+    def assertRankingsCurrent(self):
+        for mentee in self.cohort.participants.filter(isMentor=False):
+            ranked = MentorRanking.objects.filter(mentee=mentee).order_by('rank')
+            self.assertEqual([(r.mentor_id, r.score) for r in ranked], self.expected(mentee))
+
+    def test_match_ranks_every_mentee(self):
+        self.assertEqual(MentorRanking.objects.count(), 8 * ranking.RANKING_SIZE)
+        self.assertRankingsCurrent()
+
+    def test_ties_go_to_the_lowest_mentor_id(self):
+        shared = Tag.objects.create(name="shared")
+        for p in self.cohort.participants.all():
+            p.tags.set([shared])
+        self.cohort.match()
+        mentors = sorted(self.cohort.participants.filter(isMentor=True).values_list('participantId', flat=True))
+        mentee = self.cohort.participants.filter(isMentor=False).first()
+        self.assertEqual([m.participantId for m in mentee.getTopThree()], mentors[:3])
+
+    def test_rankings_follow_mentor_tag_changes(self):
+        mentor = self.cohort.participants.filter(isMentor=True).first()
+        mentor.tags.set(Tag.objects.filter(name__startswith="synthetic-tag-"))
+        self.cohort.match()
+        self.assertRankingsCurrent()
+        for mentee in self.cohort.participants.filter(isMentor=False):
+            self.assertEqual(mentee.getTopThree()[0], mentor)
+
+    def test_rankings_stay_current_over_many_runs(self):
+        rng = random.Random(11)
+        participants = list(self.cohort.participants.all())
+        tags = list(Tag.objects.filter(name__startswith="synthetic-tag-"))
+        for run in range(6):
+            for p in rng.sample(participants, 3):
+                p.tags.set(rng.sample(tags, rng.randint(0, 4)))
+            self.cohort.match()
+            self.assertRankingsCurrent()
+
+    def test_rank_mentees_rebuilds_from_scores(self):
+        mentee = self.cohort.participants.filter(isMentor=False).first()
+        last = MentorRanking.objects.get(mentee=mentee, rank=2)
+        MentorshipScore.objects.update_or_create(mentee=mentee, mentor_id=last.mentor_id, defaults={'score': 100})
+        ranking.rank_mentees([mentee.pk])
+        self.assertEqual(MentorRanking.objects.get(mentee=mentee, rank=0).mentor_id, last.mentor_id)
+        self.assertRankingsCurrent()
+
+    def test_top_three_is_one_query(self):
+        # build_cohort() bulk creates users, which skips their profiles.
+        UserProfile.objects.bulk_create([
+            UserProfile(user_id=p.user_id) for p in self.cohort.participants.all()
+        ])
+        mentee = Participant.objects.filter(cohort=self.cohort, isMentor=False).first()
+        with self.assertNumQueries(1):
+            mentors = mentee.getTopThree()
+            for mentor in mentors:
+                mentor.user.profile.department
+        self.assertEqual([m.participantId for m in mentors], [m for m, s in self.expected(mentee)])
+
+    def test_rank_mentees_counts_missing_scores_as_zero(self):
+        mentee = self.cohort.participants.filter(isMentor=False).first()
+        mentors = sorted(self.cohort.participants.filter(isMentor=True).values_list('participantId', flat=True))
+        MentorshipScore.objects.filter(mentee=mentee).delete()
+        MentorshipScore.objects.create(mentee=mentee, mentor_id=mentors[0], score=-5)
+        ranking.rank_mentees([mentee.pk])
+        ranked = MentorRanking.objects.filter(mentee=mentee).order_by('rank').values_list('mentor_id', 'score')
+        self.assertEqual(list(ranked), [(m, 0) for m in mentors[1:4]])
+        MentorRanking.objects.all().delete()
+        self.assertEqual([m.participantId for m in mentee.getTopThree()], mentors[1:4])
+
+    def test_falls_back_to_scores_without_ranking(self):
+        mentee = self.cohort.participants.filter(isMentor=False).first()
+        MentorRanking.objects.all().delete()
+        self.assertEqual([m.participantId for m in mentee.getTopThree()], [m for m, s in self.expected(mentee)])
+
+    def test_mentor_withdrawing_falls_back_to_scores(self):
+        mentee = self.cohort.participants.filter(isMentor=False).first()
+        first = MentorRanking.objects.get(mentee=mentee, rank=0)
+        Participant.objects.get(pk=first.mentor_id).delete()
+        self.assertEqual(MentorRanking.objects.filter(mentee=mentee).count(), ranking.RANKING_SIZE - 1)
+        self.assertEqual([m.participantId for m in mentee.getTopThree()], [m for m, s in self.expected(mentee)])
@@ -0,0 +1,105 @@
+from django.test import TestCase
+from match.benchmarks import synthetic
+from match.matching import stable
+from match.models import Mentorship, MentorshipScore, Preference
+import random
+
+class SolveTests(TestCase):
+
+    def test_mentees_get_their_best_stable_mentor(self):
+        weights = {
+            'a': [('x', 5), ('y', 4)],
+            'b': [('x', 4)],
+        }
+        # "a" and "b" both like "x" best, and "x" likes "a" more.
+        self.assertEqual(stable.solve(weights, {'x': 1, 'y': 1}), {'a': 'x'})
+        self.assertEqual(stable.solve(weights, {'x': 1, 'y': 1}, {'x': ['b']}), {'a': 'y', 'b': 'x'})
+
+    def test_explicit_choices_come_before_scores(self):
+        weights = {'a': [('x', 9), ('y', 1)]}
+        self.assertEqual(stable.solve(weights, {'x': 1, 'y': 1}, {'a': ['y']}), {'a': 'y'})
+
+    def test_choices_make_unscored_pairs_acceptable(self):
+        weights = {'a': [], 'b': [('x', 0)]}
+        self.assertEqual(stable.solve(weights, {'x': 1}), {})
+        self.assertEqual(stable.solve(weights, {'x': 1}, {'x': ['b']}), {'b': 'x'})
+
+    def test_capacity(self):
+        weights = {'a': [('x', 3)], 'b': [('x', 2)], 'c': [('x', 1), ('y', 1)]}
+        self.assertEqual(stable.solve(weights, {'x': 2, 'y': 1}), {'a': 'x', 'b': 'x', 'c': 'y'})
+        self.assertEqual(stable.solve(weights, {'x': 0, 'y': 1}), {'c': 'y'})
+
+    def test_random_instances_have_no_blocking_pair(self):
+        rng = random.Random(16)
+        for _ in range(100):
+            mentors = ['m%d' % j for j in range(rng.randint(1, 5))]
+            mentees = ['e%d' % i for i in range(rng.randint(1, 8))]
+            # Distinct scores keep the check free of ties.
+            values = rng.sample(range(1, 1000), len(mentors) * len(mentees))
+            weights = {mentee: [] for mentee in mentees}
+            for mentee in mentees:
+                for mentor in mentors:
+                    score = values.pop()
+                    if rng.random() < 0.7:
+                        weights[mentee].append((mentor, score))
+            capacities = {m: rng.randint(0, 3) for m in mentors}
+            self.assertNoBlockingPair(weights, capacities, stable.solve(weights, capacities))
+
+    def assertNoBlockingPair(self, weights, capacities, result):
+        scores = {mentee: dict(row) for mentee, row in weights.items()}
+        held = {}
+        for mentee, mentor in result.items():
+            self.assertGreater(scores[mentee][mentor], 0)
+            held.setdefault(mentor, []).append(mentee)
+        for mentor, mentees in held.items():
+            self.assertLessEqual(len(mentees), capacities[mentor])
+        for mentee, row in scores.items():
+            current = row.get(result.get(mentee), 0)
+            for mentor, score in row.items():
+                if score <= current or not capacities[mentor]:
+                    continue
+                holding = held.get(mentor, [])
+                self.assertEqual(len(holding), capacities[mentor], (mentee, mentor))
+                self.assertTrue(all(scores[other][mentor] > score for other in holding), (mentee, mentor))
+
+class StableAssignCohortTests(TestCase):
+
+    def setUp(self):
+        self.cohort = synthetic.build_cohort(8, 3, vocabulary=6, tagsPerParticipant=3, seed=5)
+        self.cohort.participants.filter(isMentor=True).update(capacity=2)
+        self.cohort.match()
+
+    def test_creates_mentorships(self):
+        result = self.cohort.assign(stable=True)
+        self.assertTrue(result)
+        self.assertEqual(Mentorship.objects.count(), len(result))
+        matched = set(self.cohort.participants.filter(isMatched=True).values_list('participantId', flat=True))
+        self.assertEqual(matched, set(result) | set(result.values()))
+
+    def test_mentor_preferences_are_honoured(self):
+        mentor = self.cohort.participants.filter(isMentor=True).first()
+        mentee = self.cohort.participants.filter(isMentor=False).exclude(
+            participantId__in=MentorshipScore.objects.filter(mentor=mentor, score__gt=0).values('mentee')
+        ).first() or self.cohort.participants.filter(isMentor=False).first()
+        mentor.setPreferences([mentee.participantId])
+        mentee.setTopThree([mentor.participantId])
+        self.assertEqual(self.cohort.assign(stable=True)[mentee.participantId], mentor.participantId)
+
+    def test_top_three_is_kept_as_preferences(self):
+        mentee = self.cohort.participants.filter(isMentor=False).first()
+        choices = [m.participantId for m in reversed(mentee.getTopThree())]
+        mentee.setTopThree(choices)
+        self.assertEqual(list(mentee.preferences.values_list('choice_id', flat=True)), choices)
+        self.assertEqual(stable.load_preferences(self.cohort), {mentee.participantId: choices})
+
+    def test_set_preferences_checks_choices(self):
+        mentor = self.cohort.participants.filter(isMentor=True).first()
+        mentees = list(self.cohort.participants.filter(isMentor=False)[:2])
+        mentor.setPreferences([m.participantId for m in mentees])
+        mentor.setPreferences([mentees[1].participantId])
+        self.assertEqual(list(Preference.objects.filter(participant=mentor).values_list('choice_id', 'rank')),
+            [(mentees[1].participantId, 0)])
+        other = self.cohort.participants.filter(isMentor=True).last()
+        for choices in ([other.participantId], [mentees[0].participantId] * 2):
+            with self.assertRaises(ValueError):
+                mentor.setPreferences(choices)
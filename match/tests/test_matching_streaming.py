@@ -0,0 +1,56 @@
+from django.test import TestCase, override_settings
+from match.benchmarks import synthetic
+from match.matching import engine
+from match.models import MentorRanking, MentorshipScore, Tag
+import random
+import tracemalloc
+
+# Small enough that mentees are scored a few dozen at a time.
+LIMIT = 256 * 1024
+
+class StreamingMatchTests(TestCase):
+
+    def peak(self, mentees):
+        cohort = synthetic.build_cohort(mentees, 10, vocabulary=20, tagsPerParticipant=4, seed=mentees)
+        tracemalloc.start()
+        try:
+            engine.score_cohort(cohort, limit=LIMIT)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        self.assertEqual(MentorshipScore.objects.filter(mentee__cohort=cohort).count(), synthetic.shared_pairs(cohort))
+        return peak
+
+    def test_memory_stays_flat_as_cohort_grows(self):
+        # Below a few pages the peak is still climbing, so start well past it.
+        small = self.peak(1000)
+        large = self.peak(3000)
+        self.assertLess(large, small * 1.2)
+        self.assertLess(large, LIMIT * 4)
+
+    def test_pages_give_same_scores(self):
+        cohort = synthetic.build_cohort(90, 7, vocabulary=10, tagsPerParticipant=3, seed=4)
+        engine.score_cohort(cohort, limit=LIMIT)
+        self.assertEqual(synthetic.score_snapshot(cohort), synthetic.set_overlaps(cohort))
+
+        rng = random.Random(4)
+        participants = list(cohort.participants.order_by('user_id'))
+        tags = list(Tag.objects.filter(name__startswith="synthetic-tag-"))
+        for p in rng.sample(participants, 10):
+            p.tags.set(rng.sample(tags, 3))
+        engine.score_cohort(cohort, limit=LIMIT)
+        self.assertEqual(synthetic.score_snapshot(cohort), synthetic.set_overlaps(cohort))
+        # Rankings count mentors without a stored score as scoring 0.
+        snapshot = synthetic.score_snapshot(cohort)
+        for mentee in cohort.participants.filter(isMentor=False)[:20]:
+            ranked = list(MentorRanking.objects.filter(mentee=mentee).order_by('rank').values_list('mentor_id', 'score'))
+            expected = sorted(((mentor, score) for (menteeId, mentor), score in snapshot.items()
+                if menteeId == mentee.participantId), key=lambda pair: (-pair[1], pair[0]))[:3]
+            self.assertEqual(ranked, expected)
+
+    @override_settings(MATCH_MEMORY_LIMIT=LIMIT)
+    def test_limit_comes_from_settings(self):
+        self.assertEqual(engine._sizes(LIMIT, engine.BATCH_SIZE), (32, 128))
+        cohort = synthetic.build_cohort(40, 5, vocabulary=10, tagsPerParticipant=3)
+        cohort.match()
+        self.assertEqual(synthetic.score_snapshot(cohort), synthetic.set_overlaps(cohort))
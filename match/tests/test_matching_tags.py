@@ -0,0 +1,58 @@
+from django.test import TestCase
+from match.benchmarks import synthetic
+from match.matching.tags import CohortTagIndex, TagBitsets, TagVocabulary, popcount
+import random
+
+class TagVocabularyTests(TestCase):
+
+    def test_ids_are_dense_and_stable(self):
+        vocabulary = TagVocabulary(["Django", "Sports", "Django"])
+        self.assertEqual(len(vocabulary), 2)
+        self.assertEqual(vocabulary.add("Node.JS"), 2)
+        self.assertEqual(vocabulary.add("Django"), 0)
+
+    def test_encode_and_decode(self):
+        vocabulary = TagVocabulary(["Django", "Sports", "Node.JS"])
+        bits = vocabulary.encode(["Node.JS", "Django", "Unknown"])
+        self.assertEqual(popcount(bits), 2)
+        self.assertEqual(vocabulary.decode(bits), ["Django", "Node.JS"])
+
+class TagBitsetsTests(TestCase):
+
+    def test_overlap_matches_set_intersection(self):
+        rng = random.Random(3)
+        names = ["tag-%d" % i for i in range(70)]
+        tags = {i: rng.sample(names, rng.randint(0, 12)) for i in range(30)}
+        vocabulary = TagVocabulary(names)
+        left = TagBitsets(vocabulary, range(0, 18), tags)
+        right = TagBitsets(vocabulary, range(18, 30), tags)
+
+        overlap = left.overlap(right)
+        for i, a in enumerate(left.ids):
+            for j, b in enumerate(right.ids):
+                self.assertEqual(overlap[i, j], len(set(tags[a]) & set(tags[b])))
+        self.assertEqual(left.counts().tolist(), [len(tags[i]) for i in left.ids])
+
+    def test_overlap_of_row_slice(self):
+        vocabulary = TagVocabulary(["a", "b"])
+        tags = {1: ["a"], 2: ["a", "b"], 3: ["b"]}
+        bitsets = TagBitsets(vocabulary, [1, 2, 3], tags)
+        self.assertEqual(bitsets.overlap(bitsets, slice(1, 2)).tolist(), [[1, 2, 1]])
+
+    def test_empty_vocabulary(self):
+        bitsets = TagBitsets(TagVocabulary(), [1, 2], {})
+        self.assertEqual(bitsets.overlap(bitsets).tolist(), [[0, 0], [0, 0]])
+
+class CohortTagIndexTests(TestCase):
+
+    def test_load_matches_set_based_overlaps(self):
+        cohort = synthetic.build_cohort(9, 6, vocabulary=20, tagsPerParticipant=4, seed=1)
+        index = CohortTagIndex.load(cohort)
+        self.assertEqual(len(index.mentees), 9)
+        self.assertEqual(len(index.mentors), 6)
+
+        overlap = index.mentees.overlap(index.mentors)
+        expected = synthetic.set_overlaps(cohort)
+        for i, mentee in enumerate(index.mentees.ids):
+            for j, mentor in enumerate(index.mentors.ids):
+                self.assertEqual(overlap[i, j], expected[(mentee, mentor)])
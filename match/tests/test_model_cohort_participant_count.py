@@ -0,0 +1,45 @@
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from match.models import Cohort, Programme
+import io
+
+class CohortParticipantCountTests(TestCase):
+
+    def setUp(self):
+        self.owner = User.objects.create_user("owner@example.com", "owner@example.com", "hunter23")
+        self.users = [User.objects.create_user("user%d@example.com" % n, "", "hunter23") for n in range(3)]
+        programme = Programme.objects.create(name="Programme", description="", createdBy=self.owner)
+        self.cohort = programme.cohorts.create(cohortSize=10, createdBy=self.owner)
+
+    def count(self):
+        return Cohort.objects.get(pk=self.cohort.pk).participantCount
+
+    def test_follows_registration_and_withdrawal(self):
+        participants = [self.cohort.participants.create(user=u, isMentor=False) for u in self.users]
+        self.assertEqual(self.count(), 3)
+        participants[0].delete()
+        self.assertEqual(self.count(), 2)
+        participants[1].save()
+        self.assertEqual(self.count(), 2)
+
+    def test_saving_stale_cohort_keeps_count(self):
+        stale = Cohort.objects.get(pk=self.cohort.pk)
+        for u in self.users:
+            self.cohort.participants.create(user=u, isMentor=False)
+        stale.cohortSize = 10
+        stale.save()
+        self.assertEqual(self.count(), 3)
+        self.assertEqual(Cohort.objects.get(pk=self.cohort.pk).cohortSize, 10)
+
+    def test_recount_fixes_drift(self):
+        for u in self.users:
+            self.cohort.participants.create(user=u, isMentor=True)
+        Cohort.objects.filter(pk=self.cohort.pk).update(participantCount=7)
+        out = io.StringIO()
+        call_command('recount_participants', stdout=out)
+        self.assertEqual(self.count(), 3)
+        self.assertIn("had 7, has 3", out.getvalue())
+        out = io.StringIO()
+        call_command('recount_participants', str(self.cohort.pk), stdout=out)
+        self.assertIn("Fixed 0 cohort(s)", out.getvalue())
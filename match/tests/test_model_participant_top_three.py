@@ -0,0 +1,75 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from match.benchmarks import synthetic
+from match.models import MentorRanking, MentorshipScore, Participant
+
+class ParticipantSetTopThreeTests(TestCase):
+
+    def setUp(self):
+        self.cohort = synthetic.build_cohort(2, 5, vocabulary=6, tagsPerParticipant=3, seed=5)
+        self.cohort.match()
+        self.mentee = self.cohort.participants.filter(isMentor=False).first()
+        self.choices = [m.participantId for m in reversed(self.mentee.getTopThree())]
+
+    def scores(self):
+        return {m: s for m, s in MentorshipScore.objects.filter(mentee=self.mentee).values_list('mentor_id', 'score')}
+
+    def test_adds_preference_points(self):
+        before = self.scores()
+        self.assertTrue(self.mentee.setTopThree([str(c) for c in self.choices]))
+        after = self.scores()
+        self.assertEqual(after[self.choices[0]], before[self.choices[0]] + 10)
+        self.assertEqual(after[self.choices[1]], before[self.choices[1]] + 5)
+        self.assertEqual(after[self.choices[2]], before[self.choices[2]])
+        self.assertTrue(Participant.objects.get(pk=self.mentee.pk).isTopThreeSelected)
+
+    def test_ranking_follows_preferences(self):
+        self.mentee.setTopThree(self.choices)
+        ranked = MentorRanking.objects.filter(mentee=self.mentee).order_by('rank')
+        self.assertEqual(ranked[0].mentor_id, self.choices[0])
+        scores = self.scores()
+        self.assertEqual([r.score for r in ranked], [scores[r.mentor_id] for r in ranked])
+
+    def test_repeated_submission_is_a_no_op(self):
+        # A second request that loaded the participant before the first one
+        # saved still sees isTopThreeSelected as False.
+        stale = Participant.objects.get(pk=self.mentee.pk)
+        self.assertTrue(self.mentee.setTopThree(self.choices))
+        after = self.scores()
+        self.assertFalse(stale.setTopThree(self.choices))
+        self.assertEqual(self.scores(), after)
+
+    def test_bounded_queries(self):
+        # Loaded as the view loads it.
+        mentee = Participant.objects.select_related('cohort__programme__scoringProfile').get(pk=self.mentee.pk)
+        with CaptureQueriesContext(connection) as queries:
+            mentee.setTopThree(self.choices)
+        updates = [q for q in queries.captured_queries if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 2)
+        # However many choices: the guarded update, the mentee's scores,
+        # their Preferences, one update adding the bonuses, two for the
+        # ranking, and the savepoint around them.
+        self.assertLessEqual(len(queries), 8)
+
+    def test_choosing_mentor_without_score_stores_one(self):
+        mentors = self.cohort.participants.filter(isMentor=True)
+        MentorshipScore.objects.filter(mentee=self.mentee).delete()
+        choices = list(mentors.order_by('-participantId').values_list('participantId', flat=True)[:2])
+        self.assertTrue(self.mentee.setTopThree(choices))
+        self.assertEqual(self.scores(), {choices[0]: 10, choices[1]: 5})
+        ranked = MentorRanking.objects.filter(mentee=self.mentee).order_by('rank').values_list('mentor_id', 'score')
+        self.assertEqual(list(ranked)[:2], [(choices[0], 10), (choices[1], 5)])
+
+    def test_bonuses_survive_rescoring(self):
+        self.mentee.setTopThree(self.choices)
+        before = self.scores()
+        mentor = Participant.objects.get(pk=self.choices[0])
+        mentor.tags.set(list(mentor.tags.all())[:1])
+        self.cohort.match()
+        after = self.scores()
+        self.assertEqual(after[self.choices[0]], synthetic.set_overlaps(self.cohort)[(self.mentee.pk, self.choices[0])] + 10)
+        self.assertEqual(after[self.choices[1]], before[self.choices[1]])
+        self.cohort.match(full=True)
+        self.assertEqual(self.scores(), after)
+        self.assertEqual(MentorRanking.objects.get(mentee=self.mentee, rank=0).mentor_id, self.choices[0])
@@ -2,7 +2,7 @@ from django.contrib.auth.models import User
 from django.db.utils import IntegrityError
 from django.test import TestCase
 from django.utils import timezone
-from match.models import Programme
+from match.models import Programme,active_cohorts
 from datetime import timedelta
 
 class ProgrammeModelTests(TestCase):
@@ -178,6 +178,53 @@ class ProgrammeModelTests(TestCase):
         )
         self.assertEqual(p.activeCohort, c2)
 
+    def test_active_cohort_is_one_query(self):
+        p = self._create_test_programme()
+        for days in (3, 2, 1):
+            p.cohorts.create(
+                openDate=timezone.now() - timedelta(days=days),
+                closeDate=timezone.now() + timedelta(days=7),
+                cohortSize=1,
+                createdBy=self._user
+            )
+        with self.assertNumQueries(1):
+            p.activeCohort
+
+    def test_active_cohorts_resolves_each_programme(self):
+        p1 = self._create_test_programme()
+        p2 = self._create_test_programme()
+        p3 = self._create_test_programme()
+        full = p1.cohorts.create(
+            openDate=timezone.now() - timedelta(days=7),
+            closeDate=timezone.now() + timedelta(days=7),
+            cohortSize=1,
+            createdBy=self._user
+        )
+        full.participants.create(user=self._user, isMentor=True)
+        later = p1.cohorts.create(
+            openDate=timezone.now() - timedelta(days=2),
+            closeDate=timezone.now() + timedelta(days=7),
+            cohortSize=1,
+            createdBy=self._user
+        )
+        only = p2.cohorts.create(
+            openDate=timezone.now() - timedelta(days=2),
+            closeDate=timezone.now() + timedelta(days=7),
+            cohortSize=1,
+            createdBy=self._user
+        )
+        only.participants.create(user=self._user, isMentor=True)
+        p3.cohorts.create(
+            openDate=timezone.now() + timedelta(days=2),
+            closeDate=timezone.now() + timedelta(days=7),
+            createdBy=self._user
+        )
+        with self.assertNumQueries(1):
+            active = active_cohorts(Programme.objects.all())
+        self.assertEqual(active, {p1.programmeId: later, p2.programmeId: only})
+        for p in (p1, p2, p3):
+            self.assertEqual(active.get(p.programmeId), p.activeCohort)
+
     def test_active_cohort_is_second_when_first_is_not_open_and_second_is_full(self):
         p = self._create_test_programme()
         c1 = p.cohorts.create(
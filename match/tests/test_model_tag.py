@@ -1,3 +1,4 @@
+from django.db import IntegrityError
 from django.test import TestCase
 from match.models import Tag
 from slugify import slugify
@@ -14,3 +15,10 @@ class TagModelTests(TestCase):
     def test_tag_slug_created(self):
         tag = Tag.objects.create(name="This is some. weird ass tag")
         self.assertEqual(tag.slug, slugify("This is some. weird ass tag"))
+
+    def test_tag_has_integer_key(self):
+        self.assertIsInstance(Tag.objects.get(name="My Tag").pk, int)
+
+    def test_tag_slugs_are_unique(self):
+        with self.assertRaises(IntegrityError):
+            Tag.objects.create(name="my tag")
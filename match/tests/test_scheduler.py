@@ -0,0 +1,64 @@
+from datetime import timedelta
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from match import scheduler
+from match.benchmarks import synthetic
+from match.models import Cohort, MentorshipScore
+from unittest import mock
+import io
+import random
+import uuid
+
+class SchedulerTests(TestCase):
+
+    def setUp(self):
+        self.closed = synthetic.build_cohort(4, 3, vocabulary=5, tagsPerParticipant=2, seed=1)
+        self.open = synthetic.build_cohort(4, 3, vocabulary=5, tagsPerParticipant=2, seed=2)
+        Cohort.objects.filter(pk=self.open.pk).update(closeDate=timezone.now() + timedelta(days=1))
+
+    def test_matches_closed_cohorts_once(self):
+        results = scheduler.run_due()
+        self.assertEqual([(cohortId, error) for cohortId, written, error in results], [(self.closed.pk, None)])
+        self.assertEqual(
+            MentorshipScore.objects.filter(mentee__cohort=self.closed).count(),
+            synthetic.shared_pairs(self.closed)
+        )
+        self.assertFalse(MentorshipScore.objects.filter(mentee__cohort=self.open).exists())
+        self.assertIsNotNone(Cohort.objects.get(pk=self.closed.pk).matchedAt)
+        self.assertEqual(scheduler.run_due(), [])
+
+    def test_cohorts_past_match_date_are_not_due(self):
+        Cohort.objects.filter(pk=self.closed.pk).update(matchDate=timezone.now() - timedelta(minutes=1))
+        self.assertEqual(list(scheduler.due_cohorts()), [])
+        self.assertEqual(scheduler.run_due(), [])
+
+    def test_cohort_matched_meanwhile_is_skipped(self):
+        # Another node matched it between listing and locking.
+        cohort = scheduler.due_cohorts().get()
+        Cohort.objects.filter(pk=cohort.pk).update(matchedAt=timezone.now())
+        with mock.patch('match.models.Cohort.match') as match:
+            self.assertIsNone(scheduler.match_cohort(cohort))
+        self.assertFalse(match.called)
+
+    def test_failed_cohort_stays_due(self):
+        with mock.patch('match.models.Cohort.match', side_effect=RuntimeError("boom")):
+            [(cohortId, written, error)] = scheduler.run_due()
+        self.assertIn("boom", error)
+        self.assertEqual(list(scheduler.due_cohorts()), [self.closed])
+
+    def test_jitter_spreads_runs(self):
+        Cohort.objects.filter(pk=self.open.pk).update(closeDate=timezone.now())
+        sleep = mock.Mock()
+        scheduler.run_due(jitter=5, sleep=sleep, rng=random.Random(0))
+        self.assertEqual(sleep.call_count, 2)
+        self.assertTrue(all(0 <= args[0] <= 5 for args, kwargs in sleep.call_args_list))
+
+    def test_lock_key_is_signed_64_bit(self):
+        self.assertEqual(scheduler.lock_key(uuid.UUID(int=(1 << 128) - 1)), -1)
+        self.assertEqual(scheduler.lock_key(uuid.UUID(int=5 << 64)), 5)
+
+    def test_command_runs_once(self):
+        out = io.StringIO()
+        call_command('match_scheduler', once=True, jitter=0, stdout=out)
+        self.assertIn("%s matched" % self.closed.pk, out.getvalue())
@@ -41,3 +41,11 @@ class UserSerializerTests(TestCase):
         self.assertTrue(cohort.openDate, timezone.now())
         self.assertTrue(cohort.closeDate, timezone.now() + timedelta(days=14))
         self.assertTrue(cohort.matchDate, timezone.now() + timedelta(days=21))
+
+    def test_participant_count_is_read_only(self):
+        cohort = Cohort.objects.create(programme=self.programme, cohortSize=2, createdBy=self.user)
+        cohort.participants.create(user=self.user, isMentor=False)
+        serializer = CohortSerializer(cohort, data={'participantCount': 0}, partial=True)
+        self.assertTrue(serializer.is_valid())
+        serializer.save()
+        self.assertEqual(Cohort.objects.get(pk=cohort.pk).participantCount, 1)
@@ -1,4 +1,3 @@
-from django.db.utils import IntegrityError
 from django.test import TestCase
 from django.utils import timezone
 from match.models import Cohort,Participant,Programme,Tag
@@ -145,7 +144,7 @@ class ParticipantSerializerTests(TestCase):
         data = { 'isMentor': False }
         serializer = ParticipantSerializer(data=data)
         serializer.is_valid()
-        with self.assertRaises(IntegrityError):
+        with self.assertRaises(ValidationError):
             participant = serializer.save(user=self.user, cohort=self.cohort)
 
     def test_serializer_cant_apply_for_full_cohort(self):
@@ -0,0 +1,297 @@
+"""
+Per-request timing.
+
+TimingMiddleware measures every request: how many SQL queries it ran and how
+long they took, how long serializers took to build their data and how long
+the response took to render. The numbers go into rolling histograms kept per
+URL name in each process, which staff can read from /stats/requests, and,
+for staff or everyone if settings.SERVER_TIMING_HEADER is set, back to the
+client in a Server-Timing header, which browser developer tools show next
+to the request. Anyone else would learn from it how much work each request
+takes on the server.
+
+Queries are timed by wrapping the cursors the request's connections hand
+out, serializers by wrapping BaseSerializer.data, and rendering around
+JSONResponse and DRF responses, so all it costs is a couple of clock reads
+per query. Serializer time includes any queries the serializer runs.
+
+Timing is on unless settings.REQUEST_TIMING says otherwise, and can be
+switched on and off while running with set_enabled(), which
+PATCH /stats/requests calls. Like the histograms, the switch only applies
+to the process that handles the request.
+"""
+from contextlib import contextmanager
+from django.conf import settings
+from django.db import connections
+from django.db.backends.utils import CursorWrapper
+from rest_framework.serializers import BaseSerializer
+import threading
+import time
+
+# Upper bounds of the histogram buckets, in milliseconds.
+BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, float('inf'))
+
+# Seconds of requests each histogram window covers. Stats are given over
+# the current window and the one before it.
+WINDOW = 300
+
+# Parts of a request timed besides the queries, in Server-Timing order.
+PHASES = ('serialize', 'render')
+
+_local = threading.local()
+_enabled = None
+
+def is_enabled():
+    if _enabled is None:
+        return getattr(settings, 'REQUEST_TIMING', True)
+    return _enabled
+
+# Switches timing on or off in this process; None goes back to the setting.
+def set_enabled(enabled):
+    global _enabled
+    _enabled = enabled
+
+# Returns the timer of the request being handled on this thread, if any.
+def current():
+    return getattr(_local, 'timer', None)
+
+class RequestTimer(object):
+    # Query count and seconds spent in each part of one request.
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = {'db': 0.0}
+        self.total = 0.0
+        self._depth = {}
+
+    def add_query(self, seconds):
+        self.queries += 1
+        self.seconds['db'] += seconds
+
+    def add(self, phase, seconds):
+        self.seconds[phase] = self.seconds.get(phase, 0.0) + seconds
+
+    # Times the block as part of phase, counting it only once if the same
+    # phase is already being timed further out.
+    @contextmanager
+    def measure(self, phase):
+        depth = self._depth.get(phase, 0)
+        self._depth[phase] = depth + 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._depth[phase] = depth
+            if not depth:
+                self.add(phase, time.perf_counter() - start)
+
+    def header(self):
+        parts = ['db;dur=%.1f;desc="%d queries"' % (self.seconds['db'] * 1000, self.queries)]
+        for phase in PHASES:
+            if phase in self.seconds:
+                parts.append('%s;dur=%.1f' % (phase, self.seconds[phase] * 1000))
+        parts.append('total;dur=%.1f' % (self.total * 1000))
+        return ", ".join(parts)
+
+# Times the block as part of phase of the current request, if it is timed.
+@contextmanager
+def measure(phase):
+    timer = current()
+    if timer is None:
+        yield
+    else:
+        with timer.measure(phase):
+            yield
+
+class _TimedCursor(CursorWrapper):
+    # Adds every query it runs to a RequestTimer.
+
+    def __init__(self, cursor, db, timer):
+        super(_TimedCursor, self).__init__(cursor, db)
+        self.timer = timer
+
+    def execute(self, sql, params=None):
+        start = time.perf_counter()
+        try:
+            return super(_TimedCursor, self).execute(sql, params)
+        finally:
+            self.timer.add_query(time.perf_counter() - start)
+
+    def executemany(self, sql, param_list):
+        start = time.perf_counter()
+        try:
+            return super(_TimedCursor, self).executemany(sql, param_list)
+        finally:
+            self.timer.add_query(time.perf_counter() - start)
+
+# Makes the thread's connections hand out timed cursors until the returned
+# function is called.
+def _time_queries(timer):
+    wrapped = []
+    for connection in connections.all():
+        for name in ('make_cursor', 'make_debug_cursor'):
+            make = getattr(connection, name)
+            setattr(connection, name, lambda cursor, make=make, connection=connection: _TimedCursor(make(cursor), connection, timer))
+        wrapped.append(connection)
+
+    def restore():
+        for connection in wrapped:
+            del connection.make_cursor
+            del connection.make_debug_cursor
+    return restore
+
+# Wraps BaseSerializer.data so building it is timed, once per process.
+def _time_serializers():
+    data = BaseSerializer.data
+    if getattr(data.fget, 'timed', False):
+        return
+
+    def timed(self):
+        with measure('serialize'):
+            return data.fget(self)
+    timed.timed = True
+    BaseSerializer.data = property(timed)
+
+class Histogram(object):
+    # Counts of request durations by bucket, with running sums of the rest.
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.milliseconds = 0.0
+        self.queries = 0
+        self.dbMilliseconds = 0.0
+
+    def add(self, timer):
+        milliseconds = timer.total * 1000
+        for n, bound in enumerate(BUCKETS):
+            if milliseconds <= bound:
+                self.counts[n] += 1
+                break
+        self.count += 1
+        self.milliseconds += milliseconds
+        self.queries += timer.queries
+        self.dbMilliseconds += timer.seconds['db'] * 1000
+
+    def merge(self, other):
+        merged = Histogram()
+        for h in (self, other):
+            merged.counts = [a + b for a, b in zip(merged.counts, h.counts)]
+            merged.count += h.count
+            merged.milliseconds += h.milliseconds
+            merged.queries += h.queries
+            merged.dbMilliseconds += h.dbMilliseconds
+        return merged
+
+    # Upper bound of the bucket holding the given fraction of requests.
+    def percentile(self, fraction):
+        wanted = fraction * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            seen += count
+            if seen >= wanted:
+                return bound if bound != float('inf') else None
+        return None
+
+    def summary(self):
+        count = max(self.count, 1)
+        return {
+            'count': self.count,
+            'meanMs': round(self.milliseconds / count, 1),
+            'p50Ms': self.percentile(0.5),
+            'p95Ms': self.percentile(0.95),
+            'p99Ms': self.percentile(0.99),
+            'meanQueries': round(self.queries / float(count), 1),
+            'meanDbMs': round(self.dbMilliseconds / count, 1),
+            'buckets': [[bound if bound != float('inf') else None, n] for bound, n in zip(BUCKETS, self.counts)],
+        }
+
+class RequestStats(object):
+    # Histograms per URL name over the current window and the last one.
+
+    def __init__(self, window=WINDOW, clock=time.monotonic):
+        self.window = window
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.started = self.clock()
+            self.current = {}
+            self.previous = {}
+
+    def _rotate(self):
+        now = self.clock()
+        if now - self.started < self.window:
+            return
+        self.previous = self.current if now - self.started < 2 * self.window else {}
+        self.current = {}
+        self.started = now - (now - self.started) % self.window
+
+    def record(self, name, timer):
+        with self.lock:
+            self._rotate()
+            histogram = self.current.get(name)
+            if histogram is None:
+                histogram = self.current[name] = Histogram()
+            histogram.add(timer)
+
+    def summary(self):
+        with self.lock:
+            self._rotate()
+            names = set(self.current) | set(self.previous)
+            return {
+                name: self.current.get(name, Histogram()).merge(self.previous.get(name, Histogram())).summary()
+                for name in names
+            }
+
+stats = RequestStats()
+
+# URL name a request is counted under.
+def url_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return '<unresolved>'
+    return match.view_name or match.url_name or '<unnamed>'
+
+# Whether the response to the request gets a Server-Timing header. DRF
+# sets request.user when it authenticates the request, so by the time the
+# response comes back it is the token's user.
+def _sends_header(request):
+    if getattr(settings, 'SERVER_TIMING_HEADER', False):
+        return True
+    user = getattr(request, 'user', None)
+    return bool(user is not None and user.is_staff)
+
+class TimingMiddleware(object):
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        _time_serializers()
+
+    def __call__(self, request):
+        if not is_enabled():
+            return self.get_response(request)
+        timer = RequestTimer()
+        _local.timer = timer
+        restore = _time_queries(timer)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            restore()
+            _local.timer = None
+        timer.total = time.perf_counter() - start
+        if _sends_header(request):
+            response['Server-Timing'] = timer.header()
+        stats.record(url_name(request), timer)
+        return response
+
+    # DRF responses render after the view returns; time that too.
+    def process_template_response(self, request, response):
+        timer = current()
+        if timer is not None:
+            start = time.perf_counter()
+            response.add_post_render_callback(lambda r: timer.add('render', time.perf_counter() - start))
+        return response
@@ -5,6 +5,7 @@ urlpatterns = [
     url(r'^cohort/', include(views.cohort.urlpatterns)),
     url(r'^participant/', include(views.participant.urlpatterns)),
     url(r'^programme/', include(views.programme.urlpatterns)),
+    url(r'^stats/', include(views.stats.urlpatterns)),
     url(r'^tags/?$', views.tag.tag_list, name="tag_list"),
     url(r'^user/', include(views.user.urlpatterns))
 ]
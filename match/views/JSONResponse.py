@@ -1,9 +1,11 @@
 from django.http import HttpResponse
+from match import timing
 from rest_framework.renderers import JSONRenderer
 
 class JSONResponse(HttpResponse):
 
     def __init__(self, data, **kwargs):
-        content = JSONRenderer().render(data)
+        with timing.measure('render'):
+            content = JSONRenderer().render(data)
         kwargs['content_type'] = 'application/json'
         super(JSONResponse, self).__init__(content, **kwargs)
@@ -1 +1 @@
-from . import cohort,participant,programme,tag,user
+from . import cohort,participant,programme,stats,tag,user
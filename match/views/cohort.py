@@ -1,11 +1,14 @@
 from .JSONResponse import JSONResponse
-from match.models import Cohort,Participant
-from match.serializers import CohortSerializer,ParticipantSerializer,UserSerializer
+from match import export, jobs
+from match.matching import preview
+from match.models import Cohort,MatchJob,Participant
+from match.serializers import CohortSerializer,MatchJobSerializer,ParticipantSerializer,UserSerializer
 
 from django.conf.urls import include,url
-from django.db.utils import IntegrityError
-from django.http import Http404
+from django.http import Http404, StreamingHttpResponse
+from django.urls import reverse
 import json
+import uuid
 from oauth2_provider.ext.rest_framework import TokenHasReadWriteScope, TokenHasScope
 from rest_framework import decorators,permissions,routers,status,viewsets
 from rest_framework.routers import DefaultRouter
@@ -14,16 +17,23 @@ from rest_framework.serializers import ValidationError
 class CohortViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated, TokenHasScope]
     required_scopes = ['read']
-    queryset = Cohort.objects.select_related('createdBy').all()
+    # Everything CohortSerializer reads, so a list is a fixed number of
+    # queries however many cohorts it holds.
+    queryset = Cohort.objects.select_related(
+        'createdBy__profile', 'programme__createdBy__profile'
+    ).prefetch_related('createdBy__profile__tags', 'programme__createdBy__profile__tags')
 
     serializer_class = CohortSerializer
 
     lookup_field = 'cohortId'
 
     def get_permissions(self):
-        if self.action in ['create', 'partial_update', 'destroy']:
+        if self.action in ['create', 'partial_update', 'destroy', 'match']:
             self.permission_classes = [TokenHasScope, permissions.IsAdminUser]
             self.required_scopes = ['write', 'staff']
+        if self.action in ['match_status', 'match_preview', 'export']:
+            self.permission_classes = [TokenHasScope, permissions.IsAdminUser]
+            self.required_scopes = ['read', 'staff']
         return super(self.__class__, self).get_permissions()
 
     def partial_update(self, request, **kwargs):
@@ -50,8 +60,6 @@ class CohortViewSet(viewsets.ModelViewSet):
             return JSONResponse({'detail': s.errors}, status=status.HTTP_400_BAD_REQUEST)
         try:
             s.save(user=request.user, cohort=c)
-        except IntegrityError as e:
-            return JSONResponse({'detail': 'You have already applied for this cohort.', 'errors': e.args[0]}, status=status.HTTP_403_FORBIDDEN)
         except ValidationError as e:
             return JSONResponse({'detail': e.args[0]}, status=status.HTTP_403_FORBIDDEN)
         return JSONResponse(s.data, status=status.HTTP_200_OK)
@@ -66,6 +74,63 @@ class CohortViewSet(viewsets.ModelViewSet):
         s = ParticipantSerializer(participant)
         return JSONResponse(s.data)
 
+    @decorators.detail_route(methods=['post'], required_scopes=['write', 'staff'])
+    def match(self, request, **kwargs):
+        # Matching runs in a match_worker process, so only queue it here.
+        try:
+            c = Cohort.objects.get(cohortId=self.kwargs['cohortId'])
+        except Cohort.DoesNotExist:
+            return JSONResponse({'detail': 'Cohort not found'}, status=status.HTTP_404_NOT_FOUND)
+        job, created = jobs.enqueue(c, request.user)
+        data = MatchJobSerializer(job).data
+        data['statusUrl'] = request.build_absolute_uri(
+            reverse('cohort-match-status', kwargs={'cohortId': c.cohortId, 'jobId': job.jobId})
+        )
+        return JSONResponse(data, status=status.HTTP_202_ACCEPTED if created else status.HTTP_200_OK)
+
+    @decorators.detail_route(methods=['get'], required_scopes=['read', 'staff'])
+    def match_status(self, request, **kwargs):
+        try:
+            job = MatchJob.objects.get(cohort=self.kwargs['cohortId'], jobId=self.kwargs['jobId'])
+        except MatchJob.DoesNotExist:
+            return JSONResponse({'detail': 'Match job not found'}, status=status.HTTP_404_NOT_FOUND)
+        return JSONResponse(MatchJobSerializer(job).data)
+
+    @decorators.detail_route(methods=['post'], required_scopes=['read', 'staff'])
+    def match_preview(self, request, **kwargs):
+        # Scores in memory only; nothing is saved.
+        try:
+            c = Cohort.objects.get(cohortId=self.kwargs['cohortId'])
+        except Cohort.DoesNotExist:
+            return JSONResponse({'detail': 'Cohort not found'}, status=status.HTTP_404_NOT_FOUND)
+        tags = request.data.get('tags') or {}
+        cohortSize = request.data.get('cohortSize')
+        try:
+            if not isinstance(tags, dict) or not all(isinstance(names, list) for names in tags.values()):
+                raise ValueError("tags must map participant ids to lists of tag names")
+            tags = {uuid.UUID(str(participantId)): names for participantId, names in tags.items()}
+            if cohortSize is not None:
+                cohortSize = int(cohortSize)
+            result = preview.preview_cohort(c, tags=tags, cohortSize=cohortSize)
+        except (TypeError, ValueError) as e:
+            return JSONResponse({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return JSONResponse(result)
+
+    @decorators.detail_route(methods=['get'], required_scopes=['read', 'staff'])
+    def export(self, request, **kwargs):
+        # Streamed, so a large cohort never sits in memory at once.
+        try:
+            c = Cohort.objects.get(cohortId=self.kwargs['cohortId'])
+        except Cohort.DoesNotExist:
+            return JSONResponse({'detail': 'Cohort not found'}, status=status.HTTP_404_NOT_FOUND)
+        kind, fileFormat = self.kwargs['kind'], self.kwargs['fileFormat']
+        response = StreamingHttpResponse(
+            export.export_lines(c, kind, fileFormat),
+            content_type=export.CONTENT_TYPES[fileFormat]
+        )
+        response['Content-Disposition'] = 'attachment; filename="%s-%s.%s"' % (c.cohortId, kind, fileFormat)
+        return response
+
 cohort_list = CohortViewSet.as_view({
     'get': 'list'
 })
@@ -81,8 +146,28 @@ cohort_register = CohortViewSet.as_view({
     'post': 'register'
 })
 
+cohort_match = CohortViewSet.as_view({
+    'post': 'match'
+})
+
+cohort_match_preview = CohortViewSet.as_view({
+    'post': 'match_preview'
+})
+
+cohort_export = CohortViewSet.as_view({
+    'get': 'export'
+})
+
+cohort_match_status = CohortViewSet.as_view({
+    'get': 'match_status'
+})
+
 urlpatterns = [
     url(r'^$', cohort_list, name='cohort-list'),
+    url(r'^(?P<cohortId>[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})/match$', cohort_match, name='cohort-match'),
+    url(r'^(?P<cohortId>[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})/match/preview$', cohort_match_preview, name='cohort-match-preview'),
+    url(r'^(?P<cohortId>[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})/match/(?P<jobId>[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})$', cohort_match_status, name='cohort-match-status'),
+    url(r'^(?P<cohortId>[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})/export/(?P<kind>scores|rankings|mentorships)\.(?P<fileFormat>csv|ndjson)$', cohort_export, name='cohort-export'),
     url(r'^(?P<cohortId>[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})/register$', cohort_register, name='cohort-register'),
     url(r'^(?P<cohortId>[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})/$', cohort_detail, name='cohort-detail'),
 ]
@@ -3,7 +3,6 @@ from match.models import Cohort,MentorshipScore,Participant
 from match.serializers import CohortSerializer,ParticipantSerializer,UserSerializer
 
 from django.conf.urls import include,url
-from django.db.utils import IntegrityError
 from django.http import Http404
 from django.utils import timezone
 import json
@@ -26,7 +25,7 @@ class ParticipantViewSet(viewsets.ModelViewSet):
         if self.action in ['destroy']:
             self.permission_classes = [TokenHasScope, permissions.IsAdminUser]
             self.required_scopes = ['write']
-        if self.action == 'setTopThree':
+        if self.action in ['setTopThree', 'setPreferences']:
             self.required_scopes = ['write']
         return super(self.__class__, self).get_permissions()
 
@@ -50,8 +49,6 @@ class ParticipantViewSet(viewsets.ModelViewSet):
             return JSONResponse({'detail': s.errors}, status=status.HTTP_400_BAD_REQUEST)
         try:
             s.save(user=request.user, cohort=c)
-        except IntegrityError:
-            return JSONResponse({'detail': 'You have already applied for this cohort.'}, status=status.HTTP_403_FORBIDDEN)
         except ValidationError as e:
             return JSONResponse({'detail': e.args[0]}, status=status.HTTP_403_FORBIDDEN)
         return JSONResponse(s.data, status=status.HTTP_200_OK)
@@ -59,7 +56,7 @@ class ParticipantViewSet(viewsets.ModelViewSet):
     @decorators.detail_route(methods=['get'], required_scopes=['read'])
     def getTopThree(self, request, **kwargs):
         try:
-            p = Participant.objects.get(participantId=self.kwargs['participantId'])
+            p = Participant.objects.select_related('user', 'cohort').get(participantId=self.kwargs['participantId'])
             if not p.user.username == self.request.user.username:
                 return JSONResponse({'detail': 'You do not have permission to see this participant\'s details'}, status=status.HTTP_403_FORBIDDEN)
             if p.isMentor:
@@ -77,7 +74,9 @@ class ParticipantViewSet(viewsets.ModelViewSet):
     @decorators.detail_route(methods=['post'], required_scopes=['read', 'write'])
     def setTopThree(self, request, **kwargs):
         try:
-            participant = Participant.objects.get(participantId=self.kwargs['participantId'])
+            participant = Participant.objects.select_related(
+                'user', 'cohort__programme__scoringProfile'
+            ).get(participantId=self.kwargs['participantId'])
             if not participant.user.username == self.request.user.username:
                 return JSONResponse({'detail': 'You do not have permission to modify this participant\'s details'}, status=status.HTTP_403_FORBIDDEN)
             if participant.isMentor:
@@ -118,11 +117,39 @@ class ParticipantViewSet(viewsets.ModelViewSet):
             ##    pass
             ##participant.isTopThreeSelected = True
             ##participant.save()
-            participant.setTopThree(choices)
+            if not participant.setTopThree(choices):
+                # Another submission got there first.
+                return JSONResponse({'detail': 'You have already selected your top three.'}, status=status.HTTP_403_FORBIDDEN)
             return JSONResponse({'detail': 'Top Three successfully selected'}, status=status.HTTP_200_OK)
         except Participant.DoesNotExist:
             return JSONResponse({'detail': 'Participant not found with that ID'}, status=status.HTTP_404_NOT_FOUND)
 
+    @decorators.detail_route(methods=['post'], required_scopes=['read', 'write'])
+    def setPreferences(self, request, **kwargs):
+        try:
+            participant = Participant.objects.select_related('user', 'cohort').get(participantId=self.kwargs['participantId'])
+        except Participant.DoesNotExist:
+            return JSONResponse({'detail': 'Participant not found with that ID'}, status=status.HTTP_404_NOT_FOUND)
+        if not participant.user.username == self.request.user.username:
+            return JSONResponse({'detail': 'You do not have permission to modify this participant\'s details'}, status=status.HTTP_403_FORBIDDEN)
+        if not participant.isMentor:
+            return JSONResponse({'detail': 'Only mentors can choose their preferences, mentees choose their top three'}, status=status.HTTP_403_FORBIDDEN)
+        if timezone.now() < participant.cohort.closeDate:
+            return JSONResponse({'detail': 'Matching has not yet begun, you cannot choose your preferences'}, status=status.HTTP_403_FORBIDDEN)
+        if timezone.now() > participant.cohort.matchDate:
+            return JSONResponse({'detail': 'Matching is finished, you can no longer choose your preferences'}, status=status.HTTP_403_FORBIDDEN)
+        if hasattr(self.request.data, 'getlist'):
+            choices = self.request.data.getlist('choices')
+        else:
+            choices = self.request.data.get('choices')
+        if not isinstance(choices, list):
+            return JSONResponse({'detail': 'You must include a list of choices, most preferred first.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            participant.setPreferences(choices)
+        except ValueError as e:
+            return JSONResponse({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return JSONResponse({'detail': 'Preferences successfully saved'}, status=status.HTTP_200_OK)
+
 participant_list = ParticipantViewSet.as_view({
     'get': 'list'
 })
@@ -137,8 +164,13 @@ participant_top_three = ParticipantViewSet.as_view({
     'post': 'setTopThree'
 })
 
+participant_preferences = ParticipantViewSet.as_view({
+    'post': 'setPreferences'
+})
+
 urlpatterns = [
     url(r'^$', participant_list, name='participant-list'),
     url(r'^(?P<participantId>[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})/$', participant_detail, name='participant-detail'),
     url(r'^(?P<participantId>[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})/topThree$', participant_top_three, name='participant-top-three'),
+    url(r'^(?P<participantId>[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})/preferences$', participant_preferences, name='participant-preferences'),
 ]
@@ -1,5 +1,6 @@
 from .JSONResponse import JSONResponse
-from match.models import Cohort,Programme
+from .cohort import CohortViewSet
+from match.models import Cohort,Programme,active_cohorts
 from match.serializers import CohortSerializer,ProgrammeSerializer,UserSerializer
 
 from django.conf.urls import include,url
@@ -12,7 +13,9 @@ from rest_framework.routers import DefaultRouter
 class ProgrammeViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated, TokenHasScope]
     required_scopes = ['read']
-    queryset = Programme.objects.select_related('createdBy').all()
+    # Everything ProgrammeSerializer reads, so a list is a fixed number of
+    # queries however many programmes it holds.
+    queryset = Programme.objects.select_related('createdBy__profile').prefetch_related('createdBy__profile__tags')
 
     serializer_class = ProgrammeSerializer
 
@@ -48,15 +51,28 @@ class ProgrammeViewSet(viewsets.ModelViewSet):
         else:
             return JSONResponse({'detail': 'You do not have permission to perform this action. (you do not own the resource)'}, status=status.HTTP_403_FORBIDDEN)
 
+    def list(self, request, **kwargs):
+        response = super(self.__class__, self).list(request, **kwargs)
+        # ?embed=activeCohort adds each programme's active cohort, all read
+        # with one query.
+        if request.query_params.get('embed') == 'activeCohort':
+            active = active_cohorts(self.filter_queryset(self.get_queryset()), CohortViewSet.queryset)
+            cohorts = dict(zip(
+                [str(programmeId) for programmeId in active],
+                CohortSerializer(list(active.values()), many=True).data
+            ))
+            for programme in response.data:
+                programme['activeCohort'] = cohorts.get(programme['programmeId'])
+        return response
+
     # Cohort methods
     def cohort_list(self, request, **kwargs):
         programme = Programme.objects.get(programmeId=kwargs['programmeId'])
         if not programme:
             return JSONResponse({'detail': 'Programme not found'}, status=status.HTTP_404_NOT_FOUND)
         try:
-            cohorts = Cohort.objects.filter(programme=programme.programmeId)
-            serializer = CohortSerializer(data=cohorts, many=True)
-            serializer.is_valid()
+            cohorts = CohortViewSet.queryset.filter(programme=programme.programmeId)
+            serializer = CohortSerializer(cohorts, many=True)
             return JSONResponse(serializer.data, status=status.HTTP_200_OK)
         except Cohort.DoesNotExist:
             return JSONResponse(None, status=status.HTTP_204_NO_CONTENT)
@@ -66,7 +82,7 @@ class ProgrammeViewSet(viewsets.ModelViewSet):
         programme = Programme.objects.get(programmeId=kwargs['programmeId'])
         if not programme:
             return JSONResponse({'detail': 'Programme not found'}, status=status.HTTP_404_NOT_FOUND)
-        cohort = programme.activeCohort
+        cohort = active_cohorts([programme], CohortViewSet.queryset).get(programme.programmeId)
         if cohort:
             serializer = CohortSerializer(cohort)
             return JSONResponse(serializer.data, status=status.HTTP_200_OK)
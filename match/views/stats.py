@@ -0,0 +1,42 @@
+from .JSONResponse import JSONResponse
+from match import timing
+
+from django.conf.urls import url
+from oauth2_provider.ext.rest_framework import TokenHasScope
+from rest_framework import permissions,status,viewsets
+
+class RequestStatsViewSet(viewsets.ViewSet):
+    permission_classes = [TokenHasScope, permissions.IsAdminUser]
+    required_scopes = ['read', 'staff']
+
+    def get_permissions(self):
+        if self.action == 'partial_update':
+            self.required_scopes = ['write', 'staff']
+        return super(self.__class__, self).get_permissions()
+
+    def _summary(self):
+        return {
+            'enabled': timing.is_enabled(),
+            'windowSeconds': timing.stats.window,
+            'urls': timing.stats.summary(),
+        }
+
+    def retrieve(self, request, **kwargs):
+        # Only covers the requests this process has handled.
+        return JSONResponse(self._summary())
+
+    def partial_update(self, request, **kwargs):
+        enabled = request.data.get('enabled')
+        if enabled is not None and not isinstance(enabled, bool):
+            return JSONResponse({'detail': 'enabled must be true, false or null'}, status=status.HTTP_400_BAD_REQUEST)
+        timing.set_enabled(enabled)
+        return JSONResponse(self._summary())
+
+request_stats = RequestStatsViewSet.as_view({
+    'get': 'retrieve',
+    'patch': 'partial_update'
+})
+
+urlpatterns = [
+    url(r'^requests$', request_stats, name='stats-requests'),
+]
@@ -61,6 +61,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so that it times everything below it.
+    'match.timing.TimingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -184,3 +186,17 @@ REST_FRAMEWORK = {
         'oauth2_provider.ext.rest_framework.OAuth2Authentication',
     )
 }
+
+# Matching
+# Rough number of bytes a match run may hold for the mentees it is scoring
+# at any one time, on top of the cohort's mentors which it keeps throughout.
+
+MATCH_MEMORY_LIMIT = int(os.environ.get("MATCH_MEMORY_LIMIT", 32 * 1024 * 1024))
+
+# Request timing
+# Whether to time each request into a Server-Timing header and the stats at
+# /stats/requests. Staff can also switch it while running.
+
+REQUEST_TIMING = os.environ.get("REQUEST_TIMING", "1").lower() not in ("0", "false", "no")
+# Staff always get the Server-Timing header; this sends it to everyone.
+SERVER_TIMING_HEADER = os.environ.get("SERVER_TIMING_HEADER", "0").lower() not in ("0", "false", "no")